@@ -0,0 +1,163 @@
+"""Concurrency benchmark for the data layer.
+
+Runs the same mixed workload (report intake, filtered listing, status updates
+and the occasional slow unindexed scan) once with the synchronous pymongo
+client called directly from the event loop (how the routers worked before the
+port to Motor) and once with the Motor client, then prints p50/p95/p99 latency
+for each.
+
+Requests arrive open-loop at a fixed rate, the way clients hit a server: each
+one is scheduled ahead of time and its latency runs from the scheduled
+arrival, not from when the loop got round to starting it. A blocking call
+therefore shows up in the latency of every request that arrived while it held
+the loop. A probe coroutine also records how late the loop wakes it up.
+
+Run from the backend folder against a local mongod:
+
+    python -m bench.concurrency --rate 400 --requests 4000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+BENCH_DB = os.getenv("BENCH_DB", "hrm_bench")
+
+COUNTRIES = ["Palestine", "Syria", "Iraq", "Lebanon", "Yemen"]
+STATUSES = ["new", "under_review", "resolved"]
+
+
+def make_report(rng):
+    country = rng.choice(COUNTRIES)
+    return {
+        "reporter_type": "individual",
+        "anonymous": True,
+        "incident_details": {
+            "date": datetime(2024, 1, 1) + timedelta(days=rng.randint(0, 365)),
+            "location": {"country": country, "city": country},
+            "description": f"Benchmark incident {rng.random()}",
+            "violation_types": ["Torture"],
+        },
+        "status": "new",
+        "created_at": datetime.utcnow(),
+    }
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+
+def summarize(latencies, elapsed):
+    return {
+        "ops": len(latencies),
+        "throughput": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+async def blocking_op(collection, kind, rng):
+    # The pre-Motor pattern: a synchronous driver call inside a coroutine.
+    if kind == "insert":
+        collection.insert_one(make_report(rng))
+    elif kind == "list":
+        list(collection.find({"status": rng.choice(STATUSES)}).limit(50))
+    elif kind == "update":
+        collection.update_one({"status": "new"}, {"$set": {"status": rng.choice(STATUSES)}})
+    else:
+        list(collection.find({"incident_details.description": {"$regex": "9$"}}))
+
+
+async def async_op(collection, kind, rng):
+    if kind == "insert":
+        await collection.insert_one(make_report(rng))
+    elif kind == "list":
+        await collection.find({"status": rng.choice(STATUSES)}).limit(50).to_list(length=None)
+    elif kind == "update":
+        await collection.update_one({"status": "new"}, {"$set": {"status": rng.choice(STATUSES)}})
+    else:
+        await collection.find({"incident_details.description": {"$regex": "9$"}}).to_list(length=None)
+
+
+async def probe_lag(lags, interval=0.01):
+    # How late the event loop runs a coroutine that asked to wake up in
+    # `interval` seconds; a blocked loop can't run anything else either.
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run_mode(op, collection, rate, requests, seed):
+    kinds = ["insert"] * 4 + ["list"] * 4 + ["update"] * 2 + ["scan"]
+    rng = random.Random(seed)
+    latencies = []
+    lags = []
+
+    async def request(kind, arrival):
+        await op(collection, kind, rng)
+        latencies.append(time.perf_counter() - arrival)
+
+    probe = asyncio.create_task(probe_lag(lags))
+    tasks = []
+    start = time.perf_counter()
+    for n in range(requests):
+        arrival = start + n / rate
+        delay = arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(request(rng.choice(kinds), arrival)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    probe.cancel()
+
+    result = summarize(latencies, elapsed)
+    result["loop_lag_p99_ms"] = round(percentile(lags, 99) * 1000, 2)
+    result["loop_lag_max_ms"] = round(max(lags, default=0.0) * 1000, 2)
+    return result
+
+
+def preload(collection, count, seed):
+    collection.drop()
+    rng = random.Random(seed)
+    collection.insert_many([make_report(rng) for _ in range(count)])
+
+
+async def main(args):
+    sync_client = MongoClient(MONGO_URL)
+    async_client = AsyncIOMotorClient(MONGO_URL)
+    try:
+        preload(sync_client[BENCH_DB].incident_reports, args.preload, args.seed)
+        before = await run_mode(blocking_op, sync_client[BENCH_DB].incident_reports,
+                                args.rate, args.requests, args.seed)
+
+        preload(sync_client[BENCH_DB].incident_reports, args.preload, args.seed)
+        after = await run_mode(async_op, async_client[BENCH_DB].incident_reports,
+                               args.rate, args.requests, args.seed)
+    finally:
+        sync_client.drop_database(BENCH_DB)
+        sync_client.close()
+        async_client.close()
+
+    print(json.dumps({"before_sync_pymongo": before, "after_motor": after}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=400, help="request arrivals per second")
+    parser.add_argument("--requests", type=int, default=4000, help="requests per run")
+    parser.add_argument("--preload", type=int, default=20000, help="reports inserted before each run")
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,316 @@
+"""HTTP load test for the FastAPI app.
+
+Drives main.app in-process through httpx's ASGI transport with a weighted mix
+of report intake, filtered listing, case detail, status PATCHes and victim
+lookups, then reports throughput and p50/p95/p99 per route as JSON.
+
+The app runs against a scratch database on a local mongod (the default), or
+against mongomock-motor with --backend mock when no mongod is available.
+
+Run from the backend folder:
+
+    python -m bench.loadtest --reports 20000 --duration 30 --output bench.json
+    python -m bench.loadtest --duration 30 --compare bench.json
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+COUNTRIES = {
+    "Palestine": "Gaza",
+    "Syria": "Aleppo",
+    "Iraq": "Baghdad",
+    "Lebanon": "Beirut",
+    "Yemen": "Sana'a",
+}
+VIOLATIONS = ["Torture", "Arbitrary Arrest", "Forced Displacement", "Unlawful Killing", "Enforced Disappearance"]
+STATUSES = ["new", "under_review", "resolved"]
+
+# route name -> relative weight in the mix
+DEFAULT_MIX = {
+    "POST /reports/": 20,
+    "GET /reports/": 30,
+    "GET /cases/{id}": 25,
+    "PATCH /reports/{id}": 10,
+    "GET /victims/case/{id}": 15,
+}
+
+
+def load_app(backend, db_name):
+    os.environ["MONGO_DB"] = db_name
+    import database
+
+    if backend == "mock":
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            sys.exit("--backend mock needs mongomock-motor (pip install mongomock-motor)")
+        database.client = AsyncMongoMockClient()
+        database.db = database.client[db_name]
+        database.cases_collection = database.db.cases
+        _patch_mongomock()
+
+        # mongomock has no replica set to run status changes in a transaction
+        import status_changes
+        status_changes._transactions = False
+
+    # The routers bind their collections on import, so this has to come
+    # after the database module is set up.
+    import main
+    return main.app, database
+
+
+def _patch_mongomock():
+    # pymongo 4.11+ passes sort= to the bulk builder for UpdateOne, which
+    # mongomock (4.3 and older) doesn't accept; it's always None here
+    from mongomock.collection import BulkOperationBuilder
+
+    add_update = BulkOperationBuilder.add_update
+    if "sort" not in inspect.signature(add_update).parameters:
+        def add_update_without_sort(self, *args, sort=None, **kwargs):
+            return add_update(self, *args, **kwargs)
+        BulkOperationBuilder.add_update = add_update_without_sort
+
+
+def report_form(rng):
+    country = rng.choice(list(COUNTRIES))
+    return {
+        "reporter_type": rng.choice(["individual", "organization"]),
+        "anonymous": "true",
+        "date": (datetime(2024, 1, 1) + timedelta(days=rng.randint(0, 365))).strftime("%Y-%m-%d"),
+        "country": country,
+        "city": COUNTRIES[country],
+        "latitude": str(round(rng.uniform(30.0, 36.0), 4)),
+        "longitude": str(round(rng.uniform(30.0, 40.0), 4)),
+        "description": f"Load test incident in {COUNTRIES[country]}",
+        "violation_types": ",".join(rng.sample(VIOLATIONS, k=rng.randint(1, 3))),
+    }
+
+
+async def preload(db, reports, cases, victims, seed):
+    from bson import ObjectId
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+
+    report_docs = []
+    for _ in range(reports):
+        country = rng.choice(list(COUNTRIES))
+        lng, lat = round(rng.uniform(30.0, 40.0), 4), round(rng.uniform(30.0, 36.0), 4)
+        report_docs.append({
+            "_id": ObjectId(),
+            "reporter_type": "individual",
+            "anonymous": True,
+            "contact_info": {"email": None, "phone": None, "preferred_contact": None},
+            "incident_details": {
+                "date": datetime(2024, 1, 1) + timedelta(days=rng.randint(0, 365)),
+                "location": {"country": country, "city": COUNTRIES[country],
+                             "coordinates": {"type": "Point", "coordinates": [lng, lat]}},
+                "description": f"Preloaded incident in {COUNTRIES[country]}",
+                "violation_types": rng.sample(VIOLATIONS, k=rng.randint(1, 3)),
+            },
+            "evidence": [],
+            "language": "english",
+            "status": rng.choice(STATUSES),
+            "created_at": now,
+            "updated_at": now,
+        })
+
+    case_docs = [{
+        "_id": ObjectId(),
+        "title": f"Case {n}",
+        "description": "Preloaded case",
+        "violation_types": rng.sample(VIOLATIONS, k=rng.randint(1, 2)),
+        "status": rng.choice(STATUSES),
+        "priority": rng.choice(["low", "medium", "high"]),
+        "location": {"country": rng.choice(list(COUNTRIES)), "region": "North"},
+        "date_occurred": datetime(2024, 1, 1) + timedelta(days=rng.randint(0, 365)),
+        "date_reported": now,
+        "evidence": [],
+        "language": "english",
+        "created_at": now,
+        "updated_at": now,
+    } for n in range(cases)]
+
+    victim_docs = [{
+        "type": rng.choice(["victim", "witness"]),
+        "anonymous": True,
+        "demographics": {"gender": None, "age": None, "ethnicity": None, "occupation": None},
+        "contact_info": {"email": None, "phone": None, "secure_messaging": None},
+        "risk_assessment": {"level": rng.choice(["low", "medium", "high"]), "threats": [], "protection_needed": False},
+        "support_services": [],
+        "cases_involved": [c["_id"] for c in rng.sample(case_docs, k=min(2, len(case_docs)))],
+        "created_at": now,
+        "updated_at": now,
+    } for _ in range(victims)]
+
+    for collection, docs in (("incident_reports", report_docs), ("cases", case_docs), ("victims", victim_docs)):
+        for start in range(0, len(docs), 5000):
+            await db[collection].insert_many(docs[start:start + 5000], ordered=False)
+
+    return [str(d["_id"]) for d in report_docs], [str(d["_id"]) for d in case_docs]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+
+def summarize(samples, elapsed):
+    routes = {}
+    for route, entries in samples.items():
+        latencies = [latency for latency, _ in entries]
+        errors = sum(1 for _, ok in entries if not ok)
+        routes[route] = {
+            "requests": len(entries),
+            "errors": errors,
+            "throughput_rps": round(len(entries) / elapsed, 1),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        }
+    total = sum(r["requests"] for r in routes.values())
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "total_requests": total,
+        "total_throughput_rps": round(total / elapsed, 1),
+        "routes": routes,
+    }
+
+
+async def drive(app, report_ids, case_ids, args):
+    import httpx
+
+    rng = random.Random(args.seed)
+    routes = list(DEFAULT_MIX)
+    weights = [DEFAULT_MIX[r] for r in routes]
+    samples = {route: [] for route in routes}
+    deadline = time.perf_counter() + args.duration
+
+    async def request(client, route, worker_rng):
+        if route == "POST /reports/":
+            response = await client.post("/reports/", data=report_form(worker_rng))
+            if response.status_code == 200:
+                report_ids.append(response.json()["id"])
+            return response
+        if route == "GET /reports/":
+            params = {"status": worker_rng.choice(STATUSES), "limit": 50}
+            if worker_rng.random() < 0.5:
+                params["country"] = worker_rng.choice(list(COUNTRIES))
+            return await client.get("/reports/", params=params)
+        if route == "GET /cases/{id}":
+            return await client.get(f"/cases/{worker_rng.choice(case_ids)}")
+        if route == "PATCH /reports/{id}":
+            return await client.patch(f"/reports/{worker_rng.choice(report_ids)}",
+                                      json={"status": worker_rng.choice(STATUSES)})
+        return await client.get(f"/victims/case/{worker_rng.choice(case_ids)}")
+
+    async def worker(n, client):
+        worker_rng = random.Random(args.seed * 1000 + n)
+        while time.perf_counter() < deadline:
+            route = worker_rng.choices(routes, weights)[0]
+            start = time.perf_counter()
+            try:
+                response = await request(client, route, worker_rng)
+            except Exception:
+                ok = False
+            else:
+                # A PATCH to the status a report already has is a 404 by design
+                ok = response.status_code < 400 or (route == "PATCH /reports/{id}" and response.status_code == 404)
+            samples[route].append((time.perf_counter() - start, ok))
+
+    # Exceptions in the app come back as 500s and count as errors instead of
+    # ending the run
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(n, client) for n in range(args.concurrency)))
+        return summarize(samples, time.perf_counter() - start)
+
+
+def compare(result, baseline, threshold):
+    regressions = []
+    print(f"{'route':28} {'metric':15} {'baseline':>10} {'current':>10} {'change':>8}")
+    for route, current in result["routes"].items():
+        before = baseline.get("routes", {}).get(route)
+        if not before:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps"):
+            old, new = before[metric], current[metric]
+            change = (new - old) / old * 100 if old else 0.0
+            print(f"{route:28} {metric:15} {old:10.2f} {new:10.2f} {change:+7.1f}%")
+            worse = change > threshold if metric != "throughput_rps" else change < -threshold
+            if worse and metric in ("p95_ms", "throughput_rps"):
+                regressions.append(f"{route} {metric} {change:+.1f}%")
+    return regressions
+
+
+async def main(args):
+    app, database = load_app(args.backend, args.db)
+    db = database.db
+    await database.client.drop_database(args.db)
+
+    report_ids, case_ids = await preload(db, args.reports, args.cases, args.victims, args.seed)
+
+    if args.backend == "mongod":
+        async with app.router.lifespan_context(app):
+            result = await drive(app, report_ids, case_ids, args)
+        await database.client.drop_database(args.db)
+    else:
+        result = await drive(app, report_ids, case_ids, args)
+
+    result["config"] = {
+        "backend": args.backend,
+        "reports": args.reports,
+        "cases": args.cases,
+        "victims": args.victims,
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "seed": args.seed,
+        "python": platform.python_version(),
+        "mix": DEFAULT_MIX,
+    }
+    result["timestamp"] = datetime.utcnow().isoformat()
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold)
+        if regressions:
+            print("\nRegressions beyond threshold:\n  " + "\n  ".join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["mongod", "mock"], default="mongod")
+    parser.add_argument("--db", default="hrm_loadtest", help="scratch database, dropped before and after")
+    parser.add_argument("--reports", type=int, default=10000)
+    parser.add_argument("--cases", type=int, default=1000)
+    parser.add_argument("--victims", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON result here")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="percent change in p95 or throughput that counts as a regression")
+    sys.exit(asyncio.run(main(parser.parse_args())))
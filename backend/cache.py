@@ -0,0 +1,193 @@
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+
+from fastapi.encoders import jsonable_encoder
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # redis is optional; without it the cache is per process
+    redis = None
+
+# Read-through cache for single-document lookups (get_case, get_victim,
+# get_report). Entries expire after CACHE_TTL_SECONDS and the least recently
+# used ones are evicted past CACHE_MAX_ENTRIES. The routes that change a
+# document invalidate its key, so the TTL only bounds staleness from writes
+# made outside the API.
+#
+# Set CACHE_REDIS_URL to share one cache between uvicorn workers; an update
+# handled by one worker then invalidates the entry for all of them.
+#
+# A load that overlaps an invalidation may have read the document before the
+# write, so it is returned but not cached. Each backend keeps a generation
+# that invalidations bump: get() returns it with the value, and set() only
+# stores if it hasn't moved since. With Redis the generation is per key and
+# lives in Redis, so this holds across workers.
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "60"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL")
+CACHE_KEY_PREFIX = "hrm:"
+GENERATION_PREFIX = "hrm:generation:"
+# Outlives any load by far, so a generation can't lapse under one
+GENERATION_TTL_SECONDS = 86400
+
+
+class MemoryBackend:
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.evictions = 0
+        self.generation = 0  # one for all keys; invalidations are rare
+
+    async def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None, self.generation
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            return None, self.generation
+        self.entries.move_to_end(key)
+        return value, self.generation
+
+    async def set(self, key, value, generation):
+        if generation != self.generation:
+            return
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, *keys):
+        self.generation += 1
+        for key in keys:
+            self.entries.pop(key, None)
+
+    def size(self):
+        return len(self.entries)
+
+    async def close(self):
+        pass
+
+
+class RedisBackend:
+    # Stores the value only if the key's generation is still the one read
+    # before the load (compare and set in one step)
+    SET_IF_CURRENT = """
+        if (redis.call('GET', KEYS[2]) or '0') == ARGV[1] then
+            redis.call('SET', KEYS[1], ARGV[2], 'PX', ARGV[3])
+        end
+    """
+
+    def __init__(self, url, ttl):
+        self.ttl = ttl
+        self.client = redis.from_url(url)
+        self.set_if_current = self.client.register_script(self.SET_IF_CURRENT)
+        self.evictions = 0  # done by Redis itself (maxmemory-policy)
+
+    async def get(self, key):
+        raw, generation = await self.client.mget(CACHE_KEY_PREFIX + key, GENERATION_PREFIX + key)
+        return None if raw is None else json.loads(raw), (generation or b"0").decode()
+
+    async def set(self, key, value, generation):
+        await self.set_if_current(keys=[CACHE_KEY_PREFIX + key, GENERATION_PREFIX + key],
+                                  args=[generation, json.dumps(value), int(self.ttl * 1000)])
+
+    async def delete(self, *keys):
+        async with self.client.pipeline(transaction=True) as pipe:
+            for key in keys:
+                pipe.incr(GENERATION_PREFIX + key)
+                pipe.expire(GENERATION_PREFIX + key, GENERATION_TTL_SECONDS)
+            pipe.delete(*[CACHE_KEY_PREFIX + key for key in keys])
+            await pipe.execute()
+
+    def size(self):
+        return None
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def _make_backend():
+    if CACHE_REDIS_URL:
+        if redis is None:
+            raise RuntimeError("CACHE_REDIS_URL is set but the redis package is not installed")
+        return RedisBackend(CACHE_REDIS_URL, CACHE_TTL_SECONDS)
+    return MemoryBackend(CACHE_TTL_SECONDS, CACHE_MAX_ENTRIES)
+
+
+backend = _make_backend()
+hits = 0
+misses = 0
+_loading = {}  # key -> future, so concurrent misses share one database read
+
+
+async def get_or_load(key, loader):
+    """Return the cached value for key, or await loader() and cache its result.
+
+    Values are stored JSON-encoded (jsonable_encoder) so a hit returns exactly
+    what the route would have returned from the database; None is not cached.
+    """
+    global hits, misses
+    value, generation = await backend.get(key)
+    if value is not None:
+        hits += 1
+        return value
+    misses += 1
+
+    pending = _loading.get(key)
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    future = asyncio.get_running_loop().create_future()
+    _loading[key] = future
+    try:
+        value = await loader()
+        if value is not None:
+            value = jsonable_encoder(value)
+            await backend.set(key, value, generation)
+        future.set_result(value)
+        return value
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # mark retrieved when nobody else was waiting
+        raise
+    finally:
+        if not future.done():  # the request was cancelled mid-load
+            future.cancel()
+        if _loading.get(key) is future:
+            del _loading[key]
+
+
+async def invalidate(key):
+    await invalidate_many([key])
+
+
+async def invalidate_many(keys):
+    if not keys:
+        return
+    for key in keys:
+        _loading.pop(key, None)
+    await backend.delete(*keys)
+
+
+def stats():
+    lookups = hits + misses
+    return {
+        "backend": "redis" if isinstance(backend, RedisBackend) else "memory",
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / lookups, 4) if lookups else None,
+        "evictions": backend.evictions,
+        "size": backend.size(),
+        "ttl_seconds": CACHE_TTL_SECONDS,
+        "max_entries": CACHE_MAX_ENTRIES,
+    }
+
+
+async def close():
+    await backend.close()
@@ -1,7 +1,28 @@
-from pymongo import MongoClient
+import os
 
-MONGO_URL = "mongodb://localhost:27017"
-client = MongoClient(MONGO_URL)
+from motor.motor_asyncio import AsyncIOMotorClient
 
-db = client.hrm_database  # اسم قاعدة البيانات
+import metrics
+import profiler
+
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+MONGO_DB = os.getenv("MONGO_DB", "hrm_database")
+
+# Motor connects lazily on the first operation, so the routers can keep binding
+# their collections at import time; the app lifespan checks the connection on
+# startup and closes the client on shutdown.
+listeners = [metrics.command_listener]
+if profiler.enabled:
+    listeners.append(profiler.listener)
+client = AsyncIOMotorClient(MONGO_URL, event_listeners=listeners)
+
+db = client[MONGO_DB]  # اسم قاعدة البيانات
 cases_collection = db.cases  # جدول القضايا
+
+
+async def connect():
+    await client.admin.command("ping")
+
+
+def close():
+    client.close()
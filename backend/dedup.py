@@ -0,0 +1,287 @@
+import hashlib
+import math
+import re
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from database import db
+
+# Near-duplicate incident reports. Each report's description is cut into
+# character shingles and summarized by a MinHash signature; the signature is
+# split into LSH bands stored in report_lsh with a multikey index, so the
+# likely duplicates of a report are the entries sharing at least one band, an
+# indexed lookup instead of a comparison against every report. Candidates are
+# scored on text similarity (the share of equal signature values, an estimate
+# of shingle Jaccard similarity) combined with how close the incident dates
+# and locations are.
+#
+# A new report joins the cluster of its best match scoring CLUSTER_SCORE or
+# more; recluster() rebuilds the clusters as connected components (see
+# recluster_reports.py).
+NUM_HASHES = 64
+BANDS = 16  # of 4 rows: pairs about 50% similar or more usually share a band
+ROWS = NUM_HASHES // BANDS
+SHINGLE_SIZE = 5  # characters
+
+DATE_WINDOW_DAYS = 7  # dates further apart than this add nothing to the score
+DISTANCE_KM = 25      # likewise for locations
+TEXT_WEIGHT, DATE_WEIGHT, PLACE_WEIGHT = 0.6, 0.2, 0.2
+CLUSTER_SCORE = 0.7
+
+MAX_CANDIDATES = 200
+# Within a band bucket recluster() compares each entry with the next
+# BUCKET_WINDOW ones (by id), which keeps huge buckets from going quadratic
+BUCKET_WINDOW = 50
+# Band buckets shared by more reports than this come from boilerplate or
+# templated descriptions rather than duplicates; recluster() skips them, as
+# LSH implementations usually do, so no bucket outgrows a document
+MAX_BUCKET_SIZE = 500
+# Candidate pairs recluster() collects before scoring them, which bounds the
+# entries held in memory at once
+PAIRS_PER_PASS = 10000
+BATCH_SIZE = 1000
+
+lsh_collection = db.report_lsh
+
+# What lsh_entry needs from a report
+REPORT_PROJECTION = {
+    "incident_details.description": 1,
+    "incident_details.date": 1,
+    "incident_details.location.coordinates": 1,
+}
+CANDIDATE_PROJECTION = {"signature": 1, "date": 1, "coordinates": 1, "cluster": 1}
+
+_VALUE_BITS = 50
+_VALUE_MASK = (1 << _VALUE_BITS) - 1
+_WORD = re.compile(r"\w+")
+# Arabic diacritics and tatweel, and letter variants reporters use interchangeably
+_DIACRITICS = re.compile(r"[\u0640\u064B-\u0652]")
+_ARABIC_LETTERS = str.maketrans({"أ": "ا", "إ": "ا", "آ": "ا", "ة": "ه", "ى": "ي"})
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+def normalize_text(text):
+    text = _DIACRITICS.sub("", (text or "").lower()).translate(_ARABIC_LETTERS)
+    return " ".join(_WORD.findall(text))
+
+
+def shingles(text):
+    text = normalize_text(text)
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def signature(text):
+    """One-permutation MinHash: every shingle is hashed once and kept as the
+    minimum of one of NUM_HASHES bins, rather than hashed NUM_HASHES times.
+    An empty bin borrows the value of the next filled bin to its right,
+    tagged with the distance, so short descriptions still compare fairly."""
+    mins = [None] * NUM_HASHES
+    for shingle in shingles(text):
+        h = _hash(shingle)
+        slot, value = h % NUM_HASHES, (h // NUM_HASHES) & _VALUE_MASK
+        if mins[slot] is None or value < mins[slot]:
+            mins[slot] = value
+    if all(value is None for value in mins):
+        return None
+
+    result = []
+    for slot in range(NUM_HASHES):
+        distance = 0
+        while mins[(slot + distance) % NUM_HASHES] is None:
+            distance += 1
+        result.append((distance << _VALUE_BITS) | mins[(slot + distance) % NUM_HASHES])
+    return result
+
+
+def band_keys(sig):
+    return [f"{band}:{_hash(repr(sig[band * ROWS:(band + 1) * ROWS])):x}" for band in range(BANDS)]
+
+
+def lsh_entry(report):
+    """The report_lsh document for a report, or None if it has no description."""
+    details = report.get("incident_details", {})
+    sig = signature(details.get("description"))
+    if sig is None:
+        return None
+    location = details.get("location") or {}
+    return {
+        "_id": report["_id"],
+        "signature": sig,
+        "bands": band_keys(sig),
+        "date": details.get("date"),
+        "coordinates": (location.get("coordinates") or {}).get("coordinates"),
+        "cluster": None,
+    }
+
+
+def _distance_km(a, b):
+    lon1, lat1, lon2, lat2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371 * math.asin(math.sqrt(h))
+
+
+def compare(entry, other):
+    text = sum(a == b for a, b in zip(entry["signature"], other["signature"])) / NUM_HASHES
+    days = distance = None
+    date_score = place_score = 0.0
+    if isinstance(entry.get("date"), datetime) and isinstance(other.get("date"), datetime):
+        days = abs((entry["date"] - other["date"]).total_seconds()) / 86400
+        date_score = max(0.0, 1 - days / DATE_WINDOW_DAYS)
+    if entry.get("coordinates") and other.get("coordinates"):
+        distance = _distance_km(entry["coordinates"], other["coordinates"])
+        place_score = max(0.0, 1 - distance / DISTANCE_KM)
+    return {
+        "score": round(TEXT_WEIGHT * text + DATE_WEIGHT * date_score + PLACE_WEIGHT * place_score, 3),
+        "text_similarity": round(text, 3),
+        "days_apart": None if days is None else round(days, 1),
+        "distance_km": None if distance is None else round(distance, 1),
+    }
+
+
+async def find_duplicates(entry, min_score=0.0):
+    """Scored matches for an entry, best first."""
+    others = await lsh_collection.find(
+        {"bands": {"$in": entry["bands"]}, "_id": {"$ne": entry["_id"]}}, CANDIDATE_PROJECTION
+    ).limit(MAX_CANDIDATES).to_list(length=None)
+    matches = [{"id": str(other["_id"]), **compare(entry, other)} for other in others]
+    matches = [match for match in matches if match["score"] >= min_score]
+    matches.sort(key=lambda match: match["score"], reverse=True)
+    return matches
+
+
+async def index_reports(reports):
+    """Add new reports to the index, putting each in the cluster of its best
+    match. One candidate query covers the whole batch, and reports in the
+    same batch can match each other."""
+    entries = [entry for entry in map(lsh_entry, reports) if entry is not None]
+    if not entries:
+        return
+
+    keys = list({key for entry in entries for key in entry["bands"]})
+    existing = await lsh_collection.find(
+        {"bands": {"$in": keys}}, {**CANDIDATE_PROJECTION, "bands": 1}
+    ).limit(MAX_CANDIDATES * len(entries)).to_list(length=None)
+    by_band = {}
+    for other in existing:
+        for key in other["bands"]:
+            by_band.setdefault(key, []).append(other)
+
+    new_ids = {entry["_id"] for entry in entries}
+    new_roots = set()  # indexed entries that start a cluster with this batch
+    for entry in entries:
+        others = {other["_id"]: other for key in entry["bands"] for other in by_band.get(key, ())}
+        best, best_score = None, CLUSTER_SCORE
+        for other in others.values():
+            score = compare(entry, other)["score"]
+            if score >= best_score:
+                best, best_score = other, score
+        if best is not None:
+            if best.get("cluster") is None:
+                best["cluster"] = best["_id"]
+                if best["_id"] not in new_ids:
+                    new_roots.add(best["_id"])
+            entry["cluster"] = best["cluster"]
+        for key in entry["bands"]:
+            by_band.setdefault(key, []).append(entry)
+
+    await lsh_collection.insert_many(entries, ordered=False)
+    if new_roots:
+        await lsh_collection.bulk_write(
+            [UpdateOne({"_id": root}, {"$set": {"cluster": root}}) for root in new_roots], ordered=False)
+
+
+async def cluster_size(cluster):
+    if cluster is None:
+        return 1
+    return await lsh_collection.count_documents({"cluster": cluster})
+
+
+async def rebuild_index():
+    """Re-index every report from scratch; returns how many were indexed."""
+    await lsh_collection.delete_many({})
+    indexed = 0
+    batch = []
+    async for report in db.incident_reports.find({}, REPORT_PROJECTION).sort("_id", 1):
+        batch.append(report)
+        if len(batch) >= BATCH_SIZE:
+            await index_reports(batch)
+            indexed += len(batch)
+            batch = []
+    if batch:
+        await index_reports(batch)
+        indexed += len(batch)
+    return indexed
+
+
+async def recluster(threshold=CLUSTER_SCORE):
+    """Rebuild the clusters as the connected components of every candidate
+    pair scoring threshold or more. Returns (clusters, reports clustered)."""
+    started = datetime.utcnow()
+    crowded = [bucket["_id"] async for bucket in lsh_collection.aggregate([
+        {"$unwind": "$bands"},
+        {"$group": {"_id": "$bands", "size": {"$sum": 1}}},
+        {"$match": {"size": {"$gt": MAX_BUCKET_SIZE}}},
+    ], allowDiskUse=True)]
+    buckets = lsh_collection.aggregate([
+        {"$unwind": "$bands"},
+        {"$match": {"bands": {"$nin": crowded}}},
+        {"$group": {"_id": "$bands", "ids": {"$push": "$_id"}}},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ], allowDiskUse=True)
+
+    parent = {}
+
+    def root(entry_id):
+        while parent.get(entry_id, entry_id) != entry_id:
+            entry_id = parent[entry_id]
+        return entry_id
+
+    async def link(pairs):
+        ids = list({entry_id for pair in pairs for entry_id in pair})
+        entries = {}
+        for start in range(0, len(ids), BATCH_SIZE):
+            async for entry in lsh_collection.find({"_id": {"$in": ids[start:start + BATCH_SIZE]}},
+                                                   CANDIDATE_PROJECTION):
+                entries[entry["_id"]] = entry
+        for first, second in pairs:
+            if first in entries and second in entries and compare(entries[first], entries[second])["score"] >= threshold:
+                first, second = root(first), root(second)
+                if first != second:
+                    # the oldest report names the cluster
+                    parent[max(first, second)] = min(first, second)
+
+    # Buckets are scored as they stream in, PAIRS_PER_PASS pairs at a time;
+    # pairs already in one cluster need no score
+    pairs = set()
+    async for bucket in buckets:
+        ids = sorted(bucket["ids"])
+        for i, first in enumerate(ids):
+            for second in ids[i + 1:i + 1 + BUCKET_WINDOW]:
+                if root(first) != root(second):
+                    pairs.add((first, second))
+        if len(pairs) >= PAIRS_PER_PASS:
+            await link(pairs)
+            pairs = set()
+    if pairs:
+        await link(pairs)
+
+    clusters = {entry_id: root(entry_id) for entry_id in parent}
+    clusters.update({cluster: cluster for cluster in list(clusters.values())})
+    operations = [UpdateOne({"_id": entry_id}, {"$set": {"cluster": cluster, "clustered_at": started}})
+                  for entry_id, cluster in clusters.items()]
+    for start in range(0, len(operations), BATCH_SIZE):
+        await lsh_collection.bulk_write(operations[start:start + BATCH_SIZE], ordered=False)
+    # Whatever this pass didn't cluster is on its own now; reports indexed
+    # while it ran keep what intake gave them
+    await lsh_collection.update_many(
+        {"cluster": {"$ne": None}, "clustered_at": {"$ne": started},
+         "_id": {"$lt": ObjectId.from_datetime(started)}},
+        {"$set": {"cluster": None}})
+    return len(set(clusters.values())), len(clusters)
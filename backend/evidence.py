@@ -0,0 +1,136 @@
+import hashlib
+import os
+import tempfile
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from pymongo import ReturnDocument
+from pymongo.errors import ConnectionFailure
+from starlette.concurrency import run_in_threadpool
+
+from database import db
+
+# Content-addressed evidence store shared by cases and reports. Uploads are
+# streamed to disk in fixed-size chunks and stored once under their SHA-256;
+# evidence_blobs keeps one reference-counted record per stored file.
+EVIDENCE_DIR = os.getenv("EVIDENCE_DIR", "uploads")
+CHUNK_SIZE = 1024 * 1024
+
+evidence_collection = db.evidence_blobs
+
+
+def blob_path(sha256: str) -> str:
+    return os.path.join(EVIDENCE_DIR, sha256[:2], sha256)
+
+
+def _write_chunk(out, digest, chunk):
+    digest.update(chunk)
+    out.write(chunk)
+
+
+def _commit_blob(tmp_path, path):
+    if os.path.exists(path):
+        os.remove(tmp_path)
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(tmp_path, path)
+
+
+async def store_upload(upload) -> dict:
+    os.makedirs(EVIDENCE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=EVIDENCE_DIR, prefix=".upload-")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                await run_in_threadpool(_write_chunk, out, digest, chunk)
+        sha256 = digest.hexdigest()
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    # Count the reference first and only then make sure the file is there:
+    # a release() that drops the last reference meanwhile moves the file
+    # away, and this upload has the bytes to put it back
+    try:
+        await evidence_collection.update_one(
+            {"_id": sha256},
+            {
+                "$inc": {"ref_count": 1},
+                "$addToSet": {"filenames": upload.filename},
+                "$setOnInsert": {
+                    "size": size,
+                    "content_type": upload.content_type,
+                    "path": blob_path(sha256),
+                    "created_at": datetime.utcnow(),
+                },
+            },
+            upsert=True,
+        )
+        try:
+            await run_in_threadpool(_commit_blob, tmp_path, blob_path(sha256))
+        except BaseException:
+            await release([{"sha256": sha256}])
+            raise
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return {
+        "sha256": sha256,
+        "size": size,
+        "filename": upload.filename,
+        "content_type": upload.content_type,
+        "url": f"/evidence/{sha256}",
+    }
+
+
+async def release(evidence: list):
+    # Drop one reference per stored item; the file goes when nothing uses it.
+    for item in evidence:
+        sha256 = item.get("sha256")
+        if not sha256:
+            continue
+        blob = await evidence_collection.find_one_and_update(
+            {"_id": sha256},
+            {"$inc": {"ref_count": -1}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if blob and blob["ref_count"] <= 0:
+            # Park the file before dropping the record, so an upload counting
+            # itself in meanwhile finds it gone and writes its own copy
+            path = blob["path"]
+            parked = f"{path}.release-{uuid.uuid4().hex}"
+            try:
+                os.rename(path, parked)
+            except FileNotFoundError:
+                parked = None
+            result = await evidence_collection.delete_one({"_id": sha256, "ref_count": {"$lte": 0}})
+            if parked is None:
+                continue
+            still_used = not result.deleted_count and await evidence_collection.count_documents(
+                {"_id": sha256, "ref_count": {"$gt": 0}})
+            if still_used and not os.path.exists(path):
+                os.replace(parked, path)
+            else:
+                os.remove(parked)
+
+
+@asynccontextmanager
+async def released_on_failure(evidence: list):
+    """Give back the references store_upload took when the document that
+    would hold them isn't written."""
+    try:
+        yield
+    except ConnectionFailure:
+        # the write may have gone through, so the references may be in use
+        raise
+    except Exception:
+        await release(evidence)
+        raise
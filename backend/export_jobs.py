@@ -0,0 +1,273 @@
+import asyncio
+import csv
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import MongoClient
+
+import metrics
+from database import MONGO_URL, MONGO_DB, db
+from exporting import EXPORT_BATCH_SIZE, csv_value
+
+try:
+    import xlsxwriter
+except ImportError:  # xlsx exports are only offered when xlsxwriter is installed
+    xlsxwriter = None
+
+# Background exports. POST /exports stores a job in export_jobs and hands it
+# to a small thread pool; the worker streams the matching documents to a
+# .part file in EXPORT_DIR, updating the job's progress as it goes, and
+# renames the file once it is complete. Finished files expire after
+# EXPORT_TTL_HOURS: the job documents through a TTL index, the files through
+# a periodic sweep. Jobs still queued or running when their process stops
+# are marked failed, see _fail_interrupted.
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))
+MAX_PENDING_JOBS = 20
+EXPORT_TTL_HOURS = 24
+# Rows in an xlsx sheet, the header included
+XLSX_MAX_ROWS = 1_048_576
+CLEANUP_INTERVAL_SECONDS = 3600
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+INTERRUPTED_ERROR = "Interrupted by a restart of the API, start the export again"
+_UNFINISHED = {"$in": ["queued", "running"]}
+
+jobs_collection = db.export_jobs
+logger = logging.getLogger(__name__)
+
+_executor = None
+_pending = 0
+_sync_client = None
+_sync_client_lock = threading.Lock()
+_cleanup_task = None
+# Which process runs a job, so a worker only fails its own jobs
+_owner = None
+
+
+def formats():
+    return [fmt for fmt in MEDIA_TYPES if fmt != "xlsx" or xlsxwriter is not None]
+
+
+def artifact_path(job_id, export_format):
+    return os.path.join(EXPORT_DIR, f"{job_id}.{export_format}")
+
+
+def has_capacity():
+    return _pending < MAX_PENDING_JOBS
+
+
+# The workers use a blocking client of their own; Motor's is bound to the
+# event loop
+def _sync_db():
+    global _sync_client
+    with _sync_client_lock:
+        if _sync_client is None:
+            _sync_client = MongoClient(MONGO_URL, event_listeners=[metrics.command_listener])
+    return _sync_client[MONGO_DB]
+
+
+class _CsvWriter:
+    def __init__(self, path, fields):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.fields = fields
+        self.writer.writerow(fields)
+
+    def write(self, row):
+        self.writer.writerow([csv_value(row.get(field)) for field in self.fields])
+
+    def close(self):
+        self.file.close()
+
+
+class _NdjsonWriter:
+    def __init__(self, path, fields):
+        self.file = open(path, "w", encoding="utf-8")
+
+    def write(self, row):
+        self.file.write(json.dumps(row, default=str, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class _XlsxWriter:
+    def __init__(self, path, fields):
+        # constant_memory flushes each row to disk as soon as the next starts
+        self.workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+        self.sheet = self.workbook.add_worksheet()
+        self.fields = fields
+        self.sheet.write_row(0, 0, fields)
+        self.row = 1
+
+    def write(self, row):
+        values = [csv_value(row.get(field)) for field in self.fields]
+        # write_row returns -1 instead of raising past the last row of the
+        # sheet, which would silently truncate the export
+        if self.sheet.write_row(self.row, 0, [v if isinstance(v, (int, float, bool, str)) else str(v) for v in values]) == -1:
+            raise ValueError(f"More than {XLSX_MAX_ROWS - 1} rows do not fit in an xlsx sheet, export as csv or ndjson")
+        self.row += 1
+
+    def close(self):
+        self.workbook.close()
+
+
+WRITERS = {"csv": _CsvWriter, "ndjson": _NdjsonWriter, "xlsx": _XlsxWriter}
+
+
+def _run(job_id, spec, query):
+    sync_db = _sync_db()
+    jobs = sync_db[jobs_collection.name]
+    collection = sync_db[spec["collection"]]
+    path = artifact_path(job_id, spec["format"])
+    part = path + ".part"
+    rows = 0
+
+    try:
+        total = collection.count_documents(query)
+        jobs.update_one({"_id": job_id}, {"$set": {
+            "status": "running", "total": total, "started_at": datetime.utcnow()}})
+        if spec["format"] == "xlsx" and total >= XLSX_MAX_ROWS:
+            raise ValueError(f"{total} rows do not fit in an xlsx sheet (at most {XLSX_MAX_ROWS - 1}), export as csv or ndjson")
+
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        writer = WRITERS[spec["format"]](part, spec["fields"])
+        try:
+            cursor = collection.find(query, spec["projection"]).sort("_id", 1).batch_size(EXPORT_BATCH_SIZE)
+            for doc in cursor:
+                writer.write(spec["shape"](doc))
+                rows += 1
+                if rows % EXPORT_BATCH_SIZE == 0:
+                    jobs.update_one({"_id": job_id}, {"$set": {"rows": rows}})
+        finally:
+            writer.close()
+        os.replace(part, path)
+
+        jobs.update_one({"_id": job_id}, {"$set": {
+            "status": "done", "rows": rows, "size": os.path.getsize(path),
+            "finished_at": datetime.utcnow()}})
+    except Exception as e:
+        if os.path.exists(part):
+            os.remove(part)
+        jobs.update_one({"_id": job_id}, {"$set": {
+            "status": "failed", "rows": rows, "error": str(e), "finished_at": datetime.utcnow()}})
+
+
+async def enqueue(kind, export_format, filters, spec, query):
+    """Store a queued job and start it on the export pool. spec holds the
+    collection, projection, row shape and CSV fields of the export kind."""
+    global _pending
+    job = {
+        "_id": ObjectId(),
+        "kind": kind,
+        "format": export_format,
+        "filters": filters,
+        "status": "queued",
+        "owner": _owner,
+        "rows": 0,
+        "total": None,
+        "created_at": datetime.utcnow(),
+        "expires_at": datetime.utcnow() + timedelta(hours=EXPORT_TTL_HOURS),
+    }
+    await jobs_collection.insert_one(job)
+
+    _pending += 1
+    future = asyncio.get_running_loop().run_in_executor(
+        _executor, _run, job["_id"], {**spec, "format": export_format}, query)
+
+    def done(_):
+        global _pending
+        _pending -= 1
+
+    future.add_done_callback(done)
+    return job
+
+
+def _remove_expired_files():
+    if not os.path.isdir(EXPORT_DIR):
+        return
+    cutoff = time.time() - EXPORT_TTL_HOURS * 3600
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        # A job may rename its .part file, or another worker's sweep remove
+        # the file, between listdir and here
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+async def _cleanup_loop():
+    while True:
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, _remove_expired_files)
+        except Exception:
+            # keep sweeping; an error here would otherwise stop expiry for
+            # the life of the process
+            logger.exception("Removing expired export files failed")
+        await asyncio.sleep(CLEANUP_INTERVAL_SECONDS)
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _interrupted(owner):
+    """Whether the process that owned a job is gone: an earlier run on this
+    host that exited without stop() (killed, crashed). Jobs of other hosts,
+    and of other live workers here, are left alone."""
+    if not owner:
+        return True  # queued before jobs recorded their owner
+    if owner["host"] != _owner["host"] or owner["token"] == _owner["token"]:
+        return False
+    # a container restart usually gets the same pid back
+    return owner["pid"] == _owner["pid"] or not _process_alive(owner["pid"])
+
+
+async def _fail_interrupted(query):
+    # Only unfinished jobs: a worker thread that completes after this keeps
+    # its "done"
+    await jobs_collection.update_many({**query, "status": _UNFINISHED}, {"$set": {
+        "status": "failed", "error": INTERRUPTED_ERROR, "finished_at": datetime.utcnow()}})
+
+
+async def start():
+    global _executor, _cleanup_task, _owner
+    _owner = {"host": socket.gethostname(), "pid": os.getpid(), "token": ObjectId()}
+    _executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export")
+    _cleanup_task = asyncio.create_task(_cleanup_loop())
+
+    stale = [job["_id"] async for job in jobs_collection.find({"status": _UNFINISHED}, {"owner": 1})
+             if _interrupted(job.get("owner"))]
+    if stale:
+        await _fail_interrupted({"_id": {"$in": stale}})
+
+
+async def stop():
+    if _cleanup_task is not None:
+        _cleanup_task.cancel()
+    # Queued jobs are dropped and running ones die with the process
+    _executor.shutdown(wait=False, cancel_futures=True)
+    await _fail_interrupted({"owner.token": _owner["token"]})
+    if _sync_client is not None:
+        _sync_client.close()
@@ -0,0 +1,64 @@
+import csv
+import io
+import json
+
+from fastapi.responses import StreamingResponse
+
+# Rows are pulled from Mongo and written to the client one cursor batch at a
+# time, so memory stays flat however many documents match.
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_FORMATS = "^(ndjson|csv)$"
+
+
+def csv_value(value):
+    if isinstance(value, list):
+        return ";".join(str(v) for v in value)
+    if value is None:
+        return ""
+    return value
+
+
+async def _ndjson_chunks(cursor, shape):
+    lines = []
+    async for doc in cursor:
+        lines.append(json.dumps(shape(doc), default=str, ensure_ascii=False))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+async def _csv_chunks(cursor, shape, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    rows = 0
+    async for doc in cursor:
+        row = shape(doc)
+        writer.writerow([csv_value(row.get(field)) for field in fields])
+        rows += 1
+        if rows % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_response(collection, query: dict, projection: dict, shape, fields: list,
+                    export_format: str, filename: str) -> StreamingResponse:
+    cursor = collection.find(query, projection).sort("_id", 1).batch_size(EXPORT_BATCH_SIZE)
+
+    if export_format == "csv":
+        body = _csv_chunks(cursor, shape, fields)
+        media_type = "text/csv"
+    else:
+        body = _ndjson_chunks(cursor, shape)
+        media_type = "application/x-ndjson"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'},
+    )
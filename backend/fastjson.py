@@ -0,0 +1,31 @@
+import json
+from datetime import datetime
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib encoder is the fallback
+    orjson = None
+
+
+# List endpoints shape their documents inside Mongo (see paginate_shaped), so
+# the rows are already plain JSON types. Returning this response directly
+# skips FastAPI's jsonable_encoder pass and response_model re-validation;
+# response_model is still declared on those routes for the OpenAPI schema.
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, default=str)
+        return json.dumps(content, default=str, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+# A date the way Mongo's $toString renders it (ISO 8601, milliseconds, "Z"),
+# so rows shaped in Python match the ones shaped by a $project stage.
+# Anything else, e.g. a legacy string date or None, passes through like it
+# does in $toString.
+def iso_datetime(value):
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%dT%H:%M:%S.") + f"{value.microsecond // 1000:03d}Z"
+    return value
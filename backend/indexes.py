@@ -0,0 +1,83 @@
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, TEXT, IndexModel
+
+# Every index the API relies on, keyed by collection. The app builds them on
+# startup; create_indexes is a no-op for indexes that already exist with the
+# same name and keys, so restarts are cheap. tests/test_query_plans.py verifies
+# that each route query is served by one of these.
+INDEXES = {
+    "incident_reports": [
+        IndexModel([("status", ASCENDING), ("_id", DESCENDING)], name="status_id"),
+        IndexModel(
+            [
+                ("incident_details.location.country", ASCENDING),
+                ("incident_details.location.city", ASCENDING),
+                ("incident_details.date", ASCENDING),
+            ],
+            name="country_city_date",
+        ),
+        IndexModel([("incident_details.date", ASCENDING)], name="incident_date"),
+        # multikey: one entry per violation type
+        IndexModel(
+            [("incident_details.violation_types", ASCENDING), ("incident_details.date", ASCENDING)],
+            name="violation_types_date",
+        ),
+        IndexModel([("incident_details.location.coordinates", GEOSPHERE)], name="coordinates_2dsphere"),
+        # changes since the dashboard snapshot's watermark (dashboard/snapshot.py)
+        IndexModel([("updated_at", ASCENDING)], name="updated_at"),
+        # per-document language, see textsearch.py
+        IndexModel(
+            [("incident_details.description", TEXT)],
+            name="description_text",
+            default_language="english",
+            language_override="language",
+        ),
+    ],
+    "cases": [
+        # multikey: one entry per violation type
+        IndexModel([("violation_types", ASCENDING), ("date_occurred", ASCENDING)], name="violation_types_date"),
+        IndexModel([("location.country", ASCENDING), ("date_occurred", ASCENDING)], name="country_date"),
+        IndexModel([("date_occurred", ASCENDING)], name="date_occurred"),
+        IndexModel([("updated_at", ASCENDING)], name="updated_at"),
+        IndexModel(
+            [("title", TEXT), ("description", TEXT)],
+            name="title_description_text",
+            weights={"title": 5, "description": 1},
+            default_language="english",
+            language_override="language",
+        ),
+    ],
+    "victims": [
+        # multikey: one entry per linked case
+        IndexModel([("cases_involved", ASCENDING)], name="cases_involved"),
+        IndexModel([("risk_assessment.level", ASCENDING)], name="risk_level"),
+        IndexModel([("updated_at", ASCENDING)], name="updated_at"),
+    ],
+    "daily_rollups": [
+        IndexModel(
+            [("violation_type", ASCENDING), ("country", ASCENDING), ("day", ASCENDING), ("status", ASCENDING)],
+            name="rollup_key",
+            unique=True,
+        ),
+        IndexModel([("violation_type", ASCENDING), ("day", ASCENDING)], name="violation_type_day"),
+    ],
+    "case_status_history": [
+        IndexModel([("case_id", ASCENDING), ("timestamp", ASCENDING)], name="case_id_timestamp"),
+    ],
+    "report_status_history": [
+        IndexModel([("report_id", ASCENDING), ("timestamp", ASCENDING)], name="report_id_timestamp"),
+    ],
+    "report_lsh": [
+        # multikey: one entry per LSH band, see dedup.py
+        IndexModel([("bands", ASCENDING)], name="bands"),
+        IndexModel([("cluster", ASCENDING)], name="cluster"),
+    ],
+    "export_jobs": [
+        # TTL: Mongo deletes each job once its expires_at has passed
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+
+async def ensure_indexes(db):
+    for collection, models in INDEXES.items():
+        await db[collection].create_indexes(models)
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import deque
+
+import metrics
+
+# Write-behind batching for report intake, opt-in with INTAKE_FLUSH_MS.
+# Requests put their validated document on a bounded in-process queue and
+# wait; a single flusher writes the queue with one insert_many whenever
+# INTAKE_BATCH_SIZE documents are waiting or the oldest has waited
+# INTAKE_FLUSH_MS, and only then answers the requests (after a journaled
+# write, see routes/reports.py). Under a burst that is one round trip and one
+# journal commit per batch instead of per report. When the queue is full new
+# submissions are refused, and the route answers 503 with Retry-After.
+INTAKE_FLUSH_MS = os.getenv("INTAKE_FLUSH_MS")
+enabled = INTAKE_FLUSH_MS is not None
+FLUSH_SECONDS = float(INTAKE_FLUSH_MS or 0) / 1000
+INTAKE_BATCH_SIZE = int(os.getenv("INTAKE_BATCH_SIZE", "500"))
+INTAKE_QUEUE_SIZE = int(os.getenv("INTAKE_QUEUE_SIZE", "5000"))
+
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+logger = logging.getLogger(__name__)
+
+
+class Batcher:
+    def __init__(self, write, after=None):
+        # write(docs) inserts a batch and returns an error message (or None)
+        # per document, in order. after(docs), if given, is awaited with the
+        # documents that were written once their requests have been
+        # answered, so its work can't fail them; its errors are logged
+        self.write = write
+        self.after = after
+        self.pending = deque()  # (doc, future, queued at)
+        self.arrived = asyncio.Event()
+        self.full = asyncio.Event()
+        self.closed = True
+        self.task = None
+
+        self.batches = 0
+        self.documents = 0
+        self.failed = 0
+        self.rejected = 0
+        self.batch_sizes = metrics.Histogram(BATCH_SIZE_BUCKETS)
+        self.flush_latency = metrics.Histogram()
+
+    def start(self):
+        self.closed = False
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Refuse new documents and flush what is queued
+        self.closed = True
+        self.arrived.set()
+        self.full.set()
+        if self.task is not None:
+            await self.task
+
+    async def submit(self, doc):
+        """Queue doc and wait until its batch is written. Returns the write
+        error for doc, or None; raises asyncio.QueueFull when the queue is
+        full or the batcher isn't running."""
+        if self.closed or len(self.pending) >= INTAKE_QUEUE_SIZE:
+            self.rejected += 1
+            raise asyncio.QueueFull()
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((doc, future, time.perf_counter()))
+        self.arrived.set()
+        if len(self.pending) >= INTAKE_BATCH_SIZE:
+            self.full.set()
+        return await future
+
+    def retry_after(self):
+        """Seconds until the queue has room, judging by recent flushes."""
+        flush_seconds = self.flush_latency.total / self.flush_latency.count if self.batches else FLUSH_SECONDS
+        return max(1, math.ceil(len(self.pending) / INTAKE_BATCH_SIZE * (flush_seconds + FLUSH_SECONDS)))
+
+    async def _run(self):
+        while not (self.closed and not self.pending):
+            await self.arrived.wait()
+            if self.pending and not self.closed and len(self.pending) < INTAKE_BATCH_SIZE:
+                waited = time.perf_counter() - self.pending[0][2]
+                try:
+                    await asyncio.wait_for(self.full.wait(), max(0, FLUSH_SECONDS - waited))
+                except asyncio.TimeoutError:
+                    pass
+
+            batch = [self.pending.popleft() for _ in range(min(INTAKE_BATCH_SIZE, len(self.pending)))]
+            if not self.closed:
+                if not self.pending:
+                    self.arrived.clear()
+                if len(self.pending) < INTAKE_BATCH_SIZE:
+                    self.full.clear()
+            if batch:
+                await self._flush(batch)
+
+    async def _flush(self, batch):
+        started = time.perf_counter()
+        written = []
+        try:
+            errors = await self.write([doc for doc, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            self.failed += len(batch)
+        else:
+            for (doc, future, _), error in zip(batch, errors):
+                # done if the request was cancelled (client went away)
+                if not future.done():
+                    future.set_result(error)
+                if not error:
+                    written.append(doc)
+            self.failed += sum(1 for error in errors if error)
+        self.batches += 1
+        self.documents += len(batch)
+        self.batch_sizes.observe(len(batch))
+        self.flush_latency.observe(time.perf_counter() - started)
+        if written and self.after is not None:
+            try:
+                await self.after(written)
+            except Exception:
+                logger.exception("Post-write step failed for %d documents", len(written))
+
+    def samples(self, prefix):
+        """/metrics samples, for metrics.render."""
+        return [
+            (f"{prefix}_queue_depth", "gauge", len(self.pending)),
+            (f"{prefix}_batches_total", "counter", self.batches),
+            (f"{prefix}_documents_total", "counter", self.documents),
+            (f"{prefix}_failed_total", "counter", self.failed),
+            (f"{prefix}_rejected_total", "counter", self.rejected),
+            (f"{prefix}_batch_size", "histogram", self.batch_sizes),
+            (f"{prefix}_flush_duration_seconds", "histogram", self.flush_latency),
+        ]
@@ -0,0 +1,75 @@
+import asyncio
+import itertools
+import json
+from collections import deque
+
+# In-process fan-out for the live report feed (GET /reports/stream).
+#
+# Every event gets an id and is kept in a ring buffer, so a client that
+# reconnects with Last-Event-ID gets what it missed while it is still in the
+# buffer. Each client reads from its own bounded queue; when a slow client
+# lets its queue fill up it is disconnected instead of buffering without
+# limit, and its EventSource reconnects and replays from the ring buffer.
+REPLAY_BUFFER_SIZE = 1000
+CLIENT_QUEUE_SIZE = 100
+
+
+class Subscriber:
+    def __init__(self):
+        self.queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        self.overflowed = False
+
+
+class Feed:
+    def __init__(self):
+        self.buffer = deque(maxlen=REPLAY_BUFFER_SIZE)  # (event_id, event, data)
+        self.subscribers = set()
+        self.dropped = 0
+        # True while a change stream feeds events; the routes only publish
+        # their own writes when it is False (no replica set).
+        self.external = False
+        self._ids = itertools.count(1)
+
+    def publish(self, event, data, event_id=None):
+        event_id = event_id or str(next(self._ids))
+        message = (event_id, event, data)
+        self.buffer.append(message)
+        for subscriber in list(self.subscribers):
+            if subscriber.overflowed:
+                continue
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                subscriber.overflowed = True
+                self.dropped += 1
+                self.subscribers.discard(subscriber)
+
+    def publish_local(self, event, data):
+        if not self.external:
+            self.publish(event, data)
+
+    def knows(self, event_id):
+        return any(message[0] == event_id for message in self.buffer)
+
+    # Returns the buffered events after last_id and a subscriber for the ones
+    # that follow. There is no await in between, so nothing is missed or
+    # delivered twice.
+    def subscribe(self, last_id=None):
+        replay = []
+        if last_id is not None:
+            ids = [message[0] for message in self.buffer]
+            replay = list(self.buffer)[ids.index(last_id) + 1:]
+        subscriber = Subscriber()
+        self.subscribers.add(subscriber)
+        return replay, subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+
+feed = Feed()
+
+
+def sse_message(event_id, event, data):
+    payload = json.dumps(data, default=str, ensure_ascii=False)
+    return f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n"
@@ -1,10 +1,56 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+import database
+import cache
+from metrics import MetricsMiddleware
+import profiler
+import export_jobs
+import intake
+from indexes import ensure_indexes
 from routes import cases
 from routes import reports
+from routes import geo
+from routes import stream
 from routes import victims
-app = FastAPI()
+from routes import analytics
+from routes import evidence
+from routes import search
+from routes import admin
+from routes import exports
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await database.connect()
+    await ensure_indexes(database.db)
+    profiler.start(database.client)
+    stream.start()
+    await export_jobs.start()
+    if intake.enabled:
+        reports.report_intake.start()
+    yield
+    # Flush queued reports while the feed and database are still up
+    await reports.report_intake.stop()
+    await stream.stop()
+    await export_jobs.stop()
+    await cache.close()
+    database.close()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+if profiler.enabled:
+    app.add_middleware(profiler.RouteContextMiddleware)
 
 app.include_router(cases.router)
+app.include_router(geo.router)
+app.include_router(stream.router)
 app.include_router(reports.router)
 
 app.include_router(victims.router)
+app.include_router(analytics.router)
+app.include_router(evidence.router)
+app.include_router(search.router)
+app.include_router(admin.router)
+app.include_router(exports.router)
@@ -0,0 +1,194 @@
+import threading
+import time
+from bisect import bisect_left
+
+from pymongo import monitoring
+
+# Request and MongoDB command metrics, rendered in the Prometheus text format
+# at GET /metrics. Recording is a dict lookup, a bisect and a few integer
+# increments, so it stays cheap on the hot path. Requests are labelled by
+# route template (/cases/{case_id}), never by raw path, to bound cardinality.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+request_latency = {}    # (method, route) -> Histogram
+request_count = {}      # (method, route, status) -> int
+request_errors = {}     # (method, route) -> int, 5xx responses and unhandled exceptions
+requests_in_flight = {}  # method -> int (the route isn't known until routing is done)
+
+command_latency = {}    # (command, collection) -> Histogram
+command_failures = {}   # (command, collection) -> int
+command_documents = {}  # (command, collection) -> documents returned
+
+# Commands run on Motor's executor threads, so their metrics take a lock
+_command_lock = threading.Lock()
+
+
+def _route_label(scope):
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware; unlike BaseHTTPMiddleware it doesn't wrap the
+    response body, so streaming and file responses pass through untouched."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        requests_in_flight[method] = requests_in_flight.get(method, 0) + 1
+        status = 500  # kept if the app raises before starting a response
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            requests_in_flight[method] -= 1
+            key = (method, _route_label(scope))
+            histogram = request_latency.get(key)
+            if histogram is None:
+                histogram = request_latency[key] = Histogram()
+            histogram.observe(elapsed)
+            count_key = key + (status,)
+            request_count[count_key] = request_count.get(count_key, 0) + 1
+            if status >= 500:
+                request_errors[key] = request_errors.get(key, 0) + 1
+
+
+# find, aggregate and getMore return documents in a cursor batch; writes
+# and other commands don't return documents
+def _returned_documents(reply):
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", ())))
+    return 0
+
+
+class CommandMetrics(monitoring.CommandListener):
+    def __init__(self):
+        self.pending = {}  # (connection, request_id) -> (command, collection)
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = event.command.get("collection")
+        if not isinstance(collection, str):
+            collection = ""
+        self.pending[(event.connection_id, event.request_id)] = (event.command_name, collection)
+
+    def succeeded(self, event):
+        key = self.pending.pop((event.connection_id, event.request_id), None)
+        if key is None:
+            return
+        returned = _returned_documents(event.reply)
+        with _command_lock:
+            histogram = command_latency.get(key)
+            if histogram is None:
+                histogram = command_latency[key] = Histogram()
+            histogram.observe(event.duration_micros / 1e6)
+            if returned:
+                command_documents[key] = command_documents.get(key, 0) + returned
+
+    def failed(self, event):
+        key = self.pending.pop((event.connection_id, event.request_id), None)
+        if key is None:
+            return
+        with _command_lock:
+            histogram = command_latency.get(key)
+            if histogram is None:
+                histogram = command_latency[key] = Histogram()
+            histogram.observe(event.duration_micros / 1e6)
+            command_failures[key] = command_failures.get(key, 0) + 1
+
+
+command_listener = CommandMetrics()
+
+
+def _labels(names, values):
+    return ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+
+
+def _histogram_lines(name, label_names, histograms):
+    lines = [f"# TYPE {name} histogram"]
+    for key, histogram in sorted(histograms.items()):
+        labels = _labels(label_names, key)
+        bucket_labels = f"{labels}," if labels else ""
+        series_labels = f"{{{labels}}}" if labels else ""
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{bucket_labels}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{bucket_labels}le="+Inf"}} {histogram.count}')
+        lines.append(f"{name}_sum{series_labels} {histogram.total}")
+        lines.append(f"{name}_count{series_labels} {histogram.count}")
+    return lines
+
+
+def _counter_lines(name, kind, label_names, values):
+    lines = [f"# TYPE {name} {kind}"]
+    for key, value in sorted(values.items()):
+        lines.append(f"{name}{{{_labels(label_names, key)}}} {value}")
+    return lines
+
+
+def render(extra=()):
+    """Prometheus text exposition of every metric, plus (name, kind, value)
+    samples from other modules (cache, live feed, intake); a histogram
+    sample's value is a Histogram."""
+    with _command_lock:
+        commands = {key: _copy(h) for key, h in command_latency.items()}
+        failures = dict(command_failures)
+        documents = dict(command_documents)
+
+    lines = []
+    lines += _histogram_lines("hrm_http_request_duration_seconds", ("method", "route"), dict(request_latency))
+    lines += _counter_lines("hrm_http_requests_total", "counter", ("method", "route", "status"), dict(request_count))
+    lines += _counter_lines("hrm_http_request_errors_total", "counter", ("method", "route"), dict(request_errors))
+    lines += _counter_lines("hrm_http_requests_in_flight", "gauge", ("method",),
+                            {(method,): n for method, n in requests_in_flight.items()})
+    lines += _histogram_lines("hrm_mongo_command_duration_seconds", ("command", "collection"), commands)
+    lines += _counter_lines("hrm_mongo_command_failures_total", "counter", ("command", "collection"), failures)
+    lines += _counter_lines("hrm_mongo_documents_returned_total", "counter", ("command", "collection"), documents)
+    for name, kind, value in extra:
+        if kind == "histogram":
+            lines += _histogram_lines(name, (), {(): _copy(value)})
+            continue
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def _copy(histogram):
+    copy = Histogram(histogram.buckets)
+    copy.counts = list(histogram.counts)
+    copy.total = histogram.total
+    copy.count = histogram.count
+    return copy
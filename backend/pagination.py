@@ -0,0 +1,56 @@
+import base64
+import binascii
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+# Cursors are the urlsafe-base64 of the last returned ObjectId. Pages are
+# ordered newest first on _id, which also tracks creation time.
+def encode_cursor(last_id: ObjectId) -> str:
+    return base64.urlsafe_b64encode(last_id.binary).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> ObjectId:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return ObjectId(raw)
+    except (binascii.Error, InvalidId, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+# $project expression for a field that may be missing, so every row has the
+# same keys (a plain "$path" drops the key when the field is absent)
+def project_field(path: str, default=None):
+    return {"$ifNull": [f"${path}", default]}
+
+
+def shaped_page_pipeline(query: dict, shape: dict, limit: int):
+    return [
+        {"$match": query},
+        {"$sort": {"_id": -1}},
+        {"$limit": limit + 1},
+        {"$project": {"_id": 0, **shape}},
+    ]
+
+
+# Keyset pagination (newest first, one extra row to tell whether another page
+# follows). Documents come back already shaped by a $project stage, so the
+# route can return them without touching each row. The shape must include the
+# stringified _id under id_field.
+async def paginate_shaped(collection, query: dict, shape: dict, limit: int, cursor: str = None,
+                          id_field: str = "id"):
+    if cursor:
+        query = {**query, "_id": {"$lt": decode_cursor(cursor)}}
+
+    docs = await collection.aggregate(shaped_page_pipeline(query, shape, limit)).to_list(length=None)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(ObjectId(docs[-1][id_field]))
+    return docs, next_cursor
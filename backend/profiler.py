@@ -0,0 +1,233 @@
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+
+from pymongo import monitoring
+from pymongo.errors import PyMongoError
+
+# Opt-in slow-query profiler. Set SLOW_QUERY_MS to record every find,
+# aggregate, count and distinct that takes at least that long. Queries are
+# grouped by shape (the command with its literal values replaced by "?"),
+# together with the routes that issued them and an explain("executionStats")
+# summary: documents examined vs returned, the index used, and whether the
+# plan scans the collection. Results are served at GET /admin/slow-queries.
+#
+# Explain re-runs the query, so it is done in the background, at most once
+# per shape every EXPLAIN_INTERVAL_SECONDS.
+SLOW_QUERY_MS = os.getenv("SLOW_QUERY_MS")
+enabled = SLOW_QUERY_MS is not None
+threshold_micros = float(SLOW_QUERY_MS or 0) * 1000
+
+EXPLAIN_INTERVAL_SECONDS = 300
+MAX_SHAPES = 500
+MAX_ROUTES_PER_SHAPE = 10
+
+PROFILED_COMMANDS = {"find", "aggregate", "count", "distinct"}
+# Session and transport fields that explain doesn't accept
+_NOT_EXPLAINABLE = {"lsid", "txnNumber", "autocommit", "startTransaction", "readConcern"}
+
+_request_scope = contextvars.ContextVar("request_scope", default=None)
+_lock = threading.Lock()
+_loop = None
+_client = None
+shapes = {}  # shape key -> stats
+dropped = 0  # slow queries not recorded because MAX_SHAPES was reached
+
+
+class RouteContextMiddleware:
+    """Makes the current request visible to the command listener. Motor runs
+    commands on executor threads with a copy of the caller's context, so the
+    listener sees the scope and reads the matched route from it."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        token = _request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_scope.reset(token)
+
+
+def _current_route():
+    scope = _request_scope.get()
+    if scope is None:
+        return "(no request)"
+    route = scope.get("route")
+    return f"{scope.get('method')} {getattr(route, 'path', None) or scope.get('path')}"
+
+
+def normalize(value):
+    if isinstance(value, dict):
+        return {key: normalize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        # $in lists and the like differ in length between requests; pipelines
+        # and $or branches don't, so keep lists of documents whole
+        if value and all(isinstance(item, dict) for item in value):
+            return [normalize(item) for item in value]
+        return "?"
+    if isinstance(value, str) and value.startswith("$"):
+        return value  # a field path in an aggregation expression, not a value
+    return "?"
+
+
+def query_shape(command_name, command):
+    if command_name == "aggregate":
+        return {"pipeline": normalize(command.get("pipeline", []))}
+    if command_name == "distinct":
+        return {"key": command.get("key"), "query": normalize(command.get("query", {}))}
+    shape = {"filter": normalize(command.get("filter", command.get("query", {})))}
+    if command.get("sort"):
+        shape["sort"] = dict(command["sort"])
+    return shape
+
+
+def _find_key(value, key):
+    if isinstance(value, dict):
+        if key in value:
+            return value[key]
+        value = list(value.values())
+    if isinstance(value, list):
+        for item in value:
+            found = _find_key(item, key)
+            if found is not None:
+                return found
+    return None
+
+
+def _plan_stages(plan, stages):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan)
+        for item in plan.values():
+            _plan_stages(item, stages)
+    elif isinstance(plan, list):
+        for item in plan:
+            _plan_stages(item, stages)
+    return stages
+
+
+def explain_summary(explain):
+    # find explains have queryPlanner/executionStats at the top level;
+    # aggregations nest them under the first stage's $cursor
+    stats = _find_key(explain, "executionStats") or {}
+    stages = _plan_stages(_find_key(explain, "winningPlan") or {}, [])
+    return {
+        "docs_examined": stats.get("totalDocsExamined"),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "returned": stats.get("nReturned"),
+        "execution_ms": stats.get("executionTimeMillis"),
+        "indexes": sorted({stage["indexName"] for stage in stages if "indexName" in stage}),
+        "collscan": any(stage["stage"] == "COLLSCAN" for stage in stages),
+    }
+
+
+async def _explain(key, database_name, command):
+    try:
+        explain = await _client[database_name].command(
+            {"explain": command, "verbosity": "executionStats"})
+        summary = explain_summary(explain)
+    except PyMongoError as e:
+        summary = {"error": str(e)}
+    with _lock:
+        if key in shapes:
+            shapes[key]["explain"] = summary
+
+
+def _record(event, started):
+    global dropped
+    command_name, database_name, command, route = started
+    collection = command.get(command_name)
+    shape = query_shape(command_name, command)
+    key = f"{database_name}.{collection} {command_name} {json.dumps(shape, sort_keys=True, default=str)}"
+    elapsed_ms = event.duration_micros / 1000
+    now = time.time()
+
+    with _lock:
+        entry = shapes.get(key)
+        if entry is None:
+            if len(shapes) >= MAX_SHAPES:
+                dropped += 1
+                return
+            entry = shapes[key] = {
+                "collection": collection,
+                "command": command_name,
+                "shape": shape,
+                "count": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "routes": {},
+                "explain": None,
+                "explained_at": 0,
+            }
+        entry["count"] += 1
+        entry["total_ms"] += elapsed_ms
+        entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+        entry["last_seen"] = now
+        if route in entry["routes"] or len(entry["routes"]) < MAX_ROUTES_PER_SHAPE:
+            entry["routes"][route] = entry["routes"].get(route, 0) + 1
+
+        explain_due = now - entry["explained_at"] >= EXPLAIN_INTERVAL_SECONDS
+        if explain_due:
+            entry["explained_at"] = now
+
+    if explain_due and _loop is not None:
+        explainable = {k: v for k, v in command.items() if not k.startswith("$") and k not in _NOT_EXPLAINABLE}
+        _loop.call_soon_threadsafe(asyncio.ensure_future, _explain(key, database_name, explainable))
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    def __init__(self):
+        self.pending = {}  # (connection, request_id) -> (command, database, command document, route)
+
+    def started(self, event):
+        if event.command_name in PROFILED_COMMANDS:
+            self.pending[(event.connection_id, event.request_id)] = (
+                event.command_name, event.database_name, dict(event.command), _current_route())
+
+    def succeeded(self, event):
+        started = self.pending.pop((event.connection_id, event.request_id), None)
+        if started is not None and event.duration_micros >= threshold_micros:
+            _record(event, started)
+
+    def failed(self, event):
+        self.pending.pop((event.connection_id, event.request_id), None)
+
+
+listener = SlowQueryListener()
+
+
+# Called from the app lifespan; explains run on its loop with the app's client
+def start(client):
+    global _loop, _client
+    _loop = asyncio.get_running_loop()
+    _client = client
+
+
+def report(sort="total_ms", limit=50):
+    with _lock:
+        entries = [{**entry, "routes": dict(entry["routes"])} for entry in shapes.values()]
+    for entry in entries:
+        entry["avg_ms"] = round(entry["total_ms"] / entry["count"], 2)
+        entry["total_ms"] = round(entry["total_ms"], 2)
+        entry["max_ms"] = round(entry["max_ms"], 2)
+        del entry["explained_at"]
+    entries.sort(key=lambda entry: entry[sort], reverse=True)
+    return {
+        "enabled": enabled,
+        "threshold_ms": threshold_micros / 1000 if enabled else None,
+        "shapes": len(entries),
+        "dropped": dropped,
+        "items": entries[:limit],
+    }
+
+
+def reset():
+    global dropped
+    with _lock:
+        shapes.clear()
+        dropped = 0
@@ -0,0 +1,22 @@
+"""Backfill the daily analytics rollups from incident_reports.
+
+Run from the backend folder after bulk imports or the date migration:
+
+    python rebuild_rollups.py
+"""
+import asyncio
+
+import database
+from indexes import ensure_indexes
+from rollups import rebuild
+
+
+async def main():
+    await ensure_indexes(database.db)
+    rows = await rebuild()
+    database.close()
+    print(f"✅ Rebuilt daily_rollups ({rows} rows).")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,40 @@
+"""Rebuild the near-duplicate clusters of incident reports.
+
+Intake puts each new report in the cluster of its best match only, so two
+reports that matched different members of the same group can end up in
+different clusters. This pass scores every pair of reports sharing an LSH
+band and regroups them as connected components. Bands shared by more than
+dedup.MAX_BUCKET_SIZE reports (templated text) are skipped. Run from the
+backend folder:
+
+    python recluster_reports.py                    # recluster the existing index
+    python recluster_reports.py --rebuild          # re-index every report first
+    python recluster_reports.py --threshold 0.8    # stricter clusters
+
+Use --rebuild after bulk imports that bypassed the API, or after changing the
+signature settings in dedup.py.
+"""
+import argparse
+import asyncio
+
+import database
+import dedup
+from indexes import ensure_indexes
+
+
+async def main(args):
+    await ensure_indexes(database.db)
+    if args.rebuild:
+        indexed = await dedup.rebuild_index()
+        print(f"🔁 Indexed {indexed} reports.")
+    clusters, clustered = await dedup.recluster(args.threshold)
+    database.close()
+    print(f"✅ {clusters} clusters covering {clustered} reports.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild near-duplicate report clusters")
+    parser.add_argument("--rebuild", action="store_true", help="re-index every report before clustering")
+    parser.add_argument("--threshold", type=float, default=dedup.CLUSTER_SCORE,
+                        help=f"minimum pair score to cluster (default {dedup.CLUSTER_SCORE})")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,83 @@
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from database import db
+
+# Daily report counts by country × violation type × status. Each report adds
+# one row per violation type plus one row with violation_type None, which
+# counts the report itself (so per-country and per-day totals don't double
+# count reports that list several violation types).
+rollups_collection = db.daily_rollups
+
+
+def _day(value):
+    if not isinstance(value, datetime):
+        return None
+    return datetime(value.year, value.month, value.day)
+
+
+def rollup_updates(report, status, delta):
+    details = report.get("incident_details", {})
+    day = _day(details.get("date"))
+    if day is None:
+        return []
+
+    country = details.get("location", {}).get("country")
+    operations = []
+    for violation_type in [None] + list(details.get("violation_types", [])):
+        operations.append(UpdateOne(
+            {"day": day, "country": country, "violation_type": violation_type, "status": status},
+            {"$inc": {"count": delta}},
+            upsert=True,
+        ))
+    return operations
+
+
+async def record_reports(reports):
+    operations = []
+    for report in reports:
+        operations += rollup_updates(report, report.get("status"), 1)
+    if operations:
+        await rollups_collection.bulk_write(operations, ordered=False)
+
+
+# reports carry the status they are moving from; session lets the status
+# change and its rollups commit together (see status_changes.py)
+async def move_statuses(reports, new_status, session=None):
+    operations = []
+    for report in reports:
+        if report.get("status") != new_status:
+            operations += rollup_updates(report, report.get("status"), -1) + rollup_updates(report, new_status, 1)
+    if operations:
+        await rollups_collection.bulk_write(operations, ordered=False, session=session)
+
+
+async def rebuild(database=db):
+    # Recompute every rollup from incident_reports; $out swaps the collection
+    # in atomically and keeps its indexes.
+    pipeline = [
+        {"$match": {"incident_details.date": {"$type": "date"}}},
+        {"$project": {
+            "day": {"$dateTrunc": {"date": "$incident_details.date", "unit": "day"}},
+            "country": "$incident_details.location.country",
+            "status": 1,
+            "violation_type": {"$concatArrays": [[None], {"$ifNull": ["$incident_details.violation_types", []]}]},
+        }},
+        {"$unwind": "$violation_type"},
+        {"$group": {
+            "_id": {"day": "$day", "country": "$country", "violation_type": "$violation_type", "status": "$status"},
+            "count": {"$sum": 1},
+        }},
+        {"$project": {
+            "_id": 0,
+            "day": "$_id.day",
+            "country": "$_id.country",
+            "violation_type": "$_id.violation_type",
+            "status": "$_id.status",
+            "count": 1,
+        }},
+        {"$out": rollups_collection.name},
+    ]
+    await database.incident_reports.aggregate(pipeline).to_list(length=None)
+    return await database[rollups_collection.name].count_documents({})
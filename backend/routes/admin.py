@@ -0,0 +1,46 @@
+from fastapi import APIRouter, Query
+from fastapi.responses import PlainTextResponse
+
+import cache
+import metrics
+import profiler
+from live import feed
+from routes.reports import report_intake
+
+router = APIRouter()
+
+
+# GET - Hit/miss counters of the read-through cache
+@router.get("/admin/cache")
+async def cache_stats():
+    return cache.stats()
+
+
+# GET - Prometheus scrape endpoint
+@router.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    stats = cache.stats()
+    extra = [
+        ("hrm_cache_hits_total", "counter", stats["hits"]),
+        ("hrm_cache_misses_total", "counter", stats["misses"]),
+        ("hrm_cache_evictions_total", "counter", stats["evictions"]),
+        ("hrm_live_subscribers", "gauge", len(feed.subscribers)),
+        ("hrm_live_dropped_clients_total", "counter", feed.dropped),
+        *report_intake.samples("hrm_report_intake"),
+    ]
+    return PlainTextResponse(metrics.render(extra), media_type="text/plain; version=0.0.4")
+
+
+# GET - Slow queries grouped by shape (only recorded when SLOW_QUERY_MS is set)
+@router.get("/admin/slow-queries")
+async def slow_queries(
+    sort: str = Query("total_ms", pattern="^(total_ms|count|max_ms|avg_ms)$"),
+    limit: int = Query(50, ge=1, le=500)
+):
+    return profiler.report(sort, limit)
+
+
+@router.delete("/admin/slow-queries")
+async def reset_slow_queries():
+    profiler.reset()
+    return {"message": "Slow query stats cleared"}
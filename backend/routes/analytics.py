@@ -0,0 +1,80 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+from datetime import datetime
+from rollups import rollups_collection
+
+router = APIRouter()
+
+
+# Build the rollup $match. violation_type None selects the per-report rows.
+def build_rollup_match(violation_type=None, country=None, status=None, from_date=None, to_date=None):
+    match = {"violation_type": violation_type}
+    if country:
+        match["country"] = country
+    if status:
+        match["status"] = status
+    if from_date or to_date:
+        try:
+            day = {}
+            if from_date:
+                day["$gte"] = datetime.strptime(from_date, "%Y-%m-%d")
+            if to_date:
+                day["$lte"] = datetime.strptime(to_date, "%Y-%m-%d")
+            match["day"] = day
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    return match
+
+
+def grouped_pipeline(match, key, sort):
+    return [
+        {"$match": match},
+        {"$group": {"_id": key, "count": {"$sum": "$count"}}},
+        {"$match": {"count": {"$gt": 0}}},
+        {"$sort": sort},
+    ]
+
+
+async def _grouped(match, key, sort):
+    return await rollups_collection.aggregate(grouped_pipeline(match, key, sort)).to_list(length=None)
+
+
+@router.get("/analytics/violations")
+async def violations_by_type(
+    violation_type: Optional[str] = Query(None),
+    country: Optional[str] = Query(None),
+    status: Optional[str] = Query(None),
+    from_date: Optional[str] = Query(None),
+    to_date: Optional[str] = Query(None)
+):
+    match = build_rollup_match(violation_type, country, status, from_date, to_date)
+    if not violation_type:
+        match["violation_type"] = {"$ne": None}
+    rows = await _grouped(match, "$violation_type", {"count": -1})
+    return [{"violation_type": r["_id"], "count": r["count"]} for r in rows]
+
+
+@router.get("/analytics/geodata")
+async def reports_by_country(
+    violation_type: Optional[str] = Query(None),
+    country: Optional[str] = Query(None),
+    status: Optional[str] = Query(None),
+    from_date: Optional[str] = Query(None),
+    to_date: Optional[str] = Query(None)
+):
+    match = build_rollup_match(violation_type, country, status, from_date, to_date)
+    rows = await _grouped(match, "$country", {"count": -1})
+    return [{"country": r["_id"], "count": r["count"]} for r in rows]
+
+
+@router.get("/analytics/timeline")
+async def reports_timeline(
+    violation_type: Optional[str] = Query(None),
+    country: Optional[str] = Query(None),
+    status: Optional[str] = Query(None),
+    from_date: Optional[str] = Query(None),
+    to_date: Optional[str] = Query(None)
+):
+    match = build_rollup_match(violation_type, country, status, from_date, to_date)
+    rows = await _grouped(match, "$day", {"_id": 1})
+    return [{"date": r["_id"].strftime("%Y-%m-%d"), "count": r["count"]} for r in rows]
@@ -1,19 +1,165 @@
 from fastapi import APIRouter, HTTPException, Query, UploadFile, File, Form
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from bson import ObjectId
 from database import cases_collection, db
+from pagination import paginate_shaped, project_field, DEFAULT_LIMIT, MAX_LIMIT
+from fastjson import FastJSONResponse
+from typing import List, Optional
+from exporting import export_response, EXPORT_FORMATS
+from evidence import store_upload, release, released_on_failure
+from textsearch import detect_language
+import cache
+from status_changes import BulkStatusUpdate, resolve_targets, change_status, summarize
+from routes.victims import CaseVictim, CASE_VICTIM_SHAPE
 from datetime import datetime
-import os
 
 router = APIRouter()
 
 # Collection لتخزين سجل التعديلات
 status_history_collection = db.case_status_history
 
+# الحقول التي ترجعها قائمة القضايا فقط
+CASE_LIST_PROJECTION = {
+    "title": 1,
+    "description": 1,
+    "status": 1,
+    "priority": 1,
+    "violation_types": 1,
+    "location": 1,
+}
+
+# نفس حقول case_summary لكن تُشكَّل داخل Mongo لقائمة القضايا
+CASE_LIST_SHAPE = {
+    "id": {"$toString": "$_id"},
+    "title": project_field("title"),
+    "description": project_field("description"),
+    "status": project_field("status", ""),
+    "priority": project_field("priority", ""),
+    "violation_types": project_field("violation_types", []),
+    "location": project_field("location", {}),
+}
+
+# الفلاتر المسموحة (نفس معاملات build_case_query)
+CASE_FILTERS = {"violation_type", "country", "from_date", "to_date"}
+
+# الحد الأقصى لعدد القضايا في طلب ملفات متعددة
+MAX_DOSSIER_IDS = 100
+
+CASE_DOSSIER_SHAPE = {**CASE_LIST_SHAPE, "evidence": project_field("evidence", [])}
+
+CASE_EXPORT_FIELDS = [
+    "id", "title", "description", "status", "priority",
+    "violation_types", "country", "region",
+]
+
 # Model لتعديل الحالة فقط
 class UpdateCaseStatus(BaseModel):
     status: str
 
+class CaseSummary(BaseModel):
+    id: str
+    title: Optional[str] = None
+    description: Optional[str] = None
+    status: str = ""
+    priority: str = ""
+    violation_types: List[str] = []
+    location: dict = {}
+
+class CasePage(BaseModel):
+    items: List[CaseSummary]
+    next_cursor: Optional[str] = None
+
+class CaseDetail(CaseSummary):
+    evidence: List[dict] = []
+
+class StatusChange(BaseModel):
+    status: str
+    timestamp: Optional[str] = None
+
+class CaseDossier(BaseModel):
+    case: CaseDetail
+    victims: List[CaseVictim]
+    status_history: List[StatusChange]
+
+class DossierRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=MAX_DOSSIER_IDS)
+
+class DossierBatch(BaseModel):
+    items: List[CaseDossier]
+    missing: List[str]
+
+
+def build_case_query(violation_type=None, country=None, from_date=None, to_date=None):
+    query = {}
+
+    if violation_type:
+        query["violation_types"] = violation_type
+
+    if country:
+        query["location.country"] = country
+
+    if from_date and to_date:
+        try:
+            from_dt = datetime.strptime(from_date, "%Y-%m-%d")
+            to_dt = datetime.strptime(to_date, "%Y-%m-%d")
+            query["date_occurred"] = {"$gte": from_dt, "$lte": to_dt}
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    return query
+
+
+def case_summary(case):
+    return {
+        "id": str(case["_id"]),
+        "title": case["title"],
+        "description": case["description"],
+        "status": case.get("status", ""),
+        "priority": case.get("priority", ""),
+        "violation_types": case.get("violation_types", []),
+        "location": case.get("location", {}),
+    }
+
+
+def parse_case_id(case_id):
+    if not ObjectId.is_valid(case_id):
+        raise HTTPException(status_code=400, detail="Invalid case ID format")
+    return ObjectId(case_id)
+
+
+# القضية مع الضحايا المرتبطين وسجل الحالات بترتيب زمني، في استعلام واحد
+# (يستخدم فهرسي victims.cases_involved و case_status_history.case_id+timestamp)
+def dossier_pipeline(case_ids):
+    return [
+        {"$match": {"_id": {"$in": case_ids}}},
+        {"$lookup": {
+            "from": db.victims.name,
+            "localField": "_id",
+            "foreignField": "cases_involved",
+            "pipeline": [{"$project": CASE_VICTIM_SHAPE}],
+            "as": "victims",
+        }},
+        {"$lookup": {
+            "from": status_history_collection.name,
+            "localField": "_id",
+            "foreignField": "case_id",
+            "pipeline": [
+                {"$sort": {"timestamp": 1}},
+                {"$project": {"_id": 0, "status": "$new_status", "timestamp": {"$toString": "$timestamp"}}},
+            ],
+            "as": "status_history",
+        }},
+        {"$project": {"_id": 0, "case": CASE_DOSSIER_SHAPE, "victims": 1, "status_history": 1}},
+    ]
+
+
+# صف مسطح للتصدير (CSV لا يدعم الكائنات المتداخلة)
+def case_row(case):
+    row = case_summary(case)
+    location = row.pop("location")
+    row["country"] = location.get("country")
+    row["region"] = location.get("region")
+    return row
+
 # ✅ إنشاء قضية (بملف مرفق اختياري)
 @router.post("/cases")
 async def create_case(
@@ -32,17 +178,10 @@ async def create_case(
 
     # معالجة الملف فقط إذا كان فعلياً مرفوع ومش فاضي
     if file and file.filename != "":
-        upload_dir = "uploads"
-        os.makedirs(upload_dir, exist_ok=True)
-        file_location = f"{upload_dir}/{file.filename}"
-
-        with open(file_location, "wb") as f:
-            content = await file.read()
-            f.write(content)
-
+        stored = await store_upload(file)
         evidence.append({
             "type": "file",
-            "url": file_location,
+            **stored,
             "description": "Uploaded evidence"
         })
 
@@ -59,39 +198,52 @@ async def create_case(
         "date_occurred": date_occurred,
         "date_reported": date_reported,
         "evidence": evidence,
+        "language": detect_language(title, description),
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow()
     }
 
-    result = cases_collection.insert_one(new_case)
+    async with released_on_failure(evidence):
+        result = await cases_collection.insert_one(new_case)
     return {"id": str(result.inserted_id), "message": "Case created (with or without file)"}
 
-@router.get("/cases")
-def get_cases(
+@router.get("/cases", response_model=CasePage)
+async def get_cases(
     violation_type: str = Query(None),
     country: str = Query(None),
     from_date: str = Query(None),
-    to_date: str = Query(None)
+    to_date: str = Query(None),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: str = Query(None)
 ):
-    query = {}
+    query = build_case_query(violation_type, country, from_date, to_date)
 
-    if violation_type:
-        query["violation_types"] = violation_type
+    cases, next_cursor = await paginate_shaped(cases_collection, query, CASE_LIST_SHAPE, limit, cursor)
 
-    if country:
-        query["location.country"] = country
+    return FastJSONResponse({"items": cases, "next_cursor": next_cursor})
 
-    if from_date and to_date:
-        try:
-            from_dt = datetime.strptime(from_date, "%Y-%m-%d")
-            to_dt = datetime.strptime(to_date, "%Y-%m-%d")
-            query["date_occurred"] = {"$gte": from_dt, "$lte": to_dt}
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+# تصدير كل القضايا المطابقة كـ NDJSON أو CSV
+@router.get("/cases/export")
+async def export_cases(
+    violation_type: str = Query(None),
+    country: str = Query(None),
+    from_date: str = Query(None),
+    to_date: str = Query(None),
+    export_format: str = Query("ndjson", alias="format", pattern=EXPORT_FORMATS)
+):
+    query = build_case_query(violation_type, country, from_date, to_date)
+    return export_response(cases_collection, query, CASE_LIST_PROJECTION, case_row,
+                           CASE_EXPORT_FIELDS, export_format, "cases")
+
+@router.get("/cases/{case_id}")
+async def get_case(case_id: str):
+    case_id = ObjectId(case_id)
 
-    cases = []
-    for case in cases_collection.find(query):
-        cases.append({
+    async def load():
+        case = await cases_collection.find_one({"_id": case_id})
+        if not case:
+            return None
+        return {
             "id": str(case["_id"]),
             "title": case["title"],
             "description": case["description"],
@@ -99,48 +251,64 @@ def get_cases(
             "priority": case.get("priority", ""),
             "violation_types": case.get("violation_types", []),
             "location": case.get("location", {}),
-        })
-
-    return cases
+            "evidence": case.get("evidence", [])
+        }
 
-@router.get("/cases/{case_id}")
-def get_case(case_id: str):
-    case = cases_collection.find_one({"_id": ObjectId(case_id)})
+    case = await cache.get_or_load(f"case:{case_id}", load)
     if not case:
         raise HTTPException(status_code=404, detail="Case not found")
+    return case
 
-    return {
-        "id": str(case["_id"]),
-        "title": case["title"],
-        "description": case["description"],
-        "status": case.get("status", ""),
-        "priority": case.get("priority", ""),
-        "violation_types": case.get("violation_types", []),
-        "location": case.get("location", {}),
-        "evidence": case.get("evidence", [])
-    }
+# ✅ ملف القضية كامل: القضية + الضحايا + سجل الحالات
+@router.get("/cases/{case_id}/dossier", response_model=CaseDossier)
+async def get_case_dossier(case_id: str):
+    dossiers = await cases_collection.aggregate(dossier_pipeline([parse_case_id(case_id)])).to_list(length=None)
+    if not dossiers:
+        raise HTTPException(status_code=404, detail="Case not found")
+    return FastJSONResponse(dossiers[0])
 
-@router.patch("/cases/{case_id}")
-def update_case_status(case_id: str, update: UpdateCaseStatus):
-    result = cases_collection.update_one(
-        {"_id": ObjectId(case_id)},
-        {"$set": {"status": update.status, "updated_at": datetime.utcnow()}}
-    )
+# ملفات عدة قضايا دفعة واحدة، بنفس ترتيب المعرفات المطلوبة
+@router.post("/cases/dossiers", response_model=DossierBatch)
+async def get_case_dossiers(request: DossierRequest):
+    case_ids = list(dict.fromkeys(parse_case_id(case_id) for case_id in request.ids))
+    ids = [str(case_id) for case_id in case_ids]
+    dossiers = await cases_collection.aggregate(dossier_pipeline(case_ids)).to_list(length=None)
+
+    by_id = {dossier["case"]["id"]: dossier for dossier in dossiers}
+    return FastJSONResponse({
+        "items": [by_id[case_id] for case_id in ids if case_id in by_id],
+        "missing": [case_id for case_id in ids if case_id not in by_id],
+    })
 
-    if result.matched_count == 0:
+# ✅ تعديل حالة عدة قضايا دفعة واحدة (قائمة معرفات أو فلتر) مع سجل الحالات
+# لازم تكون قبل /cases/{case_id} عشان ما يلتقطها
+@router.patch("/cases/status")
+async def bulk_update_case_status(request: BulkStatusUpdate):
+    docs, outcomes = await resolve_targets(cases_collection, request, build_case_query, CASE_FILTERS, {"status": 1})
+    applied, changed = await change_status(cases_collection, status_history_collection, "case_id",
+                                           docs, request.status)
+    await cache.invalidate_many([f"case:{case['_id']}" for case in applied])
+    return summarize(outcomes + changed)
+
+@router.patch("/cases/{case_id}")
+async def update_case_status(case_id: str, update: UpdateCaseStatus):
+    case = await cases_collection.find_one({"_id": ObjectId(case_id)}, {"status": 1})
+    if not case:
         raise HTTPException(status_code=404, detail="Case not found")
 
-    status_history_collection.insert_one({
-        "case_id": ObjectId(case_id),
-        "new_status": update.status,
-        "timestamp": datetime.utcnow()
-    })
+    applied, outcomes = await change_status(cases_collection, status_history_collection, "case_id",
+                                            [case], update.status)
+    if outcomes[0]["result"] == "conflict":
+        raise HTTPException(status_code=409, detail="Case status was changed by another request, try again")
+    await cache.invalidate(f"case:{case['_id']}")
 
     return {"message": "Case status updated", "new_status": update.status}
 
 @router.delete("/cases/{case_id}")
-def delete_case(case_id: str):
-    result = cases_collection.delete_one({"_id": ObjectId(case_id)})
-    if result.deleted_count == 0:
+async def delete_case(case_id: str):
+    case = await cases_collection.find_one_and_delete({"_id": ObjectId(case_id)}, projection={"evidence": 1})
+    if not case:
         raise HTTPException(status_code=404, detail="Case not found")
+    await cache.invalidate(f"case:{case['_id']}")
+    await release(case.get("evidence", []))
     return {"message": "Case deleted successfully"}
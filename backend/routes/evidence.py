@@ -0,0 +1,81 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response
+from starlette.datastructures import MutableHeaders
+import os
+from evidence import evidence_collection
+
+router = APIRouter()
+
+
+# FileResponse already answers Range requests and hands whole files to servers
+# that support the ASGI pathsend extension. This adds the zerocopysend
+# extension, which lets the server sendfile() a byte range straight from the
+# file descriptor instead of reading it through Python buffers.
+class EvidenceFileResponse(FileResponse):
+    async def __call__(self, scope, receive, send):
+        self.zerocopy = "http.response.zerocopysend" in scope.get("extensions", {})
+        await super().__call__(scope, receive, send)
+
+    async def _zerocopy_send(self, send, offset, count):
+        with open(self.path, "rb") as file:
+            await send({
+                "type": "http.response.zerocopysend",
+                "file": file,
+                "offset": offset,
+                "count": count,
+                "more_body": False,
+            })
+
+    async def _handle_simple(self, send, send_header_only, send_pathsend):
+        if not self.zerocopy or send_header_only or send_pathsend:
+            return await super()._handle_simple(send, send_header_only, send_pathsend)
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        await self._zerocopy_send(send, 0, self.stat_result.st_size)
+
+    async def _handle_single_range(self, send, start, end, file_size, send_header_only):
+        if not self.zerocopy or send_header_only:
+            return await super()._handle_single_range(send, start, end, file_size, send_header_only)
+        headers = MutableHeaders(raw=list(self.raw_headers))
+        headers["content-range"] = f"bytes {start}-{end - 1}/{file_size}"
+        headers["content-length"] = str(end - start)
+        await send({"type": "http.response.start", "status": 206, "headers": headers.raw})
+        await self._zerocopy_send(send, start, end - start)
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+@router.api_route("/evidence/{evidence_id}", methods=["GET", "HEAD"])
+async def get_evidence(evidence_id: str, request: Request):
+    blob = await evidence_collection.find_one({"_id": evidence_id})
+    if not blob:
+        raise HTTPException(status_code=404, detail="Evidence not found")
+
+    try:
+        stat_result = os.stat(blob["path"])
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Evidence file missing")
+
+    # Blobs are content-addressed, so the hash is a strong validator and the
+    # body behind a given URL never changes.
+    etag = f'"{blob["_id"]}"'
+    headers = {"etag": etag, "cache-control": "private, max-age=31536000, immutable"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    filenames = blob.get("filenames") or [blob["_id"]]
+    return EvidenceFileResponse(
+        blob["path"],
+        headers=headers,
+        media_type=blob.get("content_type") or "application/octet-stream",
+        filename=filenames[0],
+        stat_result=stat_result,
+        content_disposition_type="inline",
+    )
@@ -0,0 +1,113 @@
+import os
+from typing import Dict
+
+from bson import ObjectId
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse, JSONResponse
+from pydantic import BaseModel, Field
+
+import export_jobs
+from routes.reports import reports_collection, build_report_query, report_summary, \
+    REPORT_LIST_PROJECTION, REPORT_EXPORT_FIELDS, REPORT_FILTERS
+from routes.cases import build_case_query, case_row, CASE_LIST_PROJECTION, CASE_EXPORT_FIELDS, CASE_FILTERS
+from routes.victims import build_victim_query, victim_row, VICTIM_EXPORT_PROJECTION, VICTIM_EXPORT_FIELDS
+from database import cases_collection, db
+
+router = APIRouter()
+
+# What each export kind reads and how its rows look; the filters are the
+# same ones the matching GET .../export route accepts
+EXPORT_KINDS = {
+    "reports": {
+        "spec": {"collection": reports_collection.name, "projection": REPORT_LIST_PROJECTION,
+                 "shape": report_summary, "fields": REPORT_EXPORT_FIELDS},
+        "build_query": build_report_query,
+        "filters": REPORT_FILTERS,
+    },
+    "cases": {
+        "spec": {"collection": cases_collection.name, "projection": CASE_LIST_PROJECTION,
+                 "shape": case_row, "fields": CASE_EXPORT_FIELDS},
+        "build_query": build_case_query,
+        "filters": CASE_FILTERS,
+    },
+    "victims": {
+        "spec": {"collection": db.victims.name, "projection": VICTIM_EXPORT_PROJECTION,
+                 "shape": victim_row, "fields": VICTIM_EXPORT_FIELDS},
+        "build_query": build_victim_query,
+        "filters": {"case_id", "type", "risk_level"},
+    },
+}
+
+
+class ExportRequest(BaseModel):
+    kind: str = Field(..., pattern="^(reports|cases|victims)$")
+    format: str = Field("csv", pattern="^(csv|ndjson|xlsx)$")
+    filters: Dict[str, str] = {}
+
+
+def job_view(job):
+    job_id = str(job["_id"])
+    total = job.get("total")
+    view = {
+        "id": job_id,
+        "kind": job["kind"],
+        "format": job["format"],
+        "filters": job.get("filters", {}),
+        "status": job["status"],
+        "rows": job.get("rows", 0),
+        "total": total,
+        "progress": round(job.get("rows", 0) / total, 3) if total else None,
+        "created_at": job["created_at"],
+        "finished_at": job.get("finished_at"),
+        "expires_at": job["expires_at"],
+    }
+    if job["status"] == "done":
+        view["size"] = job.get("size")
+        view["download_url"] = f"/exports/{job_id}/download"
+    if job["status"] == "failed":
+        view["error"] = job.get("error")
+    return view
+
+
+async def find_job(export_id):
+    if not ObjectId.is_valid(export_id):
+        raise HTTPException(status_code=400, detail="Invalid export ID format")
+    job = await export_jobs.jobs_collection.find_one({"_id": ObjectId(export_id)})
+    if not job:
+        raise HTTPException(status_code=404, detail="Export not found or expired")
+    return job
+
+
+# POST - Queue an export; poll GET /exports/{id} until it is done
+@router.post("/exports", status_code=202)
+async def create_export(request: ExportRequest):
+    kind = EXPORT_KINDS[request.kind]
+    if request.format not in export_jobs.formats():
+        raise HTTPException(status_code=400, detail=f"{request.format} exports are not available on this server")
+    unknown = set(request.filters) - kind["filters"]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown filters for {request.kind}: {', '.join(sorted(unknown))}")
+    if not export_jobs.has_capacity():
+        return JSONResponse(status_code=429, headers={"Retry-After": "30"},
+                            content={"detail": "Too many exports in progress, try again shortly"})
+
+    query = kind["build_query"](**request.filters)
+    job = await export_jobs.enqueue(request.kind, request.format, request.filters, kind["spec"], query)
+    return job_view(job)
+
+
+@router.get("/exports/{export_id}")
+async def get_export(export_id: str):
+    return job_view(await find_job(export_id))
+
+
+@router.get("/exports/{export_id}/download")
+async def download_export(export_id: str):
+    job = await find_job(export_id)
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Export is {job['status']}")
+    path = export_jobs.artifact_path(job["_id"], job["format"])
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Export not found or expired")
+    filename = f"{job['kind']}-{job['created_at']:%Y%m%d-%H%M%S}.{job['format']}"
+    return FileResponse(path, media_type=export_jobs.MEDIA_TYPES[job["format"]], filename=filename)
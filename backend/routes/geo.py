@@ -0,0 +1,139 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+from pagination import paginate_shaped, DEFAULT_LIMIT, MAX_LIMIT
+from fastjson import FastJSONResponse
+from routes.reports import reports_collection, build_report_query, REPORT_LIST_SHAPE
+
+router = APIRouter()
+
+COORDINATES_FIELD = "incident_details.location.coordinates"
+MAX_RADIUS_METERS = 1_000_000
+
+GEO_SHAPE = {
+    **REPORT_LIST_SHAPE,
+    "longitude": {"$arrayElemAt": [f"${COORDINATES_FIELD}.coordinates", 0]},
+    "latitude": {"$arrayElemAt": [f"${COORDINATES_FIELD}.coordinates", 1]},
+}
+
+
+def _parse_bbox(bbox):
+    try:
+        min_lng, min_lat, max_lng, max_lat = [float(v) for v in bbox.split(",")]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be minLng,minLat,maxLng,maxLat")
+    if not (-180 <= min_lng < max_lng <= 180 and -90 <= min_lat < max_lat <= 90):
+        raise HTTPException(status_code=400, detail="bbox is out of range")
+    return [[min_lng, min_lat], [max_lng, min_lat], [max_lng, max_lat], [min_lng, max_lat], [min_lng, min_lat]]
+
+
+def _parse_polygon(polygon):
+    try:
+        ring = [[float(v) for v in point.split(",")] for point in polygon.split(";")]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="polygon must be lng,lat;lng,lat;...")
+    if len(ring) < 3 or any(len(point) != 2 for point in ring):
+        raise HTTPException(status_code=400, detail="polygon needs at least three lng,lat points")
+    if ring[0] != ring[-1]:
+        ring.append(ring[0])
+    return ring
+
+
+def within_filter(bbox=None, polygon=None):
+    if bool(bbox) == bool(polygon):
+        raise HTTPException(status_code=400, detail="Pass exactly one of bbox or polygon")
+    ring = _parse_bbox(bbox) if bbox else _parse_polygon(polygon)
+    return {COORDINATES_FIELD: {"$geoWithin": {"$geometry": {"type": "Polygon", "coordinates": [ring]}}}}
+
+
+def near_pipeline(longitude, latitude, radius, query, limit):
+    return [
+        {"$geoNear": {
+            "near": {"type": "Point", "coordinates": [longitude, latitude]},
+            "key": COORDINATES_FIELD,
+            "distanceField": "distance",
+            "maxDistance": radius,
+            "spherical": True,
+            "query": query,
+        }},
+        {"$limit": limit},
+        {"$project": {"_id": 0, **GEO_SHAPE, "distance_m": {"$round": ["$distance", 1]}}},
+    ]
+
+
+def clusters_pipeline(query, cell):
+    lng = {"$arrayElemAt": [f"${COORDINATES_FIELD}.coordinates", 0]}
+    lat = {"$arrayElemAt": [f"${COORDINATES_FIELD}.coordinates", 1]}
+    return [
+        {"$match": query},
+        {"$project": {"lng": lng, "lat": lat}},
+        {"$group": {
+            "_id": {"x": {"$floor": {"$divide": ["$lng", cell]}}, "y": {"$floor": {"$divide": ["$lat", cell]}}},
+            "count": {"$sum": 1},
+            "longitude": {"$avg": "$lng"},
+            "latitude": {"$avg": "$lat"},
+        }},
+        {"$sort": {"count": -1}},
+    ]
+
+
+# GET - Reports within a radius of a point, nearest first
+@router.get("/reports/near")
+async def reports_near(
+    longitude: float = Query(..., ge=-180, le=180),
+    latitude: float = Query(..., ge=-90, le=90),
+    radius: float = Query(10_000, gt=0, le=MAX_RADIUS_METERS, description="meters"),
+    status: Optional[str] = Query(None),
+    from_date: Optional[str] = Query(None),
+    to_date: Optional[str] = Query(None),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT)
+):
+    pipeline = near_pipeline(longitude, latitude, radius, build_report_query(status, from_date, to_date), limit)
+    reports = await reports_collection.aggregate(pipeline).to_list(length=None)
+    return FastJSONResponse(reports)
+
+
+# GET - Reports inside a bounding box or polygon
+@router.get("/reports/within")
+async def reports_within(
+    bbox: Optional[str] = Query(None, description="minLng,minLat,maxLng,maxLat"),
+    polygon: Optional[str] = Query(None, description="lng,lat;lng,lat;..."),
+    status: Optional[str] = Query(None),
+    from_date: Optional[str] = Query(None),
+    to_date: Optional[str] = Query(None),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = Query(None)
+):
+    query = {**build_report_query(status, from_date, to_date), **within_filter(bbox, polygon)}
+    reports, next_cursor = await paginate_shaped(reports_collection, query, GEO_SHAPE, limit, cursor)
+    return FastJSONResponse({"items": reports, "next_cursor": next_cursor})
+
+
+# GET - Pre-aggregated grid clusters for the map at a given zoom level
+@router.get("/reports/clusters")
+async def report_clusters(
+    zoom: int = Query(3, ge=0, le=20),
+    bbox: Optional[str] = Query(None, description="minLng,minLat,maxLng,maxLat"),
+    status: Optional[str] = Query(None),
+    from_date: Optional[str] = Query(None),
+    to_date: Optional[str] = Query(None),
+    country: Optional[str] = Query(None)
+):
+    # A web-map tile spans 360 / 2^zoom degrees; four cells per tile keeps
+    # clusters roughly 64px apart on screen at any zoom.
+    cell = 360 / (2 ** zoom) / 4
+
+    query = build_report_query(status, from_date, to_date, country)
+    if bbox:
+        query.update(within_filter(bbox=bbox))
+    else:
+        query[COORDINATES_FIELD] = {"$exists": True}
+
+    clusters = await reports_collection.aggregate(clusters_pipeline(query, cell)).to_list(length=None)
+    return {
+        "zoom": zoom,
+        "cell_degrees": cell,
+        "clusters": [
+            {"longitude": c["longitude"], "latitude": c["latitude"], "count": c["count"]}
+            for c in clusters
+        ],
+    }
@@ -1,34 +1,161 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query
-from typing import List, Optional
+import asyncio
+import logging
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query, Request
+from typing import List, Optional, Union
 from datetime import datetime
 from bson import ObjectId
 from database import db
-from pydantic import BaseModel
+from pagination import paginate_shaped, project_field, DEFAULT_LIMIT, MAX_LIMIT
+from fastjson import FastJSONResponse, iso_datetime
+from exporting import export_response, EXPORT_FORMATS
+from pydantic import BaseModel, Field, ValidationError
+from pymongo import WriteConcern
+from pymongo.errors import BulkWriteError
+from streaming_json import iter_json_rows, MalformedBody
+import rollups
+import dedup
+from evidence import store_upload, released_on_failure
+from textsearch import detect_language
+import cache
+import intake
+from live import feed
+from status_changes import BulkStatusUpdate, resolve_targets, change_status, summarize
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 reports_collection = db.incident_reports
+status_history_collection = db.report_status_history
+
+BULK_BATCH_SIZE = 1000
+
+# Filters accepted by bulk status changes and export jobs (build_report_query's parameters)
+REPORT_FILTERS = {"status", "from_date", "to_date", "country", "city"}
+
+# Only the fields the list and export return; evidence and contact info stay on the server
+REPORT_LIST_PROJECTION = {
+    "reporter_type": 1,
+    "anonymous": 1,
+    "status": 1,
+    "incident_details.location.city": 1,
+    "incident_details.location.country": 1,
+    "incident_details.description": 1,
+    "incident_details.violation_types": 1,
+    "created_at": 1,
+}
+
+# The same fields shaped inside Mongo, as report_summary does in Python
+REPORT_LIST_SHAPE = {
+    "id": {"$toString": "$_id"},
+    "reporter_type": project_field("reporter_type"),
+    "anonymous": project_field("anonymous"),
+    "status": project_field("status"),
+    "city": project_field("incident_details.location.city"),
+    "country": project_field("incident_details.location.country"),
+    "description": project_field("incident_details.description"),
+    "violation_types": project_field("incident_details.violation_types", []),
+    "created_at": {"$toString": "$created_at"},
+}
+
+# What the rollups need to know about a report
+ROLLUP_PROJECTION = {
+    "status": 1,
+    "incident_details.date": 1,
+    "incident_details.location.country": 1,
+    "incident_details.violation_types": 1,
+}
+
+# A single report; contact info is still left out
+REPORT_DETAIL_PROJECTION = {
+    "reporter_type": 1,
+    "anonymous": 1,
+    "status": 1,
+    "incident_details": 1,
+    "evidence": 1,
+    "language": 1,
+    "created_at": 1,
+}
+
+REPORT_EXPORT_FIELDS = [
+    "id", "reporter_type", "anonymous", "status", "city", "country",
+    "description", "violation_types", "created_at",
+]
 
 class StatusUpdate(BaseModel):
     status: str
 
+class ReportSummary(BaseModel):
+    id: str
+    reporter_type: Optional[str] = None
+    anonymous: Optional[bool] = None
+    status: Optional[str] = None
+    city: Optional[str] = None
+    country: Optional[str] = None
+    description: Optional[str] = None
+    violation_types: List[str] = []
+    created_at: Optional[str] = None
+
+class ReportPage(BaseModel):
+    items: List[ReportSummary]
+    next_cursor: Optional[str] = None
+
+# One row of a bulk upload; same fields as the create_report form
+class BulkReportRow(BaseModel):
+    reporter_type: str
+    anonymous: bool
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    preferred_contact: Optional[str] = None
+    date: str
+    country: str
+    city: str
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    description: str
+    violation_types: Union[List[str], str]
+
+
+def build_report_query(status=None, from_date=None, to_date=None, country=None, city=None):
+    query = {}
+
+    if status:
+        query["status"] = status
+    if country:
+        query["incident_details.location.country"] = country
+    if city:
+        query["incident_details.location.city"] = city
+    if from_date and to_date:
+        try:
+            query["incident_details.date"] = {
+                "$gte": datetime.strptime(from_date, "%Y-%m-%d"),
+                "$lte": datetime.strptime(to_date, "%Y-%m-%d")
+            }
+        except:
+            raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    return query
+
+
+def report_summary(report):
+    details = report.get("incident_details", {})
+    location = details.get("location", {})
+    return {
+        "id": str(report["_id"]),
+        "reporter_type": report.get("reporter_type"),
+        "anonymous": report.get("anonymous"),
+        "status": report.get("status"),
+        "city": location.get("city"),
+        "country": location.get("country"),
+        "description": details.get("description"),
+        "violation_types": details.get("violation_types", []),
+        "created_at": iso_datetime(report.get("created_at"))
+    }
+
+
+# Shared by create_report and bulk_create_reports so both store the same shape
+def build_report_doc(reporter_type, anonymous, email, phone, preferred_contact, date, country, city,
+                     latitude, longitude, description, violation_types, evidence=None):
+    if isinstance(violation_types, str):
+        violation_types = violation_types.split(",")
 
-# ✅ POST - Create Report
-@router.post("/reports/")
-async def create_report(
-    reporter_type: str = Form(...),
-    anonymous: bool = Form(...),
-    email: Optional[str] = Form(None),
-    phone: Optional[str] = Form(None),
-    preferred_contact: Optional[str] = Form(None),
-    date: str = Form(...),
-    country: str = Form(...),
-    city: str = Form(...),
-    latitude: float = Form(...),
-    longitude: float = Form(...),
-    description: str = Form(...),
-    violation_types: str = Form(...),
-    file: Optional[UploadFile] = File(None)
-):
     location = {
         "country": country,
         "city": city,
@@ -38,15 +165,8 @@ async def create_report(
         }
     }
 
-    evidence = []
-    if file:
-        evidence.append({
-            "type": file.content_type,
-            "url": f"/evidence/{file.filename}",
-            "description": "Uploaded evidence"
-        })
-
-    report_doc = {
+    now = datetime.utcnow()
+    return {
         "reporter_type": reporter_type,
         "anonymous": anonymous,
         "contact_info": {
@@ -58,69 +178,302 @@ async def create_report(
             "date": datetime.strptime(date, "%Y-%m-%d"),
             "location": location,
             "description": description,
-            "violation_types": violation_types.split(",")
+            "violation_types": violation_types
         },
-        "evidence": evidence,
+        "evidence": evidence or [],
+        "language": detect_language(description),
         "status": "new",
-        "created_at": datetime.utcnow()
+        "created_at": now,
+        # Set on insert too: the _id is assigned before the (possibly batched)
+        # write commits, so the snapshot finds late commits by updated_at
+        "updated_at": now
     }
 
-    result = reports_collection.insert_one(report_doc)
+
+# ✅ POST - Create Report
+@router.post("/reports/")
+async def create_report(
+    reporter_type: str = Form(...),
+    anonymous: bool = Form(...),
+    email: Optional[str] = Form(None),
+    phone: Optional[str] = Form(None),
+    preferred_contact: Optional[str] = Form(None),
+    date: str = Form(...),
+    country: str = Form(...),
+    city: str = Form(...),
+    latitude: float = Form(..., ge=-90, le=90),
+    longitude: float = Form(..., ge=-180, le=180),
+    description: str = Form(...),
+    violation_types: str = Form(...),
+    file: Optional[UploadFile] = File(None)
+):
+    evidence = []
+    if file and file.filename:
+        stored = await store_upload(file)
+        evidence.append({
+            "type": file.content_type,
+            **stored,
+            "description": "Uploaded evidence"
+        })
+
+    async with released_on_failure(evidence):
+        report_doc = build_report_doc(
+            reporter_type=reporter_type,
+            anonymous=anonymous,
+            email=email,
+            phone=phone,
+            preferred_contact=preferred_contact,
+            date=date,
+            country=country,
+            city=city,
+            latitude=latitude,
+            longitude=longitude,
+            description=description,
+            violation_types=violation_types,
+            evidence=evidence
+        )
+
+        if intake.enabled:
+            report_doc["_id"] = ObjectId()
+            try:
+                error = await report_intake.submit(report_doc)
+            except asyncio.QueueFull:
+                raise HTTPException(status_code=503, detail="Too many reports are being submitted, try again shortly",
+                                    headers={"Retry-After": str(report_intake.retry_after())})
+            if error:
+                raise HTTPException(status_code=500, detail=error)
+            return {"id": str(report_doc["_id"]), "message": "Report submitted"}
+
+        result = await reports_collection.insert_one(report_doc)
+
+    await _after_insert([report_doc])
     return {"id": str(result.inserted_id), "message": "Report submitted"}
 
 
+# Keeps the rollups, the duplicate index and the live feed up to date with
+# reports that are already stored. Runs after the insert has been answered
+# for, and never raises: the reports are saved, so a failure here must not
+# turn into an error for them (or release their evidence). It is logged;
+# rebuild_rollups.py and recluster_reports.py --rebuild catch up.
+async def _after_insert(docs):
+    if not docs:
+        return
+    for name, record in (("rollups", rollups.record_reports), ("duplicate index", dedup.index_reports)):
+        try:
+            await record(docs)
+        except Exception:
+            logger.exception("Could not add %d new reports to the %s", len(docs), name)
+    try:
+        for doc in docs:
+            feed.publish_local("report", report_summary(doc))
+    except Exception:
+        logger.exception("Could not publish new reports to the live feed")
+
+
+# Returns a result per row, from the insert alone, and the documents that
+# were stored
+async def _insert_batch(batch, collection=reports_collection):
+    results = {row: {"row": row, "id": str(doc["_id"])} for row, doc in batch}
+    failed = set()
+    try:
+        await collection.insert_many([doc for _, doc in batch], ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            row = batch[error["index"]][0]
+            results[row] = {"row": row, "error": error.get("errmsg", "Insert failed")}
+            failed.add(row)
+    inserted = [doc for row, doc in batch if row not in failed]
+    return list(results.values()), inserted
+
+
+# Write-behind intake (INTAKE_FLUSH_MS, see intake.py). A request is answered
+# once its batch is journaled, so an id that was returned is never lost.
+_journaled_reports = reports_collection.with_options(write_concern=WriteConcern(j=True))
+
+
+async def _flush_intake(docs):
+    results, _ = await _insert_batch(list(enumerate(docs)), _journaled_reports)
+    return [result.get("error") for result in results]
+
+
+report_intake = intake.Batcher(_flush_intake, after=_after_insert)
+
+
+# POST - Bulk ingestion of NDJSON or a JSON array of reports
+@router.post("/reports/bulk")
+async def bulk_create_reports(request: Request):
+    results = []
+    batch = []
+    row_number = 0
+
+    try:
+        async for row_number, row, error in iter_json_rows(request.stream()):
+            if error is None and not isinstance(row, dict):
+                error = "Row must be a JSON object"
+            if error is None:
+                try:
+                    doc = build_report_doc(**BulkReportRow(**row).dict())
+                except ValidationError as e:
+                    error = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+                except ValueError:
+                    error = "date: Invalid date format. Use YYYY-MM-DD"
+                else:
+                    # Assign ids up front so failed rows can be told apart
+                    doc["_id"] = ObjectId()
+                    batch.append((row_number, doc))
+            if error:
+                results.append({"row": row_number, "error": error})
+
+            if len(batch) >= BULK_BATCH_SIZE:
+                batch_results, inserted = await _insert_batch(batch)
+                results += batch_results
+                await _after_insert(inserted)
+                batch = []
+    except MalformedBody as e:
+        # Rows before the damage were already inserted, so report them
+        # rather than failing the whole request
+        results.append({"row": row_number + 1, "error": str(e)})
+
+    if batch:
+        batch_results, inserted = await _insert_batch(batch)
+        results += batch_results
+        await _after_insert(inserted)
+
+    results.sort(key=lambda r: r["row"])
+    failed = sum(1 for r in results if "error" in r)
+    return {"inserted": len(results) - failed, "failed": failed, "results": results}
+
+
 # GET - List reports with filters
-@router.get("/reports/")
+@router.get("/reports/", response_model=ReportPage)
 async def list_reports(
     status: Optional[str] = Query(None),
     from_date: Optional[str] = Query(None),
     to_date: Optional[str] = Query(None),
     country: Optional[str] = Query(None),
-    city: Optional[str] = Query(None)
+    city: Optional[str] = Query(None),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = Query(None)
 ):
-    query = {}
+    query = build_report_query(status, from_date, to_date, country, city)
 
-    if status:
-        query["status"] = status
-    if country:
-        query["incident_details.location.country"] = country
-    if city:
-        query["incident_details.location.city"] = city
-    if from_date and to_date:
-        try:
-            query["incident_details.date"] = {
-                "$gte": datetime.strptime(from_date, "%Y-%m-%d"),
-                "$lte": datetime.strptime(to_date, "%Y-%m-%d")
-            }
-        except:
-            raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    reports, next_cursor = await paginate_shaped(reports_collection, query, REPORT_LIST_SHAPE, limit, cursor)
+    return FastJSONResponse({"items": reports, "next_cursor": next_cursor})
+
+
+# GET - Stream every matching report as NDJSON or CSV
+@router.get("/reports/export")
+async def export_reports(
+    status: Optional[str] = Query(None),
+    from_date: Optional[str] = Query(None),
+    to_date: Optional[str] = Query(None),
+    country: Optional[str] = Query(None),
+    city: Optional[str] = Query(None),
+    export_format: str = Query("ndjson", alias="format", pattern=EXPORT_FORMATS)
+):
+    query = build_report_query(status, from_date, to_date, country, city)
+    return export_response(reports_collection, query, REPORT_LIST_PROJECTION, report_summary,
+                           REPORT_EXPORT_FIELDS, export_format, "reports")
+
+
+# Status change shared by the single and bulk routes: the reports, their
+# history rows and the rollups are written together, then the cache and the
+# live feed are told about the reports that changed
+async def set_report_status(reports, new_status):
+    async def move_rollups(applied, session):
+        await rollups.move_statuses(applied, new_status, session)
+
+    applied, outcomes = await change_status(reports_collection, status_history_collection, "report_id",
+                                            reports, new_status, after_write=move_rollups)
+    await cache.invalidate_many([f"report:{report['_id']}" for report in applied])
+    for report in applied:
+        feed.publish_local("status", {"id": str(report["_id"]), "status": new_status})
+    return outcomes
 
-    try:
-        reports = list(reports_collection.find(query))
-        cleaned = []
-        for report in reports:
-            cleaned.append({
-                "id": str(report["_id"]),
-                "reporter_type": report.get("reporter_type"),
-                "anonymous": report.get("anonymous"),
-                "status": report.get("status"),
-                "city": report.get("incident_details", {}).get("location", {}).get("city"),
-                "country": report.get("incident_details", {}).get("location", {}).get("country"),
-                "description": report.get("incident_details", {}).get("description"),
-                "violation_types": report.get("incident_details", {}).get("violation_types", []),
-                "created_at": str(report.get("created_at"))
-            })
-        return cleaned
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+
+# PATCH - Change the status of many reports (list of ids or a filter).
+# Registered before /reports/{report_id} so "status" isn't taken for an id.
+@router.patch("/reports/status")
+async def bulk_update_report_status(request: BulkStatusUpdate):
+    reports, outcomes = await resolve_targets(reports_collection, request, build_report_query,
+                                              REPORT_FILTERS, ROLLUP_PROJECTION)
+    outcomes += await set_report_status(reports, request.status)
+    return summarize(outcomes)
 
 
 @router.patch("/reports/{report_id}")
 async def update_report_status(report_id: str, update: StatusUpdate):
-    result = reports_collection.update_one(
-        {"_id": ObjectId(report_id)},
-        {"$set": {"status": update.status}}
-    )
-    if result.modified_count == 1:
+    report = await reports_collection.find_one({"_id": ObjectId(report_id)}, ROLLUP_PROJECTION)
+    if report and report.get("status") != update.status:
+        outcomes = await set_report_status([report], update.status)
+        if outcomes[0]["result"] == "conflict":
+            raise HTTPException(status_code=409, detail="Report status was changed by another request, try again")
         return {"message": "Report status updated"}
     raise HTTPException(status_code=404, detail="Report not found")
+
+
+# GET - Likely duplicates of a report: similar description, close in date and place
+@router.get("/reports/{report_id}/duplicates")
+async def get_report_duplicates(
+    report_id: str,
+    min_score: float = Query(0.5, ge=0, le=1),
+    limit: int = Query(20, ge=1, le=100)
+):
+    if not ObjectId.is_valid(report_id):
+        raise HTTPException(status_code=400, detail="Invalid report ID format")
+    report_id = ObjectId(report_id)
+
+    entry = await dedup.lsh_collection.find_one({"_id": report_id}, {"signature": 1, "bands": 1, "date": 1,
+                                                                     "coordinates": 1, "cluster": 1})
+    if entry is None:
+        # Reports from before dedup aren't indexed until recluster_reports.py --rebuild
+        report = await reports_collection.find_one({"_id": report_id}, dedup.REPORT_PROJECTION)
+        if not report:
+            raise HTTPException(status_code=404, detail="Report not found")
+        entry = dedup.lsh_entry(report)
+
+    matches = (await dedup.find_duplicates(entry, min_score))[:limit] if entry else []
+    summaries = {}
+    if matches:
+        pipeline = [
+            {"$match": {"_id": {"$in": [ObjectId(match["id"]) for match in matches]}}},
+            {"$project": {"_id": 0, **REPORT_LIST_SHAPE}},
+        ]
+        summaries = {report["id"]: report async for report in reports_collection.aggregate(pipeline)}
+
+    cluster = entry.get("cluster") if entry else None
+    return FastJSONResponse({
+        "id": str(report_id),
+        "cluster": str(cluster) if cluster else None,
+        "cluster_size": await dedup.cluster_size(cluster),
+        "items": [{**summaries[match["id"]], **match} for match in matches if match["id"] in summaries],
+    })
+
+
+# GET - One report. Registered last so /reports/export, /bulk and the geo
+# routes are matched first.
+@router.get("/reports/{report_id}")
+async def get_report(report_id: str):
+    if not ObjectId.is_valid(report_id):
+        raise HTTPException(status_code=400, detail="Invalid report ID format")
+    report_id = ObjectId(report_id)
+
+    async def load():
+        report = await reports_collection.find_one({"_id": report_id}, REPORT_DETAIL_PROJECTION)
+        if not report:
+            return None
+        details = report.get("incident_details", {})
+        coordinates = details.get("location", {}).get("coordinates", {}).get("coordinates") or [None, None]
+        return {
+            **report_summary(report),
+            "date": details.get("date"),
+            "longitude": coordinates[0],
+            "latitude": coordinates[1],
+            "language": report.get("language"),
+            "evidence": report.get("evidence", []),
+        }
+
+    report = await cache.get_or_load(f"report:{report_id}", load)
+    if not report:
+        raise HTTPException(status_code=404, detail="Report not found")
+    return report
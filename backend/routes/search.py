@@ -0,0 +1,106 @@
+from fastapi import APIRouter, Query
+from typing import Optional
+from textsearch import detect_language
+from routes.reports import reports_collection
+from database import cases_collection
+
+router = APIRouter()
+
+MAX_SEARCH_LIMIT = 100
+MAX_SEARCH_PAGE = 50
+
+SCORE = {"$meta": "textScore"}
+
+REPORT_SEARCH_PROJECTION = {
+    "score": SCORE,
+    "status": 1,
+    "incident_details.description": 1,
+    "incident_details.location.country": 1,
+    "incident_details.location.city": 1,
+    "incident_details.violation_types": 1,
+}
+
+CASE_SEARCH_PROJECTION = {
+    "score": SCORE,
+    "title": 1,
+    "description": 1,
+    "status": 1,
+    "location.country": 1,
+    "violation_types": 1,
+}
+
+
+def report_hit(report):
+    details = report.get("incident_details", {})
+    location = details.get("location", {})
+    return {
+        "kind": "report",
+        "id": str(report["_id"]),
+        "score": report["score"],
+        "title": None,
+        "description": details.get("description"),
+        "status": report.get("status"),
+        "country": location.get("country"),
+        "city": location.get("city"),
+        "violation_types": details.get("violation_types", []),
+    }
+
+
+def case_hit(case):
+    return {
+        "kind": "case",
+        "id": str(case["_id"]),
+        "score": case["score"],
+        "title": case.get("title"),
+        "description": case.get("description"),
+        "status": case.get("status"),
+        "country": case.get("location", {}).get("country"),
+        "city": None,
+        "violation_types": case.get("violation_types", []),
+    }
+
+
+async def _top(collection, query, projection, count):
+    cursor = collection.find(query, projection).sort([("score", SCORE)]).limit(count)
+    return await cursor.to_list(length=None)
+
+
+# GET - Ranked full-text search over report descriptions and case titles/descriptions
+@router.get("/search")
+async def search(
+    q: str = Query(..., min_length=1),
+    scope: str = Query("all", pattern="^(all|reports|cases)$"),
+    status: Optional[str] = Query(None),
+    country: Optional[str] = Query(None),
+    page: int = Query(1, ge=1, le=MAX_SEARCH_PAGE),
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_LIMIT)
+):
+    text = {"$text": {"$search": q, "$language": detect_language(q)}}
+    # Each collection only has to supply enough hits to fill this page
+    needed = page * limit
+
+    hits = []
+    if scope in ("all", "reports"):
+        query = dict(text)
+        if status:
+            query["status"] = status
+        if country:
+            query["incident_details.location.country"] = country
+        hits += [report_hit(r) for r in await _top(reports_collection, query, REPORT_SEARCH_PROJECTION, needed)]
+    if scope in ("all", "cases"):
+        query = dict(text)
+        if status:
+            query["status"] = status
+        if country:
+            query["location.country"] = country
+        hits += [case_hit(c) for c in await _top(cases_collection, query, CASE_SEARCH_PROJECTION, needed)]
+
+    hits.sort(key=lambda hit: hit["score"], reverse=True)
+    start = (page - 1) * limit
+    return {
+        "query": q,
+        "page": page,
+        "limit": limit,
+        "has_more": len(hits) > start + limit,
+        "items": hits[start:start + limit],
+    }
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, Header
+from fastapi.responses import StreamingResponse
+from pymongo.errors import OperationFailure, PyMongoError
+
+from live import feed, sse_message
+from routes.reports import reports_collection, report_summary, REPORT_LIST_PROJECTION
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = 15
+RETRY_SECONDS = 3
+
+NOT_A_REPLICA_SET = 40573
+CHANGE_STREAM_HISTORY_LOST = 286
+
+# New reports and status changes only, trimmed to what the feed sends
+CHANGE_PIPELINE = [
+    {"$match": {"$or": [
+        {"operationType": "insert"},
+        {"operationType": "update", "updateDescription.updatedFields.status": {"$exists": True}},
+    ]}},
+    {"$project": {
+        "operationType": 1,
+        "documentKey": 1,
+        "updateDescription.updatedFields.status": 1,
+        "fullDocument._id": 1,
+        **{f"fullDocument.{field}": 1 for field in REPORT_LIST_PROJECTION},
+    }},
+]
+
+_watcher = None
+
+
+# Event ids are the change stream resume tokens, so any worker can resume a
+# client from one even when it has left (or never was in) the replay buffer
+def change_message(change):
+    event_id = change["_id"]["_data"]
+    if change["operationType"] == "insert":
+        return event_id, "report", report_summary(change["fullDocument"])
+    status = change["updateDescription"]["updatedFields"]["status"]
+    return event_id, "status", {"id": str(change["documentKey"]["_id"]), "status": status}
+
+
+async def watch_reports():
+    resume_token = None
+    while True:
+        try:
+            async with reports_collection.watch(CHANGE_PIPELINE, resume_after=resume_token) as stream:
+                feed.external = True
+                async for change in stream:
+                    resume_token = change["_id"]
+                    event_id, event, data = change_message(change)
+                    feed.publish(event, data, event_id)
+        except OperationFailure as e:
+            if e.code == NOT_A_REPLICA_SET:
+                feed.external = False
+                logger.info("Change streams need a replica set; the live feed publishes in-process")
+                return
+            if e.code == CHANGE_STREAM_HISTORY_LOST:
+                resume_token = None
+            logger.warning("Report change stream failed, retrying: %s", e)
+        except PyMongoError as e:
+            logger.warning("Report change stream failed, retrying: %s", e)
+        except Exception:
+            feed.external = False
+            logger.exception("Report change stream is unavailable; the live feed publishes in-process")
+            return
+        await asyncio.sleep(RETRY_SECONDS)
+
+
+def start():
+    global _watcher
+    _watcher = asyncio.create_task(watch_reports())
+
+
+async def stop():
+    if _watcher is not None:
+        _watcher.cancel()
+        try:
+            await _watcher
+        except asyncio.CancelledError:
+            pass
+
+
+async def _resume_from_change_stream(last_event_id):
+    stream = reports_collection.watch(CHANGE_PIPELINE, resume_after={"_data": last_event_id},
+                                      max_await_time_ms=HEARTBEAT_SECONDS * 1000)
+    async with stream:
+        while stream.alive:
+            change = await stream.try_next()
+            if change is None:
+                yield ": keepalive\n\n"
+                continue
+            yield sse_message(*change_message(change))
+
+
+async def _events(last_event_id):
+    yield f"retry: {RETRY_SECONDS * 1000}\n\n"
+
+    if last_event_id and not feed.knows(last_event_id):
+        if feed.external:
+            # Too old for the replay buffer: this client gets its own change
+            # stream, resumed right after the last event it saw
+            try:
+                async for message in _resume_from_change_stream(last_event_id):
+                    yield message
+                return
+            except PyMongoError:
+                pass
+        # Can't fill the gap; tell the client to reload its list
+        yield "event: reset\ndata: {}\n\n"
+        last_event_id = None
+
+    replay, subscriber = feed.subscribe(last_event_id)
+    try:
+        for message in replay:
+            yield sse_message(*message)
+        while not (subscriber.overflowed and subscriber.queue.empty()):
+            try:
+                message = await asyncio.wait_for(subscriber.queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield sse_message(*message)
+        # The client fell too far behind; closing makes its EventSource
+        # reconnect with Last-Event-ID and replay from the buffer
+    finally:
+        feed.unsubscribe(subscriber)
+
+
+# GET - Live feed of new reports and status changes (Server-Sent Events)
+@router.get("/reports/stream")
+async def report_stream(last_event_id: Optional[str] = Header(None)):
+    return StreamingResponse(
+        _events(last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
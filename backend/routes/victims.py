@@ -1,8 +1,12 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from bson import ObjectId
 from database import db
+from exporting import export_response, EXPORT_FORMATS
+from fastjson import FastJSONResponse
+from pagination import project_field
+import cache
 from datetime import datetime
 
 router = APIRouter()
@@ -35,6 +39,61 @@ class VictimBase(BaseModel):
 class RiskUpdate(BaseModel):
     level: str  # new risk level
 
+class CaseVictim(BaseModel):
+    id: str = Field(alias="_id")
+    type: Optional[str] = None
+    risk: Optional[str] = None
+
+
+# Contact details are deliberately left out of exports
+VICTIM_EXPORT_PROJECTION = {
+    "type": 1,
+    "anonymous": 1,
+    "demographics": 1,
+    "risk_assessment.level": 1,
+    "cases_involved": 1,
+}
+
+# Shaped inside Mongo for list_victims_by_case
+CASE_VICTIM_SHAPE = {
+    "_id": {"$toString": "$_id"},
+    "type": project_field("type"),
+    "risk": project_field("risk_assessment.level"),
+}
+
+VICTIM_EXPORT_FIELDS = [
+    "id", "type", "anonymous", "gender", "age", "ethnicity",
+    "occupation", "risk", "cases_involved",
+]
+
+
+def build_victim_query(case_id=None, type=None, risk_level=None):
+    query = {}
+    if case_id:
+        if not ObjectId.is_valid(case_id):
+            raise HTTPException(status_code=400, detail="Invalid case ID format")
+        query["cases_involved"] = ObjectId(case_id)
+    if type:
+        query["type"] = type
+    if risk_level:
+        query["risk_assessment.level"] = risk_level
+    return query
+
+
+def victim_row(v):
+    demographics = v.get("demographics", {})
+    return {
+        "id": str(v["_id"]),
+        "type": v.get("type"),
+        "anonymous": v.get("anonymous"),
+        "gender": demographics.get("gender"),
+        "age": demographics.get("age"),
+        "ethnicity": demographics.get("ethnicity"),
+        "occupation": demographics.get("occupation"),
+        "risk": v.get("risk_assessment", {}).get("level"),
+        "cases_involved": [str(cid) for cid in v.get("cases_involved", [])],
+    }
+
 
 @router.post("/victims/")
 async def add_victim(victim: VictimBase):
@@ -58,18 +117,38 @@ async def add_victim(victim: VictimBase):
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow()
     }
-    result = db.victims.insert_one(data)
+    result = await db.victims.insert_one(data)
     return {"id": str(result.inserted_id), "message": "Victim added successfully"}
 
 
+@router.get("/victims/export")
+async def export_victims(
+    case_id: Optional[str] = Query(None),
+    type: Optional[str] = Query(None),
+    risk_level: Optional[str] = Query(None),
+    export_format: str = Query("ndjson", alias="format", pattern=EXPORT_FORMATS)
+):
+    query = build_victim_query(case_id, type, risk_level)
+    return export_response(db.victims, query, VICTIM_EXPORT_PROJECTION, victim_row,
+                           VICTIM_EXPORT_FIELDS, export_format, "victims")
+
+
 @router.get("/victims/{victim_id}")
 async def get_victim(victim_id: str):
     try:
-        victim = db.victims.find_one({"_id": ObjectId(victim_id)})
+        victim_id = ObjectId(victim_id)
+
+        async def load():
+            victim = await db.victims.find_one({"_id": victim_id})
+            if not victim:
+                return None
+            victim["_id"] = str(victim["_id"])
+            victim["cases_involved"] = [str(cid) for cid in victim["cases_involved"]]
+            return victim
+
+        victim = await cache.get_or_load(f"victim:{victim_id}", load)
         if not victim:
             raise HTTPException(status_code=404, detail="Victim not found")
-        victim["_id"] = str(victim["_id"])
-        victim["cases_involved"] = [str(cid) for cid in victim["cases_involved"]]
         return victim
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid ID format")
@@ -77,23 +156,26 @@ async def get_victim(victim_id: str):
 
 @router.patch("/victims/{victim_id}")
 async def update_risk_level(victim_id: str, data: RiskUpdate):
-    result = db.victims.update_one(
+    result = await db.victims.update_one(
         {"_id": ObjectId(victim_id)},
         {"$set": {"risk_assessment.level": data.level, "updated_at": datetime.utcnow()}}
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Victim not found or no changes made")
+    await cache.invalidate(f"victim:{ObjectId(victim_id)}")
     return {"message": "Risk level updated"}
 
 
-@router.get("/victims/case/{case_id}")
+def case_victims_pipeline(case_id):
+    return [
+        {"$match": {"cases_involved": case_id}},
+        {"$project": CASE_VICTIM_SHAPE},
+    ]
+
+
+@router.get("/victims/case/{case_id}", response_model=List[CaseVictim])
 async def list_victims_by_case(case_id: str):
-    try:
-        victims = db.victims.find({"cases_involved": ObjectId(case_id)})
-        return [{
-            "_id": str(v["_id"]),
-            "type": v["type"],
-            "risk": v["risk_assessment"]["level"]
-        } for v in victims]
-    except Exception:
+    if not ObjectId.is_valid(case_id):
         raise HTTPException(status_code=400, detail="Invalid case ID format")
+    victims = await db.victims.aggregate(case_victims_pipeline(ObjectId(case_id))).to_list(length=None)
+    return FastJSONResponse(victims)
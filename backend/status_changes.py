@@ -0,0 +1,139 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+from fastapi import HTTPException
+from pydantic import BaseModel, Field
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+import database
+
+# Status changes for cases and reports, one or thousands at a time. Each
+# batch is a bulk_write of conditional updates (matching the status that was
+# read, so a concurrent change is reported as a conflict instead of being
+# overwritten) plus an insert_many of the history rows for the documents that
+# actually changed. On a replica set both run in one transaction; on a
+# standalone mongod they run back to back.
+BULK_STATUS_MAX = 5000
+BULK_STATUS_BATCH = 1000
+
+_transactions = None
+
+
+class BulkStatusUpdate(BaseModel):
+    status: str
+    ids: Optional[List[str]] = Field(None, max_length=BULK_STATUS_MAX)
+    # Same filters as the list route, e.g. {"country": "Syria", "status": "new"}
+    filter: Optional[Dict[str, str]] = None
+
+
+async def transactions_supported():
+    global _transactions
+    if _transactions is None:
+        try:
+            hello = await database.client.admin.command("hello")
+            _transactions = "setName" in hello or hello.get("msg") == "isdbgrid"
+        except PyMongoError:
+            _transactions = False
+    return _transactions
+
+
+async def resolve_targets(collection, request: BulkStatusUpdate, build_query, allowed_filters, projection):
+    """The documents a bulk request targets, and outcomes for the ids that
+    can't be changed (malformed or not found)."""
+    if (request.ids is None) == (request.filter is None):
+        raise HTTPException(status_code=400, detail="Pass exactly one of ids or filter")
+
+    if request.filter is not None:
+        unknown = set(request.filter) - allowed_filters
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown filters: {', '.join(sorted(unknown))}")
+        query = build_query(**request.filter)
+        docs = await collection.find(query, projection).limit(BULK_STATUS_MAX + 1).to_list(length=None)
+        if len(docs) > BULK_STATUS_MAX:
+            raise HTTPException(status_code=400,
+                                detail=f"Filter matches more than {BULK_STATUS_MAX} documents; narrow it down")
+        return docs, []
+
+    outcomes = []
+    ids = []
+    for raw_id in dict.fromkeys(request.ids):
+        if ObjectId.is_valid(raw_id):
+            ids.append(ObjectId(raw_id))
+        else:
+            outcomes.append({"id": raw_id, "result": "invalid_id"})
+    docs = await collection.find({"_id": {"$in": ids}}, projection).to_list(length=None)
+    found = {doc["_id"] for doc in docs}
+    outcomes += [{"id": str(missing), "result": "not_found"} for missing in ids if missing not in found]
+    return docs, outcomes
+
+
+async def _apply_batch(collection, history, id_field, docs, new_status, after_write, session=None):
+    now = datetime.utcnow()
+    updates = [
+        UpdateOne({"_id": doc["_id"], "status": doc.get("status")},
+                  {"$set": {"status": new_status, "updated_at": now}})
+        for doc in docs
+    ]
+    result = await collection.bulk_write(updates, ordered=False, session=session)
+
+    if result.modified_count == len(docs):
+        applied = docs
+    else:
+        # updated_at is unique to this batch, so it tells ours apart
+        changed = await collection.find(
+            {"_id": {"$in": [doc["_id"] for doc in docs]}, "status": new_status, "updated_at": now},
+            {"_id": 1}, session=session).to_list(length=None)
+        changed = {doc["_id"] for doc in changed}
+        applied = [doc for doc in docs if doc["_id"] in changed]
+
+    if applied:
+        await history.insert_many([
+            {id_field: doc["_id"], "old_status": doc.get("status"), "new_status": new_status, "timestamp": now}
+            for doc in applied
+        ], ordered=False, session=session)
+        if after_write is not None:
+            await after_write(applied, session)
+    return applied
+
+
+async def change_status(collection, history, id_field, docs, new_status, after_write=None):
+    """Move docs (each with _id and its current status) to new_status.
+
+    after_write(applied_docs, session) runs in the same transaction for any
+    extra writes (the report rollups). Returns (applied docs, outcomes).
+    """
+    outcomes = []
+    pending = []
+    for doc in docs:
+        if doc.get("status") == new_status:
+            outcomes.append({"id": str(doc["_id"]), "result": "unchanged"})
+        else:
+            pending.append(doc)
+
+    applied = []
+    use_transactions = await transactions_supported()
+    for start in range(0, len(pending), BULK_STATUS_BATCH):
+        batch = pending[start:start + BULK_STATUS_BATCH]
+        if use_transactions:
+            async with await database.client.start_session() as session:
+                async def run(session):
+                    return await _apply_batch(collection, history, id_field, batch, new_status, after_write, session)
+                batch_applied = await session.with_transaction(run)
+        else:
+            batch_applied = await _apply_batch(collection, history, id_field, batch, new_status, after_write)
+
+        applied_ids = {doc["_id"] for doc in batch_applied}
+        for doc in batch:
+            result = "updated" if doc["_id"] in applied_ids else "conflict"
+            outcomes.append({"id": str(doc["_id"]), "result": result, "old_status": doc.get("status")})
+        applied += batch_applied
+    return applied, outcomes
+
+
+def summarize(outcomes):
+    counts = {}
+    for outcome in outcomes:
+        counts[outcome["result"]] = counts.get(outcome["result"], 0) + 1
+    return {"counts": counts, "results": outcomes}
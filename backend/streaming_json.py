@@ -0,0 +1,127 @@
+import codecs
+import json
+import re
+
+# Incremental reader for request bodies holding many JSON objects, either as
+# NDJSON (one object per line) or as a single JSON array. Only the row being
+# decoded is buffered, never the whole body.
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+_LITERALS = ("true", "false", "null", "NaN", "Infinity", "-Infinity")
+_NUMBER_TAIL = re.compile(r"\d(\.|[eE][-+]?)$")
+# What may still follow a decoded number at the end of the buffer
+_NUMBER_REST = re.compile(r"[\d.eE+-]*")
+
+
+class MalformedBody(ValueError):
+    pass
+
+
+# Yields (row_number, row, error). NDJSON rows that fail to parse are reported
+# per row; a malformed JSON array cannot be resynchronised and raises
+# MalformedBody instead.
+async def iter_json_rows(chunks):
+    text = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buffer = ""
+    mode = None
+    expect = "first"  # in an array: what may come next, see _split_array
+    row_number = 0
+
+    async for chunk in chunks:
+        buffer += text.decode(chunk)
+        if mode is None:
+            stripped = buffer.lstrip(_WHITESPACE)
+            if not stripped:
+                continue
+            mode = "array" if stripped[0] == "[" else "ndjson"
+            buffer = stripped[1:] if mode == "array" else stripped
+
+        if mode == "ndjson":
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                if line.strip():
+                    row_number += 1
+                    yield _parse_line(row_number, line)
+        elif mode == "array":
+            rows, buffer, closed, expect = _split_array(buffer, expect, final=False)
+            for row in rows:
+                row_number += 1
+                yield row_number, row, None
+            if closed:
+                mode = "closed"
+        if mode == "closed" and buffer.strip(_WHITESPACE):
+            raise MalformedBody("Unexpected data after the JSON array")
+
+    buffer += text.decode(b"", final=True)
+    if mode == "ndjson" and buffer.strip():
+        row_number += 1
+        yield _parse_line(row_number, buffer)
+    elif mode == "array":
+        rows, buffer, _, _ = _split_array(buffer, expect, final=True)
+        for row in rows:
+            row_number += 1
+            yield row_number, row, None
+        if buffer.strip(_WHITESPACE):
+            raise MalformedBody("Unexpected data after the JSON array")
+
+
+def _parse_line(row_number, line):
+    try:
+        return row_number, json.loads(line), None
+    except json.JSONDecodeError as e:
+        return row_number, None, f"Invalid JSON: {e.msg}"
+
+
+# Whether a decode error only means the row is cut off at the end of the
+# buffer (an open string, a literal or number still being written, nothing
+# after the last token), so more input may complete it.
+def _needs_more(buffer, error):
+    rest = buffer[error.pos:]
+    if error.msg.startswith("Unterminated string"):
+        return True
+    if error.msg.startswith("Invalid \\uXXXX escape"):
+        return len(buffer) - error.pos < 6
+    if not rest.strip(_WHITESPACE):
+        return True
+    if any(literal.startswith(rest) for literal in _LITERALS):
+        return True
+    return bool(_NUMBER_TAIL.search(buffer[error.pos - 1:]))
+
+
+# Returns the complete rows at the front of the buffer, the unconsumed rest,
+# whether the closing bracket has been reached, and what may come next:
+# "first" (a row or "]", right after "["), "row" (after a comma) or
+# "separator" (a comma or "]", after a row).
+def _split_array(buffer, expect, final):
+    rows = []
+    position = 0
+    while True:
+        while position < len(buffer) and buffer[position] in _WHITESPACE:
+            position += 1
+        if position == len(buffer):
+            if final:
+                raise MalformedBody("JSON array is not terminated")
+            return rows, "", False, expect
+        char = buffer[position]
+        if char == "]" and expect != "row":
+            return rows, buffer[position + 1:], True, expect
+        if expect == "separator":
+            if char != ",":
+                raise MalformedBody("Invalid JSON array: expected ',' or ']' after an element")
+            expect = "row"
+            position += 1
+            continue
+        try:
+            row, end = _decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as e:
+            if final or not _needs_more(buffer, e):
+                raise MalformedBody(f"Invalid JSON array: {e.msg}")
+            return rows, buffer[position:], False, expect
+        if not final and isinstance(row, (int, float)) and _NUMBER_REST.fullmatch(buffer, end):
+            # a number at the end of the buffer may have more digits, a
+            # fraction or an exponent coming ("-0." + "5")
+            return rows, buffer[position:], False, expect
+        rows.append(row)
+        position = end
+        expect = "separator"
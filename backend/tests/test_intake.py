@@ -0,0 +1,225 @@
+"""The write-behind intake batcher (intake.Batcher) and the 503 that
+POST /reports/ answers when its queue is full. Needs no mongod; the batch
+write is a stub. Run from the backend folder:
+
+    python -m pytest tests/test_intake.py
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+from fastapi import HTTPException
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import intake
+
+TIMEOUT = 2
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    def configure(batch_size=500, flush_seconds=0.01, queue_size=5000):
+        monkeypatch.setattr(intake, "INTAKE_BATCH_SIZE", batch_size)
+        monkeypatch.setattr(intake, "FLUSH_SECONDS", flush_seconds)
+        monkeypatch.setattr(intake, "INTAKE_QUEUE_SIZE", queue_size)
+    return configure
+
+
+class Writer:
+    """Batch write stub: records each batch, optionally fails or blocks."""
+
+    def __init__(self, errors=None, fail=None):
+        self.batches = []
+        self.errors = errors or {}  # doc -> error message
+        self.fail = fail
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self, docs):
+        self.batches.append(list(docs))
+        await self.release.wait()
+        if self.fail:
+            raise self.fail
+        return [self.errors.get(doc) for doc in docs]
+
+
+def run(test):
+    asyncio.run(asyncio.wait_for(test(), TIMEOUT))
+
+
+def test_flushes_as_soon_as_a_batch_is_full(settings):
+    settings(batch_size=3, flush_seconds=60)
+
+    async def test():
+        writer = Writer()
+        batcher = intake.Batcher(writer)
+        batcher.start()
+        results = await asyncio.gather(*(batcher.submit(doc) for doc in "abc"))
+        assert results == [None, None, None]
+        assert writer.batches == [["a", "b", "c"]]
+        await batcher.stop()
+
+    run(test)
+
+
+def test_flushes_a_partial_batch_after_the_wait(settings):
+    settings(batch_size=100, flush_seconds=0.05)
+
+    async def test():
+        writer = Writer()
+        batcher = intake.Batcher(writer)
+        batcher.start()
+        started = asyncio.get_running_loop().time()
+        await asyncio.gather(batcher.submit("a"), batcher.submit("b"))
+        assert asyncio.get_running_loop().time() - started >= 0.04
+        assert writer.batches == [["a", "b"]]
+        assert batcher.batches == 1 and batcher.documents == 2
+        await batcher.stop()
+
+    run(test)
+
+
+def test_splits_a_burst_into_batches_of_the_batch_size(settings):
+    settings(batch_size=4, flush_seconds=0.01)
+
+    async def test():
+        writer = Writer()
+        batcher = intake.Batcher(writer)
+        batcher.start()
+        await asyncio.gather(*(batcher.submit(n) for n in range(10)))
+        assert [len(batch) for batch in writer.batches] == [4, 4, 2]
+        assert [doc for batch in writer.batches for doc in batch] == list(range(10))
+        await batcher.stop()
+
+    run(test)
+
+
+def test_returns_each_documents_own_write_error(settings):
+    settings(batch_size=3)
+
+    async def test():
+        batcher = intake.Batcher(Writer(errors={"b": "duplicate key"}))
+        batcher.start()
+        assert await asyncio.gather(*(batcher.submit(doc) for doc in "abc")) == [None, "duplicate key", None]
+        assert batcher.failed == 1
+        await batcher.stop()
+
+    run(test)
+
+
+def test_refuses_documents_when_the_queue_is_full(settings):
+    settings(batch_size=2, flush_seconds=0, queue_size=2)
+
+    async def test():
+        writer = Writer()
+        writer.release.clear()  # the first batch is stuck writing
+        batcher = intake.Batcher(writer)
+        batcher.start()
+        writing = [asyncio.ensure_future(batcher.submit(doc)) for doc in "ab"]
+        while not writer.batches:
+            await asyncio.sleep(0)
+        queued = [asyncio.ensure_future(batcher.submit(doc)) for doc in "cd"]
+        await asyncio.sleep(0)
+        with pytest.raises(asyncio.QueueFull):
+            await batcher.submit("e")
+        assert batcher.rejected == 1
+        assert batcher.retry_after() >= 1
+
+        writer.release.set()
+        assert await asyncio.gather(*writing, *queued) == [None] * 4
+        await batcher.stop()
+
+    run(test)
+
+
+def test_refuses_documents_when_not_running(settings):
+    settings()
+
+    async def test():
+        batcher = intake.Batcher(Writer())
+        with pytest.raises(asyncio.QueueFull):
+            await batcher.submit("a")
+        batcher.start()
+        await batcher.stop()
+        with pytest.raises(asyncio.QueueFull):
+            await batcher.submit("b")
+
+    run(test)
+
+
+def test_a_failed_write_fails_its_batch_and_the_next_one_still_runs(settings):
+    settings(batch_size=2)
+
+    async def test():
+        writer = Writer(fail=RuntimeError("not primary"))
+        batcher = intake.Batcher(writer)
+        batcher.start()
+        results = await asyncio.gather(batcher.submit("a"), batcher.submit("b"), return_exceptions=True)
+        assert [str(result) for result in results] == ["not primary", "not primary"]
+        assert batcher.failed == 2
+
+        writer.fail = None
+        assert await asyncio.gather(batcher.submit("c"), batcher.submit("d")) == [None, None]
+        await batcher.stop()
+
+    run(test)
+
+
+def test_after_gets_the_written_documents_and_cannot_fail_them(settings):
+    settings(batch_size=3)
+
+    async def test():
+        seen = []
+
+        async def after(docs):
+            seen.append(docs)
+            raise RuntimeError("rollups down")
+
+        batcher = intake.Batcher(Writer(errors={"b": "duplicate key"}), after=after)
+        batcher.start()
+        assert await asyncio.gather(*(batcher.submit(doc) for doc in "abc")) == [None, "duplicate key", None]
+        assert await asyncio.gather(*(batcher.submit(doc) for doc in "def")) == [None, None, None]
+        await batcher.stop()
+        assert seen == [["a", "c"], ["d", "e", "f"]]
+
+    run(test)
+
+
+def test_stop_flushes_what_is_queued(settings):
+    settings(batch_size=100, flush_seconds=60)
+
+    async def test():
+        writer = Writer()
+        batcher = intake.Batcher(writer)
+        batcher.start()
+        submitted = [asyncio.ensure_future(batcher.submit(doc)) for doc in "ab"]
+        await asyncio.sleep(0)
+        await batcher.stop()
+        assert await asyncio.gather(*submitted) == [None, None]
+        assert writer.batches == [["a", "b"]]
+
+    run(test)
+
+
+def test_create_report_answers_503_with_retry_after_when_the_queue_is_full(monkeypatch):
+    from routes import reports
+
+    async def full(doc):
+        raise asyncio.QueueFull()
+
+    monkeypatch.setattr(intake, "enabled", True)
+    monkeypatch.setattr(reports.report_intake, "submit", full)
+    monkeypatch.setattr(reports.report_intake, "retry_after", lambda: 3)
+
+    async def test():
+        with pytest.raises(HTTPException) as raised:
+            await reports.create_report(
+                reporter_type="individual", anonymous=True, email=None, phone=None, preferred_contact=None,
+                date="2024-03-01", country="Syria", city="Aleppo", latitude=36.2, longitude=37.16,
+                description="Arbitrary arrest at a checkpoint", violation_types="Arbitrary Arrest", file=None)
+        assert raised.value.status_code == 503
+        assert raised.value.headers == {"Retry-After": "3"}
+
+    run(test)
@@ -0,0 +1,246 @@
+"""Explain every query the API and the dashboard run, and fail on collection
+scans.
+
+The pipelines come from the same builders the routes use, and are explained
+with executionStats against a scratch database holding the indexes from
+indexes.py and one linked document of each kind, so $lookup stages actually
+run and report whether they scanned. Needs a mongod; skipped unless
+MONGO_URL is set. Run from the backend folder:
+
+    MONGO_URL=mongodb://localhost:27017 python -m pytest tests
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [BACKEND_DIR, os.path.join(os.path.dirname(BACKEND_DIR), "dashboard")]
+
+import queries as dashboard_queries
+from indexes import ensure_indexes
+from pagination import DEFAULT_LIMIT, shaped_page_pipeline
+from routes.analytics import build_rollup_match, grouped_pipeline
+from routes.cases import CASE_LIST_PROJECTION, CASE_LIST_SHAPE, build_case_query, dossier_pipeline
+from routes.geo import COORDINATES_FIELD, GEO_SHAPE, clusters_pipeline, near_pipeline, within_filter
+from routes.reports import REPORT_LIST_PROJECTION, REPORT_LIST_SHAPE, build_report_query
+from routes.search import CASE_SEARCH_PROJECTION, REPORT_SEARCH_PROJECTION, SCORE
+from routes.victims import VICTIM_EXPORT_PROJECTION, case_victims_pipeline
+
+try:
+    import snapshot
+except ImportError:  # snapshot.py needs pyarrow
+    snapshot = None
+
+MONGO_URL = os.getenv("MONGO_URL")
+PLANS_DB = os.getenv("PLANS_DB", "hrm_query_plans")
+
+pytestmark = pytest.mark.skipif(not MONGO_URL, reason="needs a mongod, set MONGO_URL")
+
+REPORT_ID = ObjectId()
+CASE_ID = ObjectId()
+VICTIM_ID = ObjectId()
+DAY = datetime(2024, 3, 1)
+
+
+def seed(db):
+    db.incident_reports.insert_one({
+        "_id": REPORT_ID,
+        "reporter_type": "individual",
+        "anonymous": True,
+        "status": "new",
+        "incident_details": {
+            "date": DAY,
+            "location": {"country": "Syria", "city": "Aleppo",
+                         "coordinates": {"type": "Point", "coordinates": [37.16, 36.2]}},
+            "description": "Arbitrary arrest at a checkpoint",
+            "violation_types": ["Arbitrary Arrest"],
+        },
+        "language": "english",
+        "created_at": DAY,
+        "updated_at": DAY,
+    })
+    db.cases.insert_one({
+        "_id": CASE_ID,
+        "title": "Checkpoint arrests",
+        "description": "Arrests at the northern checkpoint",
+        "violation_types": ["Arbitrary Arrest"],
+        "status": "new",
+        "priority": "high",
+        "location": {"country": "Syria", "region": "Aleppo"},
+        "date_occurred": DAY,
+        "date_reported": DAY,
+        "language": "english",
+        "created_at": DAY,
+        "updated_at": DAY,
+    })
+    db.victims.insert_one({
+        "_id": VICTIM_ID,
+        "type": "victim",
+        "anonymous": True,
+        "demographics": {"gender": "male", "age": 30},
+        "risk_assessment": {"level": "high"},
+        "cases_involved": [CASE_ID],
+        "created_at": DAY,
+        "updated_at": DAY,
+    })
+    db.case_status_history.insert_one({"case_id": CASE_ID, "new_status": "new", "timestamp": DAY})
+    db.report_status_history.insert_one({"report_id": REPORT_ID, "new_status": "new", "timestamp": DAY})
+    db.daily_rollups.insert_many([
+        {"violation_type": None, "country": "Syria", "day": DAY, "status": "new", "count": 1},
+        {"violation_type": "Arbitrary Arrest", "country": "Syria", "day": DAY, "status": "new", "count": 1},
+    ])
+    db.report_lsh.insert_one({"_id": REPORT_ID, "signature": [1] * 64, "bands": ["0:1f", "1:2e"],
+                              "date": DAY, "coordinates": [37.16, 36.2], "cluster": REPORT_ID})
+
+
+def aggregate(collection, pipeline):
+    return {"aggregate": collection, "pipeline": pipeline, "cursor": {}}
+
+
+def find(collection, query, projection=None, sort=None):
+    command = {"find": collection, "filter": query}
+    if projection:
+        command["projection"] = projection
+    if sort:
+        command["sort"] = sort
+    return command
+
+
+def route_queries():
+    page = DEFAULT_LIMIT
+    report_filters = {
+        "all": {},
+        "status": {"status": "new"},
+        "country": {"country": "Syria"},
+        "country+city": {"country": "Syria", "city": "Aleppo"},
+        "dates": {"from_date": "2024-01-01", "to_date": "2024-06-30"},
+        "status+country+dates": {"status": "new", "country": "Syria",
+                                 "from_date": "2024-01-01", "to_date": "2024-06-30"},
+    }
+    for name, filters in report_filters.items():
+        query = build_report_query(**filters)
+        yield f"GET /reports/ [{name}]", aggregate(
+            "incident_reports", shaped_page_pipeline(query, REPORT_LIST_SHAPE, page))
+        yield f"export reports [{name}]", find(
+            "incident_reports", query, REPORT_LIST_PROJECTION, {"_id": 1})
+    yield "GET /reports/ [status+cursor]", aggregate("incident_reports", shaped_page_pipeline(
+        {**build_report_query("new"), "_id": {"$lt": REPORT_ID}}, REPORT_LIST_SHAPE, page))
+
+    within = within_filter(bbox="34,29,39,37")
+    yield "GET /reports/within [bbox]", aggregate(
+        "incident_reports", shaped_page_pipeline(within, GEO_SHAPE, page))
+    yield "GET /reports/within [bbox+status]", aggregate(
+        "incident_reports", shaped_page_pipeline({**build_report_query("new"), **within}, GEO_SHAPE, page))
+    yield "GET /reports/near", aggregate(
+        "incident_reports", near_pipeline(37.1, 36.2, 10_000, build_report_query(), page))
+    yield "GET /reports/near [status+dates]", aggregate(
+        "incident_reports", near_pipeline(37.1, 36.2, 10_000, build_report_query("new", "2024-01-01", "2024-06-30"), page))
+    # Without a bbox or filters /reports/clusters groups every located
+    # report, which is a full scan by design
+    yield "GET /reports/clusters [bbox]", aggregate(
+        "incident_reports", clusters_pipeline({**build_report_query(), **within}, 1.0))
+    yield "GET /reports/clusters [country]", aggregate("incident_reports", clusters_pipeline(
+        {**build_report_query(country="Syria"), COORDINATES_FIELD: {"$exists": True}}, 1.0))
+
+    case_filters = {
+        "all": {},
+        "violation_type": {"violation_type": "Arbitrary Arrest"},
+        "country": {"country": "Syria"},
+        "dates": {"from_date": "2024-01-01", "to_date": "2024-06-30"},
+    }
+    for name, filters in case_filters.items():
+        query = build_case_query(**filters)
+        yield f"GET /cases [{name}]", aggregate("cases", shaped_page_pipeline(query, CASE_LIST_SHAPE, page))
+        yield f"export cases [{name}]", find("cases", query, CASE_LIST_PROJECTION, {"_id": 1})
+
+    yield "GET /cases/{id}", find("cases", {"_id": CASE_ID})
+    yield "GET /cases/{id}/dossier", aggregate("cases", dossier_pipeline([CASE_ID]))
+    yield "GET /victims/{id}", find("victims", {"_id": VICTIM_ID})
+    yield "GET /victims/case/{id}", aggregate("victims", case_victims_pipeline(CASE_ID))
+    yield "export victims [case_id]", find("victims", {"cases_involved": CASE_ID}, VICTIM_EXPORT_PROJECTION, {"_id": 1})
+
+    yield "GET /search [reports]", find(
+        "incident_reports", {"$text": {"$search": "arrest", "$language": "english"}},
+        REPORT_SEARCH_PROJECTION, {"score": SCORE})
+    yield "GET /search [cases]", find(
+        "cases", {"$text": {"$search": "اعتقال", "$language": "none"}}, CASE_SEARCH_PROJECTION, {"score": SCORE})
+
+    for name, filters in {"all": {}, "country": {"country": "Syria"},
+                          "dates": {"from_date": "2024-01-01", "to_date": "2024-06-30"}}.items():
+        violations = {**build_rollup_match(**filters), "violation_type": {"$ne": None}}
+        yield f"GET /analytics/violations [{name}]", aggregate(
+            "daily_rollups", grouped_pipeline(violations, "$violation_type", {"count": -1}))
+        yield f"GET /analytics/geodata [{name}]", aggregate(
+            "daily_rollups", grouped_pipeline(build_rollup_match(**filters), "$country", {"count": -1}))
+        yield f"GET /analytics/timeline [{name}]", aggregate(
+            "daily_rollups", grouped_pipeline(build_rollup_match("Arbitrary Arrest", **filters), "$day", {"_id": 1}))
+
+    start, end = datetime(2024, 1, 1), datetime(2024, 6, 30)
+    for name, (violation_type, country) in {"dates": (None, None), "violation_type": ("Arbitrary Arrest", None),
+                                            "country": (None, "Syria")}.items():
+        filters = (violation_type, country, start, end)
+        yield f"dashboard rollup views [{name}]", aggregate("daily_rollups", dashboard_queries.rollup_views_pipeline(*filters))
+        yield f"dashboard clusters [{name}]", aggregate("incident_reports", dashboard_queries.clusters_pipeline(*filters))
+
+    if snapshot is not None:
+        state = {"last_id": str(REPORT_ID), "updated_at": DAY.isoformat()}
+        for name, spec in snapshot.TABLES.items():
+            yield f"snapshot refresh [{name}]", find(
+                spec["collection"], snapshot.changed_query(state), spec["projection"], {"_id": 1})
+
+    yield "GET /reports/{id}/duplicates [bands]", find(
+        "report_lsh", {"bands": {"$in": ["0:1f", "1:2e"]}, "_id": {"$ne": REPORT_ID}})
+    yield "GET /reports/{id}/duplicates [cluster]", find("report_lsh", {"cluster": REPORT_ID})
+    yield "case status history", find("case_status_history", {"case_id": CASE_ID}, sort={"timestamp": 1})
+    yield "report status history", find("report_status_history", {"report_id": REPORT_ID}, sort={"timestamp": 1})
+
+
+def scans(explain):
+    """Paths in an explain output where a collection is scanned."""
+    found = []
+
+    def walk(node, path):
+        if isinstance(node, dict):
+            if node.get("stage") == "COLLSCAN" or node.get("collectionScans", 0) > 0:
+                found.append(path or "/")
+            for key, value in node.items():
+                if key != "rejectedPlans":
+                    walk(value, f"{path}/{key}")
+        elif isinstance(node, list):
+            for i, value in enumerate(node):
+                walk(value, f"{path}/{i}")
+
+    walk(explain, "")
+    return found
+
+
+@pytest.fixture(scope="module")
+def plans_db():
+    client = MongoClient(MONGO_URL)
+    client.drop_database(PLANS_DB)
+
+    async def build_indexes():
+        motor_client = AsyncIOMotorClient(MONGO_URL)
+        await ensure_indexes(motor_client[PLANS_DB])
+        motor_client.close()
+
+    asyncio.run(build_indexes())
+    seed(client[PLANS_DB])
+    yield client[PLANS_DB]
+    client.drop_database(PLANS_DB)
+    client.close()
+
+
+QUERIES = list(route_queries())
+
+
+@pytest.mark.parametrize("command", [command for _, command in QUERIES], ids=[name for name, _ in QUERIES])
+def test_query_uses_an_index(plans_db, command):
+    explain = plans_db.command({"explain": command, "verbosity": "executionStats"})
+    assert not scans(explain), f"collection scan at {scans(explain)}"
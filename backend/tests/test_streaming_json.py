@@ -0,0 +1,132 @@
+"""The incremental NDJSON / JSON array reader behind POST /reports/bulk.
+
+Bodies are fed in chunks of every size, so rows, strings, escapes, numbers
+and multi-byte characters get cut at every possible boundary. Run from the
+backend folder:
+
+    python -m pytest tests/test_streaming_json.py
+"""
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streaming_json import MalformedBody, iter_json_rows
+
+ROWS = [
+    {"description": "Arrest at the \"north\" checkpoint\\gate", "violation_types": ["Arbitrary Arrest"]},
+    {"description": "اعتقال تعسفي عند الحاجز", "city": "Zürich é中", "escaped": "\\u00e9 é\n\t"},
+    {"latitude": 36.2, "longitude": -37.125, "count": 12345, "ratio": 1.5e10, "small": -2E-3},
+    {"anonymous": True, "email": None, "flags": [False, True, None], "nested": {"a": [1, [2, {"b": 3}]]}},
+    {},
+]
+
+
+def chunked(data, size):
+    async def chunks():
+        for start in range(0, len(data), size):
+            yield data[start:start + size]
+    return chunks()
+
+
+def read(body, size=None, stop_on_error=True):
+    """[(row_number, row, error)] read from body in chunks of size bytes.
+    With stop_on_error=False, a MalformedBody is returned as the last item
+    instead of raised."""
+    data = body.encode() if isinstance(body, str) else body
+
+    async def collect():
+        results = []
+        try:
+            async for result in iter_json_rows(chunked(data, size or len(data) or 1)):
+                results.append(result)
+        except MalformedBody as e:
+            if stop_on_error:
+                raise
+            results.append(e)
+        return results
+
+    return asyncio.run(collect())
+
+
+def sizes(body):
+    return range(1, len(body.encode()) + 1)
+
+
+def test_array_rows_survive_every_chunk_boundary():
+    body = " \n[\n" + ",\n".join(json.dumps(row, ensure_ascii=False) for row in ROWS) + "\n] \n"
+    for size in sizes(body):
+        assert read(body, size) == [(n, row, None) for n, row in enumerate(ROWS, 1)], size
+
+
+def test_numbers_are_not_cut_at_chunk_boundaries():
+    body = "[12345, -0.5, 6.02e23, 7E-2, 0, 1.0]"
+    for size in sizes(body):
+        assert [row for _, row, _ in read(body, size)] == [12345, -0.5, 6.02e23, 7e-2, 0, 1.0], size
+
+
+def test_ndjson_rows_survive_every_chunk_boundary():
+    body = "\n".join(json.dumps(row, ensure_ascii=False) for row in ROWS)  # no trailing newline
+    for size in sizes(body):
+        assert read(body, size) == [(n, row, None) for n, row in enumerate(ROWS, 1)], size
+
+
+def test_ndjson_bad_lines_are_reported_per_row():
+    body = '{"a": 1}\n\n{"a": \n  \n{"a": 3}\r\n[1, 2]\n'
+    for size in sizes(body):
+        results = read(body, size)
+        assert [(n, row) for n, row, _ in results] == [(1, {"a": 1}), (2, None), (3, {"a": 3}), (4, [1, 2])]
+        assert results[1][2].startswith("Invalid JSON")
+        assert results[0][2] is None and results[2][2] is None
+
+
+@pytest.mark.parametrize("body", ["", "   \n", "[]", " [ ] ", "[\n]\n"])
+def test_empty_bodies_have_no_rows(body):
+    for size in sizes(body) or [1]:
+        assert read(body, size) == []
+
+
+@pytest.mark.parametrize("body, message", [
+    ('[{"a": 1} {"a": 2}]', "expected ','"),
+    ('[{"a": 1},, {"a": 2}]', "Invalid JSON array"),
+    ('[{"a": 1},]', "Invalid JSON array"),
+    ('[, {"a": 1}]', "Invalid JSON array"),
+    ('[{"a": 1}', "not terminated"),
+    ('[{"a": 1},', "not terminated"),
+    ('[{"a": "open', "Invalid JSON array"),
+    ('[{"a": tru}]', "Invalid JSON array"),
+    ('[{"a": 1}] {"b": 2}', "Unexpected data after the JSON array"),
+])
+def test_malformed_arrays_raise_after_the_rows_before_the_damage(body, message):
+    for size in sizes(body):
+        *rows, error = read(body, size, stop_on_error=False)
+        assert isinstance(error, MalformedBody) and message in str(error), (size, error)
+        assert all(row == {"a": 1} for _, row, _ in rows)
+        assert [n for n, _, _ in rows] == list(range(1, len(rows) + 1))
+
+
+def test_malformed_arrays_fail_without_reading_the_rest_of_the_body():
+    consumed = []
+
+    async def chunks():
+        yield b'[{"a": 1} {"a": 2}'
+        for _ in range(1000):
+            consumed.append(1)
+            yield b', {"a": 3}' * 100
+
+    async def collect():
+        return [row async for _, row, _ in iter_json_rows(chunks())]
+
+    with pytest.raises(MalformedBody):
+        asyncio.run(collect())
+    assert len(consumed) <= 1
+
+
+def test_invalid_utf8_is_replaced_not_fatal():
+    body = b'{"a": "caf\xff"}\n{"a": "\xc3\xa9"}\n'
+    for size in range(1, len(body) + 1):
+        assert [row for _, row, _ in read(body, size)] == [{"a": "caf�"}, {"a": "é"}]
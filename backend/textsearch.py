@@ -0,0 +1,17 @@
+import re
+
+# MongoDB text indexes have no Arabic stemmer, so Arabic text is indexed with
+# language "none" (plain tokens, no stemming or stop words) and everything
+# else as English. Documents carry the choice in their `language` field,
+# which the text indexes use as their language override.
+ARABIC_SCRIPT = re.compile(r"[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFF]")
+
+ENGLISH = "english"
+ARABIC = "none"
+
+
+def detect_language(*texts) -> str:
+    for text in texts:
+        if text and ARABIC_SCRIPT.search(text):
+            return ARABIC
+    return ENGLISH
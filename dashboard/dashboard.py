@@ -4,12 +4,96 @@ import plotly.express as px
 from pymongo import MongoClient
 from datetime import datetime
 import io
+import json
+import os
+import numpy as np
+import requests
 import streamlit.components.v1 as components
 
-# Mongo connection
-client = MongoClient("mongodb://localhost:27017/")
+import queries
+
+try:
+    import snapshot
+except ImportError:  # snapshot mode needs pyarrow
+    snapshot = None
+
+# Mongo connection, shared across reruns and sessions
+@st.cache_resource
+def get_client():
+    return MongoClient("mongodb://localhost:27017/")
+
+client = get_client()
 db = client["hrm_database"]
 reports_collection = db["incident_reports"]
+rollups_collection = db["daily_rollups"]
+
+# Results are cached per filter tuple; the newest _id and the document count
+# are part of the key so a new report invalidates the cached results (the
+# API updates the rollups in the same request).
+CACHE_TTL_SECONDS = 300
+CACHE_MAX_ENTRIES = 64
+
+# The API, for full exports that run as background jobs
+BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
+
+
+def data_version():
+    latest = reports_collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    return (str(latest["_id"]) if latest else None, reports_collection.estimated_document_count())
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def load_dashboard_data(violation_type, country, start_dt, end_dt, version):
+    filters = (violation_type, country, start_dt, end_dt)
+    views = next(rollups_collection.aggregate(queries.rollup_views_pipeline(*filters)), {})
+    return (
+        views.get("violations", []),
+        views.get("countries", []),
+        views.get("timeline", []),
+        list(reports_collection.aggregate(queries.clusters_pipeline(*filters))),
+    )
+
+# Snapshot mode: the same views computed with pandas from the columnar
+# snapshot (snapshot.py), so browsing doesn't query the live collections.
+# The frames are kept until the snapshot changes.
+@st.cache_resource(show_spinner=False, max_entries=1)
+def load_snapshot_frames(snapshot_version):
+    table = snapshot.load("reports", columns=["date", "country", "lng", "lat", "violation_types"])
+    if table is None:
+        return None
+    reports = table.to_pandas()
+    # One row per (report, violation type), indexed by the report's row
+    violations = reports["violation_types"].explode().dropna()
+    return reports, violations
+
+
+def snapshot_dashboard_data(violation_type, country, start_dt, end_dt, snapshot_version):
+    reports, violations = load_snapshot_frames(snapshot_version)
+    mask = reports["date"].between(start_dt, end_dt)
+    if country:
+        mask &= reports["country"] == country
+    if violation_type:
+        mask &= reports.index.isin(violations.index[violations == violation_type])
+    selected = reports[mask]
+
+    violation_counts = violations[mask.reindex(violations.index).to_numpy()].value_counts()
+    if violation_type:
+        # like the rollups: only the selected type, not the ones listed with it
+        violation_counts = violation_counts[violation_counts.index == violation_type]
+    country_counts = selected["country"].value_counts()
+    day_counts = selected["date"].dt.floor("D").value_counts().sort_index()
+
+    located = selected[["lng", "lat"]].dropna()
+    cells = np.floor(located / queries.CLUSTER_CELL_DEGREES)
+    grid = located.groupby([cells["lng"], cells["lat"]]).agg(
+        lng=("lng", "mean"), lat=("lat", "mean"), count=("lng", "size"))
+
+    return (
+        [{"_id": name, "count": int(count)} for name, count in violation_counts.items()],
+        [{"_id": name, "count": int(count)} for name, count in country_counts.items()],
+        [{"_id": day.strftime("%Y-%m-%d"), "count": int(count)} for day, count in day_counts.items()],
+        grid.to_dict(orient="records"),
+    )
 
 # Sidebar filters
 st.sidebar.header("🔍 Filters")
@@ -23,32 +107,29 @@ end_dt = datetime.combine(end_date, datetime.max.time())
 
 st.title("📊 Human Rights Dashboard")
 
-# Common date format & validation
-date_format = "%Y-%m-%d %H:%M:%S"
-date_validation = {"incident_details.date": {"$regex": "^[0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}:[0-9]{2}$"}}
+sources = ["Live database"] + (["Snapshot"] if snapshot is not None else [])
+source = st.sidebar.radio("Data source", sources)
+
+if source == "Snapshot":
+    if st.sidebar.button("🔄 Refresh snapshot"):
+        with st.spinner("Refreshing snapshot..."):
+            snapshot.refresh(db)
+    version = snapshot.version()
+    if version is None:
+        st.info("No snapshot yet. Build one with `python snapshot.py` or the refresh button.")
+        st.stop()
+    st.sidebar.caption(f"Snapshot as of {version} UTC")
+    violations, countries, timeline, clusters = snapshot_dashboard_data(
+        violation_type_filter, country_filter, start_dt, end_dt, version
+    )
+else:
+    version = data_version()
+    violations, countries, timeline, clusters = load_dashboard_data(
+        violation_type_filter, country_filter, start_dt, end_dt, version
+    )
 
 # Violations by Type
 st.subheader("1️⃣ Violations by Type")
-pipeline_violations = [
-    {"$match": date_validation},
-    {"$addFields": {
-        "parsed_date": {
-            "$dateFromString": {
-                "dateString": "$incident_details.date",
-                "format": date_format
-            }
-        }
-    }},
-    {"$match": {
-        "parsed_date": {"$gte": start_dt, "$lte": end_dt},
-        **({"incident_details.violation_types": violation_type_filter} if violation_type_filter else {}),
-        **({"incident_details.location.country": country_filter} if country_filter else {})
-    }},
-    {"$unwind": "$incident_details.violation_types"},
-    {"$group": {"_id": "$incident_details.violation_types", "count": {"$sum": 1}}},
-    {"$sort": {"count": -1}}
-]
-violations = list(reports_collection.aggregate(pipeline_violations))
 st.write("🔍 Violations Raw:", violations)
 if violations:
     df_v = pd.DataFrame(violations)
@@ -61,25 +142,6 @@ else:
 
 # Violations by Country (D3.js Map)
 st.subheader("2️⃣ Violations by Country")
-pipeline_geo = [
-    {"$match": date_validation},
-    {"$addFields": {
-        "parsed_date": {
-            "$dateFromString": {
-                "dateString": "$incident_details.date",
-                "format": date_format
-            }
-        }
-    }},
-    {"$match": {
-        "parsed_date": {"$gte": start_dt, "$lte": end_dt},
-        **({"incident_details.violation_types": violation_type_filter} if violation_type_filter else {}),
-        **({"incident_details.location.country": country_filter} if country_filter else {})
-    }},
-    {"$group": {"_id": "$incident_details.location.country", "count": {"$sum": 1}}},
-    {"$sort": {"count": -1}}
-]
-countries = list(reports_collection.aggregate(pipeline_geo))
 st.write("🔍 Countries Raw:", countries)
 if countries:
     df_c = pd.DataFrame(countries)
@@ -87,7 +149,8 @@ if countries:
     st.bar_chart(df_c.set_index("Country"))
 
     # Render D3.js map
-    d3_data = df_c.to_dict(orient="records")
+    d3_data = json.dumps(df_c.to_dict(orient="records"))
+    d3_clusters = json.dumps(clusters)
     d3_script = f"""
     <!DOCTYPE html>
     <html>
@@ -99,6 +162,10 @@ if countries:
     <div id="chart"></div>
     <script>
         const data = {d3_data};
+        const clusters = {d3_clusters};
+
+        // Index the counts once instead of scanning the list per feature
+        const countsByCountry = new Map(data.map(c => [c.Country.toLowerCase(), c.Count]));
 
         const width = 800;
         const height = 500;
@@ -119,17 +186,29 @@ if countries:
                 .data(world.features)
                 .join("path")
                 .attr("d", path)
-                .attr("fill", d => {{
-                    const countryData = data.find(c => c.Country.toLowerCase() === d.properties.name.toLowerCase());
-                    return countryData ? "orangered" : "#ddd";
-                }})
+                .attr("fill", d => countsByCountry.has(d.properties.name.toLowerCase()) ? "orangered" : "#ddd")
                 .attr("stroke", "white")
                 .attr("stroke-width", 0.5)
                 .append("title")
                 .text(d => {{
-                    const countryData = data.find(c => c.Country.toLowerCase() === d.properties.name.toLowerCase());
-                    return countryData ? d.properties.name + ": " + countryData.Count : d.properties.name;
+                    const count = countsByCountry.get(d.properties.name.toLowerCase());
+                    return count !== undefined ? d.properties.name + ": " + count : d.properties.name;
                 }});
+
+            const radius = d3.scaleSqrt()
+                .domain([1, d3.max(clusters, c => c.count) || 1])
+                .range([3, 18]);
+
+            svg.selectAll("circle")
+                .data(clusters)
+                .join("circle")
+                .attr("cx", c => projection([c.lng, c.lat])[0])
+                .attr("cy", c => projection([c.lng, c.lat])[1])
+                .attr("r", c => radius(c.count))
+                .attr("fill", "darkred")
+                .attr("fill-opacity", 0.6)
+                .append("title")
+                .text(c => c.count + " reports");
         }});
     </script>
     </body>
@@ -142,28 +221,6 @@ else:
 
 # Reports Timeline
 st.subheader("3️⃣ Reports Timeline")
-pipeline_timeline = [
-    {"$match": date_validation},
-    {"$addFields": {
-        "parsed_date": {
-            "$dateFromString": {
-                "dateString": "$incident_details.date",
-                "format": date_format
-            }
-        }
-    }},
-    {"$match": {
-        "parsed_date": {"$gte": start_dt, "$lte": end_dt},
-        **({"incident_details.violation_types": violation_type_filter} if violation_type_filter else {}),
-        **({"incident_details.location.country": country_filter} if country_filter else {})
-    }},
-    {"$group": {
-        "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$parsed_date"}},
-        "count": {"$sum": 1}
-    }},
-    {"$sort": {"_id": 1}}
-]
-timeline = list(reports_collection.aggregate(pipeline_timeline))
 st.write("🔍 Timeline Raw:", timeline)
 if timeline:
     df_t = pd.DataFrame(timeline)
@@ -176,31 +233,78 @@ else:
 # Download section
 st.subheader("📥 Download Data")
 
-def generate_excel_download(df, filename):
+# Files are only built when someone asks for them, not on every rerun. A
+# prepared file is kept for the filters it was built with.
+download_signature = (violation_type_filter, country_filter, start_dt, end_dt, version)
+
+def excel_bytes(df):
     buffer = io.BytesIO()
     df.to_excel(buffer, index=False, engine='xlsxwriter')
-    st.download_button(
-        label=f"📥 Download {filename}.xlsx",
-        data=buffer.getvalue(),
-        file_name=f"{filename}.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
+    return buffer.getvalue()
 
-def generate_csv_download(df, filename):
-    st.download_button(
-        label=f"📤 Download {filename}.csv",
-        data=df.to_csv(index=False),
-        file_name=f"{filename}.csv"
-    )
+def csv_bytes(df):
+    return df.to_csv(index=False).encode("utf-8")
+
+DOWNLOAD_FORMATS = {
+    "csv": ("📤", csv_bytes, "text/csv"),
+    "xlsx": ("📥", excel_bytes, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+def on_demand_download(df, filename, ext, column):
+    icon, build, mime = DOWNLOAD_FORMATS[ext]
+    state_key = f"download_{filename}_{ext}"
+    if column.button(f"{icon} Prepare {filename}.{ext}", key=f"prepare_{filename}_{ext}"):
+        st.session_state[state_key] = (download_signature, build(df))
+    prepared = st.session_state.get(state_key)
+    if prepared and prepared[0] == download_signature:
+        column.download_button(
+            label=f"{icon} Download {filename}.{ext}",
+            data=prepared[1],
+            file_name=f"{filename}.{ext}",
+            mime=mime
+        )
+
+def download_row(df, filename):
+    csv_column, excel_column = st.columns(2)
+    on_demand_download(df, filename, "csv", csv_column)
+    on_demand_download(df, filename, "xlsx", excel_column)
 
 if violations:
-    generate_csv_download(df_v, "violations")
-    generate_excel_download(df_v, "violations")
+    download_row(df_v, "violations")
 
 if countries:
-    generate_csv_download(df_c, "countries")
-    generate_excel_download(df_c, "countries")
+    download_row(df_c, "countries")
 
 if timeline:
-    generate_csv_download(df_t, "timeline")
-    generate_excel_download(df_t, "timeline")
+    download_row(df_t, "timeline")
+
+# Full report export, built by the API in the background
+st.subheader("📦 Full Report Export")
+export_format = st.selectbox("Format", ["csv", "xlsx", "ndjson"])
+if st.button("Start export"):
+    filters = {"from_date": start_dt.strftime("%Y-%m-%d"), "to_date": end_dt.strftime("%Y-%m-%d")}
+    if country_filter:
+        filters["country"] = country_filter
+    try:
+        response = requests.post(f"{BACKEND_URL}/exports", timeout=10,
+                                 json={"kind": "reports", "format": export_format, "filters": filters})
+        response.raise_for_status()
+        st.session_state["export_job"] = response.json()["id"]
+    except requests.RequestException as e:
+        st.error(f"Could not start the export: {e}")
+
+if "export_job" in st.session_state:
+    try:
+        response = requests.get(f"{BACKEND_URL}/exports/{st.session_state['export_job']}", timeout=10)
+        response.raise_for_status()
+        job = response.json()
+    except requests.RequestException as e:
+        st.error(f"Could not check the export: {e}")
+    else:
+        st.progress(job["progress"] or 0.0, text=f"{job['status']} — {job['rows']} rows")
+        if job["status"] == "done":
+            st.markdown(f"[📥 Download {job['kind']}.{job['format']}]({BACKEND_URL}{job['download_url']})")
+        elif job["status"] == "failed":
+            st.error(job.get("error", "Export failed"))
+        else:
+            st.button("🔄 Refresh")
@@ -1,12 +1,132 @@
-from pymongo import MongoClient
+"""Normalize string dates in incident_reports to native BSON dates.
+
+Older seed data stored `incident_details.date` as "%Y-%m-%d 00:00:00" and
+`created_at` as an ISO string, while the API writes real datetimes. This
+converts the strings in bulk batches, checkpointing the last processed _id
+in the `migrations` collection so an interrupted run resumes where it
+stopped.
+
+    python fix_all_dates.py [--batch-size 1000] [--dry-run] [--restart]
+"""
+import argparse
+from datetime import datetime
+
+from pymongo import MongoClient, UpdateOne
 
 client = MongoClient("mongodb://localhost:27017/")
 db = client["hrm_database"]
 collection = db["incident_reports"]
+migrations = db["migrations"]
+
+MIGRATION_ID = "normalize_incident_dates"
+# label (used as the counter key in the checkpoint) -> document path
+DATE_FIELDS = {"incident_date": "incident_details.date", "created_at": "created_at"}
+DATE_FORMATS = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S"]
+
+# The previous version of this script rewrote the literal placeholder
+# "string" to this date; keep doing the same for any that remain.
+PLACEHOLDER_DATES = {"string": datetime(2024, 3, 1)}
+
+MAX_FAILED_SAMPLES = 20
+
+
+def parse_date(value):
+    if value in PLACEHOLDER_DATES:
+        return PLACEHOLDER_DATES[value]
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def get_field(doc, path):
+    for key in path.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(key)
+    return doc
+
+
+def run(batch_size, dry_run, restart):
+    if restart:
+        migrations.delete_one({"_id": MIGRATION_ID})
+
+    state = migrations.find_one({"_id": MIGRATION_ID}) or {}
+    last_id = state.get("last_id")
+    converted = state.get("converted", {label: 0 for label in DATE_FIELDS})
+    failed = state.get("failed", 0)
+    failed_samples = state.get("failed_samples", [])
+    if last_id:
+        print(f"↪️ Resuming after _id {last_id}")
+
+    string_dates = {"$or": [{path: {"$type": "string"}} for path in DATE_FIELDS.values()]}
+    projection = {path: 1 for path in DATE_FIELDS.values()}
+
+    while True:
+        query = dict(string_dates)
+        if last_id:
+            query["_id"] = {"$gt": last_id}
+        batch = list(collection.find(query, projection).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+
+        operations = []
+        for doc in batch:
+            updates = {}
+            for label, path in DATE_FIELDS.items():
+                value = get_field(doc, path)
+                if not isinstance(value, str):
+                    continue
+                parsed = parse_date(value)
+                if parsed is None:
+                    failed += 1
+                    if len(failed_samples) < MAX_FAILED_SAMPLES:
+                        failed_samples.append({"_id": doc["_id"], "field": path, "value": value})
+                    continue
+                updates[path] = parsed
+                converted[label] += 1
+            if updates:
+                # Only rewrite fields that are still strings, in case the API
+                # touched the document since it was read.
+                guard = {"_id": doc["_id"], **{path: {"$type": "string"} for path in updates}}
+                operations.append(UpdateOne(guard, {"$set": updates}))
+
+        if operations and not dry_run:
+            collection.bulk_write(operations, ordered=False)
+
+        last_id = batch[-1]["_id"]
+        if not dry_run:
+            migrations.update_one(
+                {"_id": MIGRATION_ID},
+                {"$set": {
+                    "last_id": last_id,
+                    "converted": converted,
+                    "failed": failed,
+                    "failed_samples": failed_samples,
+                    "updated_at": datetime.utcnow(),
+                }},
+                upsert=True,
+            )
+        print(f"• Processed batch ending at {last_id} ({len(operations)} documents updated)")
+
+    prefix = "🧪 Would convert" if dry_run else "✅ Converted"
+    for label, count in converted.items():
+        print(f"{prefix} {count} `{DATE_FIELDS[label]}` values.")
+    if failed:
+        print(f"⚠️ {failed} values could not be parsed, for example:")
+        for item in failed_samples:
+            print(f"  {item['_id']} {item['field']} = {item['value']!r}")
 
-result = collection.update_many(
-    {"incident_details.date": "string"},
-    {"$set": {"incident_details.date": "2024-03-01 00:00:00"}}
-)
 
-print(f"✅ Fixed {result.modified_count} documents.")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Normalize string dates in incident_reports.")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    parser.add_argument("--restart", action="store_true", help="ignore the saved checkpoint")
+    args = parser.parse_args()
+    run(args.batch_size, args.dry_run, args.restart)
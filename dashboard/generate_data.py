@@ -0,0 +1,322 @@
+"""Generate linked synthetic data for capacity planning.
+
+Produces incident reports, cases, victims (linked to cases through
+`cases_involved`) and case status history in the same shape the API writes,
+with native BSON dates. One difference: create_case stores `date_occurred`
+and `date_reported` as the submitted strings, while these cases get BSON
+dates, which the /cases date filter and the snapshot compare against.
+Random values are drawn with numpy a whole batch at a
+time from skewed per-country and per-violation distributions. Each batch gets
+its own child seed, so a given --seed always produces the same data however
+many workers insert it.
+
+    python generate_data.py --reports 100000 --seed 42 --workers 4 --drop
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+from bson import ObjectId
+from pymongo import MongoClient
+
+client = MongoClient("mongodb://localhost:27017/")
+db = client["hrm_database"]
+
+# Share of reports per country, and each country's cities with a rough
+# centre point (lng, lat)
+COUNTRIES = {
+    "Palestine": (0.34, {"Gaza": (34.45, 31.50), "Khan Younis": (34.30, 31.35), "Nablus": (35.26, 32.22)}),
+    "Syria": (0.26, {"Aleppo": (37.16, 36.20), "Idlib": (36.63, 35.93), "Damascus": (36.29, 33.51)}),
+    "Yemen": (0.16, {"Sana'a": (44.21, 15.37), "Aden": (45.03, 12.79), "Taiz": (44.02, 13.58)}),
+    "Iraq": (0.14, {"Baghdad": (44.36, 33.31), "Mosul": (43.13, 36.34), "Basra": (47.78, 30.51)}),
+    "Lebanon": (0.10, {"Beirut": (35.50, 33.89), "Tripoli": (35.84, 34.44), "Tyre": (35.20, 33.27)}),
+}
+
+VIOLATIONS = [
+    "Torture",
+    "Arbitrary Arrest",
+    "Forced Displacement",
+    "Unlawful Killing",
+    "Enforced Disappearance",
+]
+
+# Relative weight of each violation type per country (same order as VIOLATIONS)
+VIOLATION_WEIGHTS = {
+    "Palestine": [0.10, 0.30, 0.35, 0.20, 0.05],
+    "Syria": [0.25, 0.20, 0.20, 0.15, 0.20],
+    "Yemen": [0.10, 0.15, 0.40, 0.30, 0.05],
+    "Iraq": [0.20, 0.25, 0.15, 0.15, 0.25],
+    "Lebanon": [0.15, 0.40, 0.20, 0.15, 0.10],
+}
+
+REPORT_STATUSES = (["new", "under_review", "resolved"], [0.5, 0.3, 0.2])
+CASE_STATUSES = (["new", "under_investigation", "resolved", "closed"], [0.3, 0.4, 0.2, 0.1])
+STATUS_FLOW = ["new", "under_investigation", "resolved", "closed"]
+PRIORITIES = (["low", "medium", "high"], [0.3, 0.5, 0.2])
+RISK_LEVELS = (["low", "medium", "high"], [0.5, 0.35, 0.15])
+
+START_DATE = datetime(2023, 1, 1)
+DAYS = 3 * 365
+# A few short crisis windows (day offset, length in days) that attract a
+# share of all incidents, as real intake does
+CRISES = [(120, 14), (400, 30), (760, 21)]
+CRISIS_SHARE = 0.35
+
+COUNTRY_NAMES = list(COUNTRIES)
+COUNTRY_P = np.array([COUNTRIES[c][0] for c in COUNTRY_NAMES])
+CITY_NAMES = [list(COUNTRIES[c][1]) for c in COUNTRY_NAMES]
+CITY_POINTS = np.array([list(COUNTRIES[c][1].values()) for c in COUNTRY_NAMES])
+LOG_VIOLATION_WEIGHTS = np.log(np.array([VIOLATION_WEIGHTS[c] for c in COUNTRY_NAMES]))
+
+EPOCH = np.datetime64(START_DATE, "ms")
+
+
+def to_datetimes(offsets_ms):
+    return (EPOCH + offsets_ms.astype("timedelta64[ms]")).tolist()
+
+
+def object_ids(rng, offsets_ms):
+    # Time-ordered ObjectIds built from the seeded rng, so ids are
+    # reproducible and _id order follows created_at. The timestamp is taken
+    # from the UTC offsets rather than the datetimes, which the local
+    # timezone would shift.
+    seconds = (EPOCH.astype("datetime64[s]").astype(np.int64) + offsets_ms // 1000).astype(">u4")
+    raw = np.empty((len(offsets_ms), 12), dtype=np.uint8)
+    raw[:, :4] = seconds.view(np.uint8).reshape(-1, 4)
+    raw[:, 4:] = rng.integers(0, 256, size=(len(offsets_ms), 8), dtype=np.uint8)
+    data = raw.tobytes()
+    return [ObjectId(data[i:i + 12]) for i in range(0, len(data), 12)]
+
+
+def incident_days(rng, n):
+    days = rng.integers(0, DAYS, size=n)
+    in_crisis = rng.random(n) < CRISIS_SHARE
+    crisis = rng.integers(0, len(CRISES), size=n)
+    starts = np.array([c[0] for c in CRISES])[crisis]
+    lengths = np.array([c[1] for c in CRISES])[crisis]
+    crisis_days = starts + (rng.random(n) * lengths).astype(int)
+    return np.where(in_crisis, crisis_days, days)
+
+
+def violation_sets(rng, country_idx):
+    # Weighted sampling without replacement for every row at once (Gumbel
+    # top-k): perturb the log weights and keep the largest `count` keys
+    keys = LOG_VIOLATION_WEIGHTS[country_idx] + rng.gumbel(size=(len(country_idx), len(VIOLATIONS)))
+    order = np.argsort(-keys, axis=1)
+    counts = rng.choice([1, 2, 3], size=len(country_idx), p=[0.6, 0.3, 0.1])
+    return [[VIOLATIONS[j] for j in row[:count]] for row, count in zip(order.tolist(), counts.tolist())]
+
+
+def locations(rng, country_idx):
+    city_idx = rng.integers(0, CITY_POINTS.shape[1], size=len(country_idx))
+    cities = [CITY_NAMES[c][i] for c, i in zip(country_idx.tolist(), city_idx.tolist())]
+    jitter = rng.normal(0, 0.08, size=(len(country_idx), 2))
+    coords = np.round(CITY_POINTS[country_idx, city_idx] + jitter, 4)
+    return cities, coords.tolist()
+
+
+def generate_reports(rng, n):
+    country_idx = rng.choice(len(COUNTRY_NAMES), size=n, p=COUNTRY_P)
+    day_ms = incident_days(rng, n) * 86_400_000
+    # Reports arrive a skewed number of hours after the incident
+    delay_ms = (rng.exponential(72, size=n) * 3_600_000).astype(np.int64)
+    dates = to_datetimes(day_ms)
+    created_ms = day_ms + delay_ms
+    created = to_datetimes(created_ms)
+    cities, coords = locations(rng, country_idx)
+    violations = violation_sets(rng, country_idx)
+    statuses = rng.choice(REPORT_STATUSES[0], size=n, p=REPORT_STATUSES[1]).tolist()
+    anonymous = (rng.random(n) < 0.4).tolist()
+    reporter_types = rng.choice(["individual", "organization"], size=n, p=[0.7, 0.3]).tolist()
+    ids = object_ids(rng, created_ms)
+
+    docs = []
+    for i in range(n):
+        country = COUNTRY_NAMES[country_idx[i]]
+        anon = anonymous[i]
+        docs.append({
+            "_id": ids[i],
+            "reporter_type": reporter_types[i],
+            "anonymous": anon,
+            "contact_info": {
+                "email": None if anon else f"reporter{i}@example.org",
+                "phone": None,
+                "preferred_contact": None if anon else "email",
+            },
+            "incident_details": {
+                "date": dates[i],
+                "location": {
+                    "country": country,
+                    "city": cities[i],
+                    "coordinates": {"type": "Point", "coordinates": coords[i]},
+                },
+                "description": f"{violations[i][0]} incident reported in {cities[i]}.",
+                "violation_types": violations[i],
+            },
+            "evidence": [],
+            "language": "english",
+            "status": statuses[i],
+            "created_at": created[i],
+            "updated_at": created[i],
+        })
+    return docs
+
+
+def generate_cases(rng, n, first_number):
+    country_idx = rng.choice(len(COUNTRY_NAMES), size=n, p=COUNTRY_P)
+    day_ms = incident_days(rng, n) * 86_400_000
+    delay_ms = (rng.exponential(10, size=n) * 86_400_000).astype(np.int64)
+    occurred = to_datetimes(day_ms)
+    reported_ms = day_ms + delay_ms
+    reported = to_datetimes(reported_ms)
+    cities, _ = locations(rng, country_idx)
+    violations = violation_sets(rng, country_idx)
+    statuses = rng.choice(CASE_STATUSES[0], size=n, p=CASE_STATUSES[1]).tolist()
+    priorities = rng.choice(PRIORITIES[0], size=n, p=PRIORITIES[1]).tolist()
+    ids = object_ids(rng, reported_ms)
+    step_gaps = rng.exponential(7, size=(n, len(STATUS_FLOW) - 1)).tolist()
+
+    cases, history = [], []
+    for i in range(n):
+        status = statuses[i]
+        country = COUNTRY_NAMES[country_idx[i]]
+        cases.append({
+            "_id": ids[i],
+            "title": f"Case #{first_number + i}: {violations[i][0]} in {cities[i]}",
+            "description": f"Documented {', '.join(violations[i]).lower()} in {cities[i]}, {country}.",
+            "violation_types": violations[i],
+            "status": status,
+            "priority": priorities[i],
+            "location": {"country": country, "region": cities[i]},
+            "date_occurred": occurred[i],
+            "date_reported": reported[i],
+            "evidence": [],
+            "language": "english",
+            "created_at": reported[i],
+            "updated_at": reported[i],
+        })
+        # One history row per step taken from "new" to the current status
+        timestamp = reported[i]
+        for step, gap in zip(STATUS_FLOW[1:STATUS_FLOW.index(status) + 1], step_gaps[i]):
+            timestamp += timedelta(days=gap)
+            history.append({"case_id": ids[i], "new_status": step, "timestamp": timestamp})
+        cases[-1]["updated_at"] = timestamp
+    return cases, history
+
+
+def generate_victims(rng, n, case_ids):
+    # Zipf-like: a few cases involve many victims
+    ranks = np.minimum(rng.zipf(1.5, size=(n, 2)) - 1, len(case_ids) - 1)
+    offsets = rng.integers(0, len(case_ids), size=n)
+    first = ((offsets + ranks[:, 0]) % len(case_ids)).tolist()
+    second = ((offsets + ranks[:, 1] + 1) % len(case_ids)).tolist()
+    has_second = (rng.random(n) < 0.25).tolist()
+    types = rng.choice(["victim", "witness"], size=n, p=[0.75, 0.25]).tolist()
+    anonymous = (rng.random(n) < 0.6).tolist()
+    genders = rng.choice(["female", "male"], size=n).tolist()
+    ages = rng.integers(5, 85, size=n).tolist()
+    risks = rng.choice(RISK_LEVELS[0], size=n, p=RISK_LEVELS[1]).tolist()
+    now = datetime.utcnow()
+
+    docs = []
+    for i in range(n):
+        linked = {case_ids[first[i]]}
+        if has_second[i]:
+            linked.add(case_ids[second[i]])
+        docs.append({
+            "type": types[i],
+            "anonymous": anonymous[i],
+            "demographics": {
+                "gender": genders[i],
+                "age": ages[i],
+                "ethnicity": None,
+                "occupation": None,
+            },
+            "contact_info": {"email": None, "phone": None, "secure_messaging": None},
+            "risk_assessment": {"level": risks[i], "threats": [], "protection_needed": risks[i] == "high"},
+            "support_services": [],
+            "cases_involved": sorted(linked),
+            "created_at": now,
+            "updated_at": now,
+        })
+    return docs
+
+
+def insert(collection, docs):
+    if docs:
+        db[collection].insert_many(docs, ordered=False)
+    return len(docs)
+
+
+def run(args):
+    if args.drop:
+        for name in ("incident_reports", "cases", "victims", "case_status_history"):
+            db[name].drop()
+
+    root = np.random.SeedSequence(args.seed)
+    report_seeds, case_seeds, victim_seeds = root.spawn(3)
+    batch = args.batch_size
+    started = time.perf_counter()
+    totals = {"incident_reports": 0, "cases": 0, "victims": 0, "case_status_history": 0}
+
+    def report_batch(seed, size):
+        return insert("incident_reports", generate_reports(np.random.default_rng(seed), size))
+
+    def case_batch(seed, size, first_number):
+        cases, history = generate_cases(np.random.default_rng(seed), size, first_number)
+        return insert("cases", cases), insert("case_status_history", history), [c["_id"] for c in cases]
+
+    def victim_batch(seed, size, case_ids):
+        return insert("victims", generate_victims(np.random.default_rng(seed), size, case_ids))
+
+    def sizes(total):
+        return [min(batch, total - start) for start in range(0, total, batch)]
+
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        report_sizes = sizes(args.reports)
+        report_jobs = [pool.submit(report_batch, seed, size)
+                       for seed, size in zip(report_seeds.spawn(len(report_sizes)), report_sizes)]
+
+        case_sizes = sizes(args.cases)
+        case_jobs = [pool.submit(case_batch, seed, size, n * batch + 1)
+                     for n, (seed, size) in enumerate(zip(case_seeds.spawn(len(case_sizes)), case_sizes))]
+        case_ids = []
+        for job in case_jobs:
+            cases, history, ids = job.result()
+            totals["cases"] += cases
+            totals["case_status_history"] += history
+            case_ids += ids
+
+        if case_ids:
+            victim_sizes = sizes(args.victims)
+            victim_jobs = [pool.submit(victim_batch, seed, size, case_ids)
+                           for seed, size in zip(victim_seeds.spawn(len(victim_sizes)), victim_sizes)]
+            totals["victims"] = sum(job.result() for job in victim_jobs)
+
+        totals["incident_reports"] = sum(job.result() for job in report_jobs)
+
+    elapsed = time.perf_counter() - started
+    for name, count in totals.items():
+        print(f"✅ {count} documents inserted into {name}.")
+    print(f"⏱ {elapsed:.1f}s ({sum(totals.values()) / elapsed:,.0f} docs/s)")
+    print("ℹ️ Run backend/rebuild_rollups.py to refresh the analytics rollups.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate linked synthetic HRM data.")
+    parser.add_argument("--reports", type=int, default=10000)
+    parser.add_argument("--cases", type=int, help="default: reports / 10")
+    parser.add_argument("--victims", type=int, help="default: cases * 2")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=4, help="parallel insert threads")
+    parser.add_argument("--drop", action="store_true",
+                        help="drop the collections first (the API rebuilds indexes on startup)")
+    args = parser.parse_args()
+    if args.cases is None:
+        args.cases = max(1, args.reports // 10)
+    if args.victims is None:
+        args.victims = args.cases * 2
+    run(args)
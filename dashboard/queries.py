@@ -0,0 +1,73 @@
+"""Aggregation pipelines the dashboard runs against MongoDB.
+
+Kept apart from dashboard.py (a Streamlit script) so they can be imported
+without starting the app, e.g. by backend/tests/test_query_plans.py.
+"""
+
+# Size of the map's incident clusters, in degrees of longitude/latitude
+CLUSTER_CELL_DEGREES = 0.5
+
+
+# The violation, country and timeline views read daily_rollups (maintained
+# by the API, see backend/rollups.py), so they cost days x countries x
+# violation types rather than one document per report. They share one
+# $match on the filters and come back from one $facet, one round trip.
+# Rows with violation_type None count each report once; with a violation
+# type filter the views count the reports listing that type.
+def rollup_counts(key, sort):
+    return [
+        {"$group": {"_id": key, "count": {"$sum": "$count"}}},
+        {"$match": {"count": {"$gt": 0}}},
+        {"$sort": sort},
+    ]
+
+
+def rollup_views_pipeline(violation_type, country, start_dt, end_dt):
+    # violation_type leads the rollup indexes, so it is always constrained
+    match = {"violation_type": violation_type or {"$exists": True}, "day": {"$gte": start_dt, "$lte": end_dt}}
+    if country:
+        match["country"] = country
+    if violation_type:
+        per_type = per_report = []
+    else:
+        per_type = [{"$match": {"violation_type": {"$ne": None}}}]
+        per_report = [{"$match": {"violation_type": None}}]
+    day = {"$dateToString": {"format": "%Y-%m-%d", "date": "$day"}}
+    return [
+        {"$match": match},
+        {"$facet": {
+            "violations": per_type + rollup_counts("$violation_type", {"count": -1}),
+            "countries": per_report + rollup_counts("$country", {"count": -1}),
+            "timeline": per_report + rollup_counts(day, {"_id": 1}),
+        }},
+    ]
+
+
+# The rollups carry no coordinates, so the map's grid clusters still come
+# from the reports: an indexed match on the filters, projected down to the
+# point, one row per cell instead of one point per report
+def clusters_pipeline(violation_type, country, start_dt, end_dt):
+    # Incident dates are native BSON dates (see fix_all_dates.py)
+    match = {
+        "incident_details.date": {"$gte": start_dt, "$lte": end_dt},
+        **({"incident_details.violation_types": violation_type} if violation_type else {}),
+        **({"incident_details.location.country": country} if country else {})
+    }
+    return [
+        {"$match": match},
+        {"$project": {
+            "lng": {"$arrayElemAt": ["$incident_details.location.coordinates.coordinates", 0]},
+            "lat": {"$arrayElemAt": ["$incident_details.location.coordinates.coordinates", 1]}
+        }},
+        {"$match": {"lng": {"$type": "number"}, "lat": {"$type": "number"}}},
+        {"$group": {
+            "_id": {
+                "x": {"$floor": {"$divide": ["$lng", CLUSTER_CELL_DEGREES]}},
+                "y": {"$floor": {"$divide": ["$lat", CLUSTER_CELL_DEGREES]}}
+            },
+            "count": {"$sum": 1},
+            "lng": {"$avg": "$lng"},
+            "lat": {"$avg": "$lat"}
+        }},
+        {"$project": {"_id": 0, "lng": 1, "lat": 1, "count": 1}}
+    ]
@@ -0,0 +1,328 @@
+"""Columnar snapshot of reports, cases and victims for the dashboard and
+ad-hoc analysis, so neither has to query the live collections.
+
+Each collection is flattened into an Arrow table and stored as uncompressed
+Arrow IPC (Feather) files, which readers memory-map rather than load. A
+refresh only reads what changed since the previous one: documents with an
+_id past the last one seen (new) or an updated_at past the last one seen
+(changed). The changes go to a new delta file; load() keeps the newest row
+per id, and once there are more than MAX_DELTAS files they are compacted back
+into one.
+
+    python snapshot.py              # refresh (the first run builds everything)
+    python snapshot.py --full       # rebuild from scratch
+    python snapshot.py --parquet    # also write <name>.parquet for other tools
+
+From pandas: snapshot.load("reports").to_pandas()
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+from bson import ObjectId
+from pymongo import MongoClient
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshot"))
+MANIFEST = "manifest.json"
+BATCH_SIZE = 10000
+MAX_DELTAS = 10
+# updated_at comes from the API server's clock when the write is sent, so a
+# write can commit after one stamped later; re-reading this far behind the
+# watermark picks those up (the overlap is dropped by load())
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+TIMESTAMP = pa.timestamp("ms")
+STRINGS = pa.list_(pa.string())
+
+
+def _date(value):
+    if isinstance(value, datetime):
+        # Arrow keeps milliseconds, like BSON
+        return value.replace(microsecond=value.microsecond // 1000 * 1000)
+    if isinstance(value, str):
+        try:
+            return datetime.strptime(value[:10], "%Y-%m-%d")
+        except ValueError:
+            return None
+    return None
+
+
+def _number(value, kind=float):
+    try:
+        return kind(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def report_row(doc):
+    details = doc.get("incident_details") or {}
+    location = details.get("location") or {}
+    coordinates = (location.get("coordinates") or {}).get("coordinates") or [None, None]
+    return {
+        "id": str(doc["_id"]),
+        "status": doc.get("status"),
+        "reporter_type": doc.get("reporter_type"),
+        "anonymous": doc.get("anonymous"),
+        "country": location.get("country"),
+        "city": location.get("city"),
+        "date": _date(details.get("date")),
+        "lng": _number(coordinates[0]),
+        "lat": _number(coordinates[1]),
+        "violation_types": list(details.get("violation_types") or []),
+        "language": doc.get("language"),
+        "created_at": _date(doc.get("created_at")),
+        "updated_at": _date(doc.get("updated_at")),
+    }
+
+
+def case_row(doc):
+    location = doc.get("location") or {}
+    return {
+        "id": str(doc["_id"]),
+        "title": doc.get("title"),
+        "status": doc.get("status"),
+        "priority": doc.get("priority"),
+        "country": location.get("country"),
+        "region": location.get("region"),
+        "violation_types": list(doc.get("violation_types") or []),
+        "date_occurred": _date(doc.get("date_occurred")),
+        "date_reported": _date(doc.get("date_reported")),
+        "created_at": _date(doc.get("created_at")),
+        "updated_at": _date(doc.get("updated_at")),
+    }
+
+
+def victim_row(doc):
+    demographics = doc.get("demographics") or {}
+    return {
+        "id": str(doc["_id"]),
+        "type": doc.get("type"),
+        "anonymous": doc.get("anonymous"),
+        "gender": demographics.get("gender"),
+        "age": _number(demographics.get("age"), int),
+        "risk_level": (doc.get("risk_assessment") or {}).get("level"),
+        "cases_involved": [str(case_id) for case_id in doc.get("cases_involved") or []],
+        "created_at": _date(doc.get("created_at")),
+        "updated_at": _date(doc.get("updated_at")),
+    }
+
+
+# Contact details and free text other than case titles stay out of the snapshot
+TABLES = {
+    "reports": {
+        "collection": "incident_reports",
+        "projection": {"status": 1, "reporter_type": 1, "anonymous": 1, "language": 1, "created_at": 1,
+                       "updated_at": 1, "incident_details.date": 1, "incident_details.location": 1,
+                       "incident_details.violation_types": 1},
+        "row": report_row,
+        "schema": pa.schema([
+            ("id", pa.string()), ("status", pa.string()), ("reporter_type", pa.string()),
+            ("anonymous", pa.bool_()), ("country", pa.string()), ("city", pa.string()),
+            ("date", TIMESTAMP), ("lng", pa.float64()), ("lat", pa.float64()),
+            ("violation_types", STRINGS), ("language", pa.string()),
+            ("created_at", TIMESTAMP), ("updated_at", TIMESTAMP),
+        ]),
+    },
+    "cases": {
+        "collection": "cases",
+        "projection": {"title": 1, "status": 1, "priority": 1, "location": 1, "violation_types": 1,
+                       "date_occurred": 1, "date_reported": 1, "created_at": 1, "updated_at": 1},
+        "row": case_row,
+        "schema": pa.schema([
+            ("id", pa.string()), ("title", pa.string()), ("status", pa.string()),
+            ("priority", pa.string()), ("country", pa.string()), ("region", pa.string()),
+            ("violation_types", STRINGS), ("date_occurred", TIMESTAMP), ("date_reported", TIMESTAMP),
+            ("created_at", TIMESTAMP), ("updated_at", TIMESTAMP),
+        ]),
+    },
+    "victims": {
+        "collection": "victims",
+        "projection": {"type": 1, "anonymous": 1, "demographics.gender": 1, "demographics.age": 1,
+                       "risk_assessment.level": 1, "cases_involved": 1, "created_at": 1, "updated_at": 1},
+        "row": victim_row,
+        "schema": pa.schema([
+            ("id", pa.string()), ("type", pa.string()), ("anonymous", pa.bool_()),
+            ("gender", pa.string()), ("age", pa.int64()), ("risk_level", pa.string()),
+            ("cases_involved", STRINGS), ("created_at", TIMESTAMP), ("updated_at", TIMESTAMP),
+        ]),
+    },
+}
+
+
+def read_manifest(directory=SNAPSHOT_DIR):
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _write_manifest(manifest, directory):
+    path = os.path.join(directory, MANIFEST)
+    with open(path + ".part", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".part", path)
+
+
+def version(directory=SNAPSHOT_DIR):
+    """Changes whenever a refresh changes the snapshot; use it as a cache key."""
+    return read_manifest(directory).get("refreshed_at")
+
+
+def _latest(table):
+    # Later parts hold newer copies of a row, so keep the last row per id
+    positions = pa.array(np.arange(table.num_rows))
+    last = table.append_column("_position", positions).group_by("id").aggregate([("_position", "max")])
+    return table.take(np.sort(last["_position_max"].to_numpy()))
+
+
+def load_parts(directory, parts, columns=None):
+    if columns is not None and "id" not in columns:
+        columns = ["id"] + list(columns)
+    tables = [feather.read_table(os.path.join(directory, part), columns=columns, memory_map=True)
+              for part in parts]
+    return _latest(pa.concat_tables(tables)) if len(tables) > 1 else tables[0]
+
+
+def load(name, directory=SNAPSHOT_DIR, columns=None):
+    """The snapshot table for name (None before the first refresh), with its
+    files memory-mapped."""
+    parts = read_manifest(directory).get("tables", {}).get(name, {}).get("parts", [])
+    return load_parts(directory, parts, columns) if parts else None
+
+
+def _write_part(path, schema, batches):
+    """Write batches of rows to an Arrow file; returns the rows written."""
+    rows = 0
+    with pa.OSFile(path + ".part", "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        for batch in batches:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            rows += len(batch)
+    os.replace(path + ".part", path)
+    return rows
+
+
+def changed_query(state):
+    """Documents added or changed since the refresh that left this state."""
+    since = datetime.fromisoformat(state["updated_at"]) - WATERMARK_OVERLAP
+    return {"$or": [{"_id": {"$gt": ObjectId(state["last_id"])}}, {"updated_at": {"$gt": since}}]}
+
+
+def refresh_table(db, name, state, directory, full=False):
+    """Bring one table up to date. Returns the new state, the rows written
+    and the files it replaced (to delete once the manifest no longer lists
+    them)."""
+    spec = TABLES[name]
+    collection = db[spec["collection"]]
+    started = datetime.utcnow()
+    next_part = state.get("next_part", 0)
+    if full or not state.get("last_id"):
+        obsolete, parts = list(state.get("parts", [])), []
+        query = {}
+    else:
+        obsolete, parts = [], list(state["parts"])
+        query = changed_query(state)
+
+    # Until a document carries updated_at, changes are looked for from this
+    # refresh on
+    watermark = {"last_id": state.get("last_id"), "updated_at": state.get("updated_at") or started.isoformat()}
+    overlap = {}  # rows re-read only because of WATERMARK_OVERLAP
+
+    def batches():
+        batch = []
+        for doc in collection.find(query, spec["projection"]).sort("_id", 1).batch_size(BATCH_SIZE):
+            row = spec["row"](doc)
+            updated_at = row["updated_at"] and row["updated_at"].isoformat()
+            if parts and doc["_id"] <= ObjectId(state["last_id"]) and updated_at and updated_at <= state["updated_at"]:
+                overlap[row["id"]] = row
+                continue
+            if watermark["last_id"] is None or doc["_id"] > ObjectId(watermark["last_id"]):
+                watermark["last_id"] = row["id"]
+            if updated_at and (watermark["updated_at"] is None or updated_at > watermark["updated_at"]):
+                watermark["updated_at"] = updated_at
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                yield batch
+                batch = []
+        if overlap:
+            # Most of these are already in the snapshot as they are
+            known = load_parts(directory, parts, ["updated_at"])
+            known = known.filter(pc.is_in(known["id"], value_set=pa.array(list(overlap), pa.string())))
+            for row_id, updated_at in zip(known["id"].to_pylist(), known["updated_at"].to_pylist()):
+                if overlap[row_id]["updated_at"] == updated_at:
+                    del overlap[row_id]
+            batch += overlap.values()
+        if batch:
+            yield batch
+
+    part = f"{name}-{next_part:06d}.arrow"
+    next_part += 1
+    rows = _write_part(os.path.join(directory, part), spec["schema"], batches())
+    if rows or not parts:
+        parts.append(part)
+    else:
+        os.remove(os.path.join(directory, part))
+
+    # Compact when the deltas pile up, or when documents were deleted (the
+    # collection is smaller than the snapshot) so they drop out too
+    table = None
+    if len(parts) > MAX_DELTAS:
+        table = load_parts(directory, parts)
+    elif collection.estimated_document_count() < load_parts(directory, parts, ["id"]).num_rows:
+        live = pa.array([str(doc["_id"]) for doc in collection.find({}, {"_id": 1})], pa.string())
+        table = load_parts(directory, parts)
+        table = table.filter(pc.is_in(table["id"], value_set=live))
+    if table is not None:
+        compacted = f"{name}-{next_part:06d}.arrow"
+        next_part += 1
+        feather.write_feather(table, os.path.join(directory, compacted + ".part"), compression="uncompressed")
+        os.replace(os.path.join(directory, compacted + ".part"), os.path.join(directory, compacted))
+        obsolete += parts
+        parts = [compacted]
+
+    return {"parts": parts, "next_part": next_part, **watermark}, rows, obsolete
+
+
+def refresh(db, directory=SNAPSHOT_DIR, full=False, parquet=False):
+    """Refresh every table; returns {name: rows written}."""
+    os.makedirs(directory, exist_ok=True)
+    tables = read_manifest(directory).get("tables", {})
+    written = {}
+    obsolete = []
+    for name in TABLES:
+        tables[name], written[name], replaced = refresh_table(db, name, tables.get(name, {}), directory, full)
+        obsolete += replaced
+        if parquet:
+            pq.write_table(load_parts(directory, tables[name]["parts"]), os.path.join(directory, f"{name}.parquet"))
+
+    manifest = read_manifest(directory)
+    if any(written.values()) or obsolete or "refreshed_at" not in manifest:
+        manifest["refreshed_at"] = datetime.utcnow().isoformat()
+    _write_manifest({**manifest, "tables": tables, "checked_at": datetime.utcnow().isoformat()}, directory)
+    # Readers that already mapped these keep their view until they close them
+    for part in obsolete:
+        os.remove(os.path.join(directory, part))
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or refresh the columnar analytics snapshot.")
+    parser.add_argument("--full", action="store_true", help="rebuild every table from scratch")
+    parser.add_argument("--parquet", action="store_true", help="also write <table>.parquet files")
+    parser.add_argument("--dir", default=SNAPSHOT_DIR)
+    args = parser.parse_args()
+
+    client = MongoClient("mongodb://localhost:27017/")
+    started = time.time()
+    written = refresh(client["hrm_database"], args.dir, full=args.full, parquet=args.parquet)
+    client.close()
+    for name, rows in written.items():
+        print(f"📦 {name}: {rows} rows written")
+    print(f"✅ Snapshot refreshed in {time.time() - started:.1f}s ({args.dir})")